@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+분석 실행 계획 (dry-run)
+분석 없이 파일 시스템과 ddoc 캐시를 비교해 단계별 처리 대상 파일 수, 읽을 바이트,
+이전 실행 처리량(run_history) 기반 예상 소요 시간을 산출 → 대규모 백필을 한가한 시간대에 배치
+
+- attribute / embedding: 캐시에 없는 파일 = 분석 대상 (--verify면 file_hash가 있는 항목은 내용 해시 비교)
+  분석 대상과 별도로 변경 감지를 위해 파일을 해시하는 단계(cpu 임베딩 백엔드: 시그니처가 바뀐 이미지,
+  형식별 디스패치: 해시 미기록·시그니처가 바뀐 파일)는 해시 읽기 바이트(hash_bytes)로, --verify 계획 자체의 해시 읽기는 verify_bytes로 표시
+- dedup: dHash 캐시 시그니처 (크기, 수정시각) 비교 (dedup.update_phash_cache와 동일 기준)
+- clustering: 증분 모드는 신규 임베딩 수, 그 외는 임베딩이 바뀌면 전체 재계산
+- 처리량: 최근 analysis 실행의 단계별 처리 파일 수 / 단계 소요 시간 중앙값
+
+사용법:
+    python analyze_with_ddoc.py test_data --plan
+    python analyze_all_datasets.py --plan
+"""
+import numpy as np
+
+from dataset_utils import list_dataset_files, resolve_dataset
+
+HISTORY_RUNS = 20
+
+# 단계 → (처리 파일 수 메트릭, 소요 시간 메트릭)
+STAGE_THROUGHPUT = {
+    'attribute': ('files_processed', 'attribute_seconds'),
+    'embedding': ('embedding_files_processed', 'embedding_seconds'),
+    'dedup': ('dedup_files_processed', 'dedup_seconds'),
+    'clustering': ('clustering_new_files', 'clustering_seconds')
+}
+
+def _pending(actual, cache, verify=False, hashes=None):
+    """캐시와 비교한 분석 대상 {파일명: 경로}, 캐시에만 있는 파일명
+
+    Args:
+        hashes: 파일명 → 내용 해시 memo (여러 캐시를 검증할 때 파일을 한 번만 해시)
+    """
+    from embedding_backend import file_hash
+
+    cache = cache or {}
+    hashes = {} if hashes is None else hashes
+    pending = {name: path for name, path in actual.items() if name not in cache}
+    if verify:
+        for name, path in actual.items():
+            entry = cache.get(name)
+            if isinstance(entry, dict) and 'file_hash' in entry:
+                if name not in hashes:
+                    hashes[name] = file_hash(path)
+                if entry['file_hash'] != hashes[name]:
+                    pending[name] = path
+    removed = set(cache) - set(actual)
+    return pending, removed
+
+def stage_rates(dataset, db_path=None, last=HISTORY_RUNS):
+    """최근 analysis 실행 이력 → 단계별 처리량 (files/s) 및 고정 소요 시간 중앙값
+
+    Returns:
+        {단계: {'files_per_second': float|None, 'seconds': float|None, 'runs': int}}
+    """
+    from run_history import query_runs, DEFAULT_DB_PATH
+
+    runs = query_runs(dataset, 'analysis', limit=last, db_path=db_path or DEFAULT_DB_PATH)
+    rates = {}
+    for stage, (count_key, seconds_key) in STAGE_THROUGHPUT.items():
+        per_file, seconds = [], []
+        for run in runs:
+            m = run['metrics']
+            if stage == 'embedding' and m.get('embedding_images_per_second'):
+                per_file.append(m['embedding_images_per_second'])
+            elif m.get(count_key) and m.get(seconds_key):
+                per_file.append(m[count_key] / m[seconds_key])
+            if m.get(seconds_key):
+                seconds.append(m[seconds_key])
+        rates[stage] = {
+            'files_per_second': float(np.median(per_file)) if per_file else None,
+            'seconds': float(np.median(seconds)) if seconds else None,
+            'runs': len(seconds)
+        }
+    return rates
+
+def _estimate(files, rate):
+    """처리 파일 수 → 예상 초 (처리량 이력이 없으면 None)"""
+    if files == 0:
+        return 0.0
+    if rate['files_per_second']:
+        return files / rate['files_per_second']
+    return None
+
+def plan_dataset(data_dir, formats, params, dataset=None, verify=False, db_path=None):
+    """데이터셋 하나의 실행 계획
+
+    Returns:
+        {'dataset', 'num_files', 'stages': {단계: {'files', 'removed', 'bytes', 'hash_bytes', 'seconds'}},
+         'total_bytes', 'total_hash_bytes', 'verify_bytes', 'total_seconds', 'unknown_stages'}
+    """
+    from cache_io import load_cache
+    from dedup import PHASH_CACHE, IMAGE_FORMATS
+    from incremental_clustering import STATE_CACHE, embedding_digests
+    from embedding_backend import file_signature
+
+    dataset = dataset or data_dir.name
+    actual = list_dataset_files(data_dir, formats)
+    rates = stage_rates(dataset, db_path)
+    stages = {}
+    sizes = {name: path.stat().st_size for name, path in actual.items()}
+    hashes = {}
+
+    emb_cache = load_cache(data_dir, "embedding_analysis") or {}
+    attr_cache = load_cache(data_dir, "attribute_analysis") or {}
+
+    def stale(cache, names):
+        """(크기, 수정시각) 시그니처나 기록된 해시가 없어 다시 해시해야 하는 파일"""
+        return {
+            name for name in names
+            if 'file_hash' not in (cache.get(name) or {})
+            or cache[name].get('signature') != file_signature(actual[name])
+        }
+
+    # 분석 대상과 무관하게 변경 감지용으로 해시하는 파일
+    dispatch_enabled = (params.get('dispatch') or {}).get('enabled', False)
+    hashed = {'attribute': stale(attr_cache, actual) if dispatch_enabled else set()}
+    if params['embedding'].get('backend', 'ddoc') == 'cpu':
+        # cpu 백엔드: 시그니처가 캐시와 다른 이미지만
+        hashed['embedding'] = {
+            name for name, path in actual.items()
+            if path.suffix.lower() in IMAGE_FORMATS
+            and (emb_cache.get(name) or {}).get('signature') != file_signature(path)
+        }
+    else:
+        hashed['embedding'] = stale(emb_cache, actual) if dispatch_enabled else set()
+
+    def add(stage, pending, removed, seconds=None):
+        stages[stage] = {
+            'files': len(pending),
+            'removed': len(removed),
+            'bytes': sum(sizes[name] for name in pending),
+            'hash_bytes': sum(sizes[name] for name in hashed.get(stage, ())),
+            'seconds': _estimate(len(pending), rates[stage]) if seconds is None else seconds
+        }
+
+    attr_pending, attr_removed = _pending(actual, attr_cache, verify, hashes)
+    add('attribute', attr_pending, attr_removed)
+
+    emb_pending, emb_removed = _pending(
+        actual, {k: v for k, v in emb_cache.items() if 'embedding' in v}, verify, hashes
+    )
+    add('embedding', emb_pending, emb_removed)
+
+    if (params.get('dedup') or {}).get('enabled', False):
+        phash = load_cache(data_dir, PHASH_CACHE) or {}
+        images = {k: p for k, p in actual.items() if p.suffix.lower() in IMAGE_FORMATS}
+        dedup_pending = {}
+        for name, path in images.items():
+            stat = path.stat()
+            if (phash.get(name) or {}).get('signature') != (stat.st_size, int(stat.st_mtime)):
+                dedup_pending[name] = path
+        add('dedup', dedup_pending, set(phash) - set(images))
+
+    # 클러스터링은 임베딩 캐시만 읽으므로 파일 읽기 없음
+    embeddings_changed = bool(emb_pending or emb_removed)
+    if params['clustering'].get('incremental', False):
+        state = load_cache(data_dir, STATE_CACHE) or {}
+        known = state.get('files', set())
+        if isinstance(known, dict):
+            # 파일별 임베딩 digest가 다르면(재임베딩) 신규와 같이 partial_fit 대상
+            embedded = [f for f, v in emb_cache.items() if 'embedding' in v]
+            digests = embedding_digests(
+                embedded, np.asarray([emb_cache[f]['embedding'] for f in embedded], dtype=np.float32))
+            changed = {f for f, d in digests.items() if known.get(f) != d}
+        else:
+            changed = set(emb_cache) - set(known)
+        new_files = len(set(emb_pending) | changed) if known else len(actual)
+        stages['clustering'] = {'files': new_files, 'removed': 0, 'bytes': 0, 'hash_bytes': 0,
+                                'seconds': _estimate(new_files, rates['clustering'])}
+    else:
+        seconds = rates['clustering']['seconds'] if embeddings_changed else 0.0
+        stages['clustering'] = {'files': len(actual) if embeddings_changed else 0, 'removed': 0,
+                                'bytes': 0, 'hash_bytes': 0, 'seconds': seconds}
+
+    estimates = [s['seconds'] for s in stages.values()]
+    return {
+        'dataset': dataset,
+        'num_files': len(actual),
+        'stages': stages,
+        'total_bytes': sum(s['bytes'] for s in stages.values()),
+        'total_hash_bytes': sum(s['hash_bytes'] for s in stages.values()),
+        'verify_bytes': sum(sizes[name] for name in hashes),
+        'total_seconds': sum(e for e in estimates if e is not None),
+        'unknown_stages': [name for name, s in stages.items() if s['seconds'] is None],
+        'history_runs': max(r['runs'] for r in rates.values())
+    }
+
+def plan_from_params(params, dataset_name=None, verify=False):
+    """params.yaml 데이터셋 이름 → 실행 계획 (이력 DB는 history.db_path)"""
+    from run_history import DEFAULT_DB_PATH
+
+    data_dir, formats = resolve_dataset(params, dataset_name)
+    db_path = (params.get('history') or {}).get('db_path', DEFAULT_DB_PATH)
+    return plan_dataset(data_dir, formats, params, verify=verify, db_path=db_path)
+
+def format_bytes(nbytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if nbytes < 1024:
+            return f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} TB"
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "이력 없음"
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+def print_plan(plan):
+    print(f"📋 실행 계획: {plan['dataset']} (파일 {plan['num_files']}개, "
+          f"처리량 이력 {plan['history_runs']}회)")
+    print("-" * 80)
+    print(f"   {'단계':<12} {'분석 대상':>10} {'삭제':>8} {'읽을 데이터':>12} {'해시 읽기':>12} {'예상 시간':>10}")
+    for stage, s in plan['stages'].items():
+        print(f"   {stage:<12} {s['files']:>10} {s['removed']:>8} {format_bytes(s['bytes']):>12} "
+              f"{format_bytes(s['hash_bytes']):>12} {format_seconds(s['seconds']):>10}")
+    total = format_seconds(plan['total_seconds'])
+    if plan['unknown_stages']:
+        total += f" + 미상 ({', '.join(plan['unknown_stages'])})"
+    print(f"   합계: {format_bytes(plan['total_bytes'])} + 해시 {format_bytes(plan['total_hash_bytes'])}, "
+          f"예상 {total}")
+    if plan['verify_bytes']:
+        print(f"   (계획 검증 중 해시한 데이터: {format_bytes(plan['verify_bytes'])})")
+    print()
@@ -3,17 +3,37 @@
 모든 데이터셋 일괄 분석 스크립트
 """
 import yaml
+import argparse
 import subprocess
 import sys
 from pathlib import Path
 
-def main():
+def plan_all(params, datasets, verify=False):
+    """모든 데이터셋 실행 계획 출력 (분석 없이 캐시 비교 + 처리량 이력 기반 추정)"""
+    from analysis_planner import plan_from_params, print_plan, format_bytes, format_seconds
+    
+    plans = [plan_from_params(params, ds['name'] if ds else None, verify) for ds in datasets]
+    for plan in plans:
+        print_plan(plan)
+    
+    unknown = [p['dataset'] for p in plans if p['unknown_stages']]
+    print("=" * 80)
+    print(f"📋 전체: 읽을 데이터 {format_bytes(sum(p['total_bytes'] for p in plans))} "
+          f"+ 해시 {format_bytes(sum(p['total_hash_bytes'] for p in plans))}, "
+          f"예상 {format_seconds(sum(p['total_seconds'] for p in plans))}"
+          + (f" + 미상 ({', '.join(unknown)})" if unknown else ""))
+
+def main(plan=False, verify=False):
     # params.yaml 로드
     with open('params.yaml', 'r') as f:
         params = yaml.safe_load(f)
     
     datasets = params.get('datasets', [])
     
+    if plan:
+        plan_all(params, datasets or [None], verify)
+        return
+    
     if not datasets:
         print("⚠️  params.yaml에 datasets가 정의되지 않았습니다.")
         print("기본 데이터셋으로 분석을 실행합니다.")
@@ -68,5 +88,11 @@ def main():
     print("✅ DVC 추적 완료")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="모든 데이터셋 일괄 분석")
+    parser.add_argument('--plan', action='store_true',
+                        help="분석 없이 데이터셋별 처리 대상/예상 시간만 출력")
+    parser.add_argument('--verify', action='store_true',
+                        help="--plan: 캐시된 파일도 내용 해시로 변경 여부 확인")
+    args = parser.parse_args()
+    main(args.plan, args.verify)
 
@@ -2,27 +2,53 @@
 """
 DVC와 ddoc 모듈을 통합한 분석 스크립트
 DVC가 datasets 변경을 감지하면 실행되고, ddoc의 캐시로 증분 분석
+
+--stage로 단계별 실행 가능 (generate_dvc_yaml.py의 세분화된 DVC 스테이지)
+    attribute → embedding → dedup → clustering → plots
+각 단계는 analysis/<dataset>/stages/<stage>.json (캐시 fingerprint + 메트릭)을 출력하며
+다음 단계는 이 파일에 의존 (ddoc 캐시는 데이터셋 디렉토리 내부에 있어 DVC out으로 직접 선언 불가)
 """
 import sys
 import os
+import time
+import inspect
+import hashlib
+import argparse
 from pathlib import Path
 from datetime import datetime
 import json
 import pickle
 import yaml
+import numpy as np
 
 # ddoc 모듈 import
 sys.path.insert(0, str(Path(__file__).parent.parent / 'datadrift_app_engine'))
 
 try:
     from main import run_attribute_analysis_wrapper, run_embedding_analysis
-    from cache_utils import get_cached_analysis_data, save_analysis_data
+    from cache_utils import get_cached_analysis_data
     print("✅ ddoc 모듈 로드 성공")
 except ImportError as e:
     print(f"❌ ddoc 모듈 로드 실패: {e}")
     print("datadrift_app_engine이 설치되어 있는지 확인하세요.")
     sys.exit(1)
 
+from drift_metrics import calculate_quality_score
+from cache_io import dataset_lock, read_cache, save_cache, write_json_atomic
+
+STAGES = ('attribute', 'embedding', 'dedup', 'clustering', 'plots')
+
+# 실행마다 달라지는 통계 (stage manifest에서 제외해 DVC 불필요 재실행 방지)
+RUN_STAT_KEYS = (
+    'files_processed', 'files_cached', 'orphaned_files_removed',
+    'embedding_images_per_second', 'clustering_new_files', 'clustering_refit', 'shards',
+    'embedding_files_processed', 'dedup_files_processed',
+    'attribute_seconds', 'embedding_seconds', 'dedup_seconds', 'clustering_seconds',
+    'attribute_formats', 'embedding_formats'
+)
+
+DEFAULT_PLOT_DPI = 300
+
 def validate_cache(data_dir, cache_data, formats):
     """실제 파일 검증 및 orphan cache 제거"""
     if not cache_data:
@@ -47,83 +73,74 @@ def validate_cache(data_dir, cache_data, formats):
     
     return cache_data, actual_files, len(orphaned)
 
-def analyze_dataset(dataset_name=None):
-    """ddoc 모듈로 데이터셋 분석 (데이터셋별 독립 관리)
-    
-    Args:
-        dataset_name: 분석할 데이터셋 이름 (None이면 기본값 사용)
-    """
-    
-    # params.yaml 로드
-    with open('params.yaml', 'r') as f:
-        params = yaml.safe_load(f)
-    
-    # 데이터셋 정보 추출
-    if dataset_name:
-        # 특정 데이터셋 찾기
-        dataset_config = next(
-            (ds for ds in params.get('datasets', []) if ds['name'] == dataset_name),
-            None
-        )
-        if not dataset_config:
-            print(f"❌ 데이터셋 '{dataset_name}'을 찾을 수 없습니다.")
-            sys.exit(1)
-        
-        data_dir = dataset_config['path']
-        formats = tuple(dataset_config['formats'])
-    else:
-        # 기본값 사용 (하위 호환)
-        data_dir = params['analysis']['data_dir']
-        formats = tuple(params['analysis']['formats'])
-    
-    data_dir = Path(data_dir)
-    dataset_name_only = data_dir.name  # "test_data"
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    # 분석 결과를 datasets 밖의 analysis/ 디렉토리에 저장
-    analysis_root = Path("analysis") / dataset_name_only
-    
-    plot_dir = analysis_root / "plots"
-    plot_dir.mkdir(parents=True, exist_ok=True)
-    
-    # drift 디렉토리도 미리 생성
-    drift_plot_dir = analysis_root / "drift" / "plots"
-    drift_plot_dir.mkdir(parents=True, exist_ok=True)
-    
-    print(f"🚀 DVC + ddoc 통합 분석 시작")
-    print(f"=" * 80)
-    print(f"시간: {timestamp}")
-    print(f"데이터 디렉토리: {data_dir}")
-    print(f"지원 형식: {formats}")
-    print()
-    
-    # 메트릭 저장용 딕셔너리
+def cache_fingerprint(cache):
+    """캐시 내용 fingerprint (파일명 + 항목 내용, 순서 무관)"""
+    h = hashlib.md5()
+    for fname in sorted(cache or {}):
+        entry = cache[fname]
+        h.update(fname.encode())
+        if isinstance(entry, dict) and 'file_hash' in entry:
+            h.update(str(entry['file_hash']).encode())
+        elif isinstance(entry, dict) and 'embedding' in entry:
+            h.update(np.asarray(entry['embedding'], dtype=np.float32).tobytes())
+        else:
+            h.update(json.dumps(entry, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+def write_stage_manifest(analysis_root, stage, metrics, fingerprint):
+    """단계 출력 manifest (내용 메트릭만) + 실행 통계 sidecar 저장"""
+    stage_dir = analysis_root / "stages"
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    content = {k: v for k, v in metrics.items() if k not in RUN_STAT_KEYS}
+    run_stats = {k: v for k, v in metrics.items() if k in RUN_STAT_KEYS}
+    write_json_atomic(stage_dir / f"{stage}.json", {'fingerprint': fingerprint, 'metrics': content},
+                      indent=2, sort_keys=True)
+    write_json_atomic(stage_dir / f"{stage}.stats.json", run_stats, indent=2)
+
+def load_stage_metrics(analysis_root):
+    """단계별 manifest/통계를 합친 메트릭 (plots 단계에서 metrics.json 작성용)"""
     metrics = {}
-    
-    # 1. 속성 분석 (ddoc의 해시 기반 캐싱 활용)
+    for stage in STAGES:
+        for suffix in (".json", ".stats.json"):
+            path = analysis_root / "stages" / f"{stage}{suffix}"
+            if path.exists():
+                with open(path) as f:
+                    data = json.load(f)
+                metrics.update(data.get('metrics', {}) if suffix == ".json" else data)
+    return metrics
+
+def run_attribute_step(data_dir, formats, metrics, params=None):
+    """Step 1: 속성 분석 (ddoc의 해시 기반 캐싱 활용)"""
     print("📊 Step 1: Attribute Analysis")
     print("-" * 80)
-    
-    # cache 디렉토리는 ddoc가 자동으로 제외하므로 별도 처리 불필요
-    attr_stats = run_attribute_analysis_wrapper([str(data_dir)], formats)
-    
+
+    if ((params or {}).get('dispatch') or {}).get('enabled', False):
+        # 형식별 워커 풀 (문서/PDF가 이미지 분석을 막지 않도록)
+        from format_dispatch import dispatch_analysis
+        attr_stats = dispatch_analysis(data_dir, formats, 'attribute', params)
+    else:
+        # cache 디렉토리는 ddoc가 자동으로 제외하므로 별도 처리 불필요
+        attr_stats = run_attribute_analysis_wrapper([str(data_dir)], formats)
+
     # ddoc 캐시에서 전체 결과 로드
     attr_cache = get_cached_analysis_data(data_dir, "attribute_analysis")
-    
+
     # 🔍 검증: 실제 존재하는 파일만 유지
     if attr_cache:
         attr_cache, actual_files, orphaned_count = validate_cache(data_dir, attr_cache, formats)
         # 검증 후 캐시 재저장 (orphan 제거됨)
         if orphaned_count > 0:
-            save_analysis_data(data_dir, attr_cache, "attribute_analysis")
+            save_cache(data_dir, attr_cache, "attribute_analysis")
             metrics["orphaned_files_removed"] = orphaned_count
-    
+
     if attr_cache:
         num_files = len(attr_cache)
         sizes = [v['size'] for v in attr_cache.values() if 'size' in v]
         widths = [v['width'] for v in attr_cache.values() if 'width' in v]
         heights = [v['height'] for v in attr_cache.values() if 'height' in v]
-        
+        noise_levels = [v['noise_level'] for v in attr_cache.values() if 'noise_level' in v]
+        sharpness_vals = [v['sharpness'] for v in attr_cache.values() if 'sharpness' in v]
+
         # 메트릭 저장
         data_dir_key = str(data_dir)
         metrics["num_files"] = num_files
@@ -132,253 +149,537 @@ def analyze_dataset(dataset_name=None):
         metrics["avg_height"] = sum(heights) / len(heights) if heights else 0
         metrics["files_processed"] = attr_stats[data_dir_key]['processed_files']
         metrics["files_cached"] = attr_stats[data_dir_key]['skipped_files']
-        
-        print(f"✅ 분석 완료: {num_files}개 파일")
-        print(f"   새로 분석: {attr_stats[data_dir_key]['processed_files']}개")
-        print(f"   캐시 활용: {attr_stats[data_dir_key]['skipped_files']}개")
-        
-        # 시각화: 속성 분석 (개별 차트로 저장)
-        import matplotlib.pyplot as plt
-        import numpy as np
-        
-        # 화질 관련 데이터 추출
-        noise_levels = [v['noise_level'] for v in attr_cache.values() if 'noise_level' in v]
-        sharpness_vals = [v['sharpness'] for v in attr_cache.values() if 'sharpness' in v]
-        
-        # Quality Score 계산
-        def calculate_quality_score(sharpness, noise_level):
-            """종합 품질 점수 계산 (0~100, 높을수록 좋음)"""
-            sharp_norm = min(sharpness / 100, 1.0)
-            noise_norm = max(0, 1.0 - (noise_level / 50))
-            quality = (sharp_norm * 0.6 + noise_norm * 0.4) * 100
-            return quality
-        
-        quality_scores = []
+        if 'formats' in attr_stats[data_dir_key]:
+            metrics["attribute_formats"] = attr_stats[data_dir_key]['formats']
         if noise_levels and sharpness_vals and len(noise_levels) == len(sharpness_vals):
             quality_scores = [calculate_quality_score(s, n) for s, n in zip(sharpness_vals, noise_levels)]
             metrics["avg_quality_score"] = sum(quality_scores) / len(quality_scores)
-        
-        # 1. 파일 크기 분포
-        plt.figure(figsize=(10, 6))
-        plt.hist(sizes, bins=20, color='skyblue', edgecolor='black', alpha=0.7)
-        plt.title('File Size Distribution', fontsize=14, fontweight='bold')
-        plt.xlabel('Size (MB)')
-        plt.ylabel('Count')
-        plt.grid(alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(plot_dir / 'size_distribution.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        # 2. 노이즈 레벨 분포
         if noise_levels:
-            plt.figure(figsize=(10, 6))
-            plt.hist(noise_levels, bins=20, color='lightcoral', edgecolor='black', alpha=0.7)
-            plt.title('Noise Level Distribution', fontsize=14, fontweight='bold')
-            plt.xlabel('Noise Level')
-            plt.ylabel('Count')
-            plt.grid(alpha=0.3)
-            plt.tight_layout()
-            plt.savefig(plot_dir / 'noise_distribution.png', dpi=300, bbox_inches='tight')
-            plt.close()
             metrics["avg_noise_level"] = sum(noise_levels) / len(noise_levels)
-        
-        # 3. 선명도 분포
         if sharpness_vals:
-            plt.figure(figsize=(10, 6))
-            plt.hist(sharpness_vals, bins=20, color='lightgreen', edgecolor='black', alpha=0.7)
-            plt.title('Sharpness Distribution', fontsize=14, fontweight='bold')
-            plt.xlabel('Sharpness')
-            plt.ylabel('Count')
-            plt.grid(alpha=0.3)
-            plt.tight_layout()
-            plt.savefig(plot_dir / 'sharpness_distribution.png', dpi=300, bbox_inches='tight')
-            plt.close()
             metrics["avg_sharpness"] = sum(sharpness_vals) / len(sharpness_vals)
-        
-        # 4. 품질 맵 (노이즈 vs 선명도)
-        if noise_levels and sharpness_vals:
-            plt.figure(figsize=(10, 8))
-            scatter = plt.scatter(noise_levels, sharpness_vals, 
-                                alpha=0.6, s=100, c=sizes, cmap='viridis', edgecolors='black')
-            plt.title('Quality Map: Noise vs Sharpness', fontsize=14, fontweight='bold')
-            plt.xlabel('Noise Level')
-            plt.ylabel('Sharpness')
-            plt.colorbar(scatter, label='File Size (MB)')
-            plt.grid(alpha=0.3)
-            plt.tight_layout()
-            plt.savefig(plot_dir / 'quality_map.png', dpi=300, bbox_inches='tight')
-            plt.close()
-        
-        # 5. 종합 품질 스코어 분포
-        if quality_scores:
-            plt.figure(figsize=(10, 6))
-            plt.hist(quality_scores, bins=20, color='gold', edgecolor='black', alpha=0.7)
-            plt.title('Quality Score Distribution', fontsize=14, fontweight='bold')
-            plt.xlabel('Quality Score (0-100)')
-            plt.ylabel('Count')
-            plt.axvline(30, color='red', linestyle='--', alpha=0.5, label='Poor')
-            plt.axvline(50, color='orange', linestyle='--', alpha=0.5, label='Fair')
-            plt.axvline(70, color='green', linestyle='--', alpha=0.5, label='Good')
-            plt.legend()
-            plt.grid(alpha=0.3)
-            plt.tight_layout()
-            plt.savefig(plot_dir / 'quality_score.png', dpi=300, bbox_inches='tight')
-            plt.close()
-        
-        # 6. 해상도 분포
-        if widths and heights:
-            resolutions = [w * h / 1000000 for w, h in zip(widths, heights)]
-            plt.figure(figsize=(10, 6))
-            plt.hist(resolutions, bins=20, color='lightblue', edgecolor='black', alpha=0.7)
-            plt.title('Resolution Distribution', fontsize=14, fontweight='bold')
-            plt.xlabel('Megapixels')
-            plt.ylabel('Count')
-            plt.grid(alpha=0.3)
-            plt.tight_layout()
-            plt.savefig(plot_dir / 'resolution_distribution.png', dpi=300, bbox_inches='tight')
-            plt.close()
-        
-        print(f"   📊 속성 분석 시각화 저장: {plot_dir}/*.png (6개 파일)")
+
+        print(f"✅ 분석 완료: {num_files}개 파일")
+        print(f"   새로 분석: {attr_stats[data_dir_key]['processed_files']}개")
+        print(f"   캐시 활용: {attr_stats[data_dir_key]['skipped_files']}개")
     else:
         print("⚠️ 속성 분석 결과 없음")
-    
+
     print()
-    
-    # 2. 임베딩 분석 (ddoc의 해시 기반 캐싱 활용)
+    return attr_cache
+
+def run_embedding_step(data_dir, formats, params, metrics):
+    """Step 2: 임베딩 분석 (ddoc의 해시 기반 캐싱 활용)"""
     print("🔬 Step 2: Embedding Analysis")
     print("-" * 80)
-    
-    # cache 디렉토리는 ddoc가 자동으로 제외하므로 별도 처리 불필요
-    emb_stats = run_embedding_analysis(
-        [str(data_dir)], 
-        formats,
-        model=params['embedding']['model'],
-        device=params['embedding']['device'],
-        n_clusters=params['clustering']['n_clusters'],
-        method=params['clustering']['method'],
-        cluster_selection_method=params['clustering']['selection_method']
-    )
-    
+
+    emb_params = params['embedding']
+
+    if emb_params.get('backend', 'ddoc') == 'cpu':
+        # CPU 최적화 백엔드 (배치 DataLoader + 양자화/ONNX)
+        from embedding_backend import run_cpu_embedding_analysis
+        emb_stats = run_cpu_embedding_analysis(data_dir, formats, emb_params, params['clustering'])
+    elif (params.get('dispatch') or {}).get('enabled', False):
+        # 형식별 워커 풀로 ddoc 임베딩 (청크 클러스터링 대신 전체 캐시로 클러스터링)
+        from format_dispatch import dispatch_analysis
+        from embedding_backend import cluster_embeddings
+        emb_stats = dispatch_analysis(data_dir, formats, 'embedding', params, emb_kwargs={
+            'model': emb_params['model'],
+            'device': emb_params['device']
+        })
+        processed = emb_stats[str(data_dir)]['processed_files']
+        if not params['clustering'].get('incremental', False) and \
+                (processed > 0 or not get_cached_analysis_data(data_dir, "clustering_analysis")):
+            clustering = cluster_embeddings(
+                get_cached_analysis_data(data_dir, "embedding_analysis") or {}, params['clustering']
+            )
+            if clustering:
+                save_cache(data_dir, clustering, "clustering_analysis")
+    else:
+        # cache 디렉토리는 ddoc가 자동으로 제외하므로 별도 처리 불필요
+        emb_kwargs = {}
+        ddoc_params = inspect.signature(run_embedding_analysis).parameters
+        n_clusters = params['clustering']['n_clusters']
+        if params['clustering'].get('incremental', False):
+            # 증분 모드: 클러스터링은 Step 4(MiniBatchKMeans)가 담당하므로 ddoc 클러스터링 결과는 덮어씀
+            # ddoc가 클러스터링 생략을 지원하면 끄고, 아니면 k를 고정해 전체 silhouette 탐색(O(n²))을 생략
+            # (첫 실행의 k 선택은 Step 4에서 silhouette_sample_size 샘플로 수행)
+            if 'skip_clustering' in ddoc_params:
+                emb_kwargs['skip_clustering'] = True
+            if n_clusters is None:
+                from incremental_clustering import persisted_n_clusters
+                k_min = params['clustering'].get('n_clusters_range', [2, 10])[0]
+                n_clusters = persisted_n_clusters(data_dir) or k_min
+        # ddoc 버전이 batch_size를 지원하면 params.yaml 값을 그대로 전달
+        if 'batch_size' in emb_params and 'batch_size' in ddoc_params:
+            emb_kwargs['batch_size'] = emb_params['batch_size']
+
+        emb_stats = run_embedding_analysis(
+            [str(data_dir)],
+            formats,
+            model=emb_params['model'],
+            device=emb_params['device'],
+            n_clusters=n_clusters,
+            method=params['clustering']['method'],
+            cluster_selection_method=params['clustering']['selection_method'],
+            **emb_kwargs
+        )
+
+    emb_stat = emb_stats.get(str(data_dir), {}) if isinstance(emb_stats, dict) else {}
+    if 'processed_files' in emb_stat:
+        metrics["embedding_files_processed"] = emb_stat['processed_files']
+    if 'formats' in emb_stat:
+        metrics["embedding_formats"] = emb_stat['formats']
+    if 'images_per_second' in emb_stat:
+        metrics["embedding_images_per_second"] = emb_stat['images_per_second']
+        print(f"   처리 속도: {emb_stat['images_per_second']:.1f} images/s")
+
     # ddoc 캐시에서 임베딩 결과 로드
     emb_cache = get_cached_analysis_data(data_dir, "embedding_analysis")
-    
+
     if emb_cache:
         embeddings = [v['embedding'] for v in emb_cache.values() if 'embedding' in v]
-        
+
         metrics["num_embeddings"] = len(embeddings)
         metrics["embedding_dim"] = len(embeddings[0]) if embeddings else 0
-        
+
         print(f"✅ 임베딩 완료: {len(embeddings)}개")
-        
-        # 시각화: PCA 3D
-        if len(embeddings) > 1:
-            from sklearn.decomposition import PCA
-            from mpl_toolkits.mplot3d import Axes3D
-            
-            emb_array = np.array(embeddings)
-            pca = PCA(n_components=3)
-            emb_3d = pca.fit_transform(emb_array)
-            
-            fig = plt.figure(figsize=(12, 9))
-            ax = fig.add_subplot(111, projection='3d')
-            
-            scatter = ax.scatter(emb_3d[:, 0], emb_3d[:, 1], emb_3d[:, 2],
-                                alpha=0.6, s=100, c=range(len(emb_3d)), 
-                                cmap='viridis', edgecolors='black', linewidth=0.5)
-            
-            ax.set_title(f'Embedding Space (PCA 3D)\nVariance: {pca.explained_variance_ratio_.sum():.1%}', 
-                        fontsize=14, fontweight='bold')
-            ax.set_xlabel(f'PC1 ({pca.explained_variance_ratio_[0]:.1%})')
-            ax.set_ylabel(f'PC2 ({pca.explained_variance_ratio_[1]:.1%})')
-            ax.set_zlabel(f'PC3 ({pca.explained_variance_ratio_[2]:.1%})')
-            
-            plt.colorbar(scatter, label='Sample Index', pad=0.1)
-            plt.tight_layout()
-            plt.savefig(plot_dir / 'embedding_pca_3d.png', dpi=300, bbox_inches='tight')
-            plt.close()
-            print(f"   📊 임베딩 3D 시각화 저장: {plot_dir / 'embedding_pca_3d.png'}")
+        update_compact_cache(data_dir, emb_cache, emb_params, metrics)
     else:
         print("⚠️ 임베딩 분석 결과 없음")
-    
+
     print()
-    
-    # 3. 클러스터링 분석
-    print("🎯 Step 3: Clustering Analysis")
+    return emb_cache
+
+def update_compact_cache(data_dir, emb_cache, emb_params, metrics):
+    """압축 임베딩 캐시 갱신 (드리프트 계산용 compact 표현, embedding.compact_codec)"""
+    compact_codec = emb_params.get('compact_codec')
+    if not compact_codec:
+        return
+    from embedding_codec import COMPACT_CACHE, INT8_HEADROOM, update_compact, compact_nbytes, clip_rate
+    compact = update_compact(
+        get_cached_analysis_data(data_dir, COMPACT_CACHE),
+        emb_cache,
+        compact_codec,
+        pq_subspaces=emb_params.get('pq_subspaces', 64),
+        int8_headroom=emb_params.get('int8_headroom', INT8_HEADROOM)
+    )
+    if compact:
+        save_cache(data_dir, compact, COMPACT_CACHE)
+        metrics["embedding_compact_bytes"] = compact_nbytes(compact)
+        metrics["embedding_compact_clip_rate"] = clip_rate(compact)
+        print(f"   압축 임베딩 캐시 갱신: {compact_codec} "
+              f"({compact_nbytes(compact):.0f} bytes/embedding, 포화 {clip_rate(compact):.2%})")
+
+def run_dedup_step(data_dir, formats, params, emb_cache, analysis_root, metrics):
+    """Step 3: 중복 탐지 (임베딩 LSH + dHash)"""
+    print("🧬 Step 3: Duplicate Detection")
     print("-" * 80)
-    
+
+    from dedup import run_dedup, load_duplicate_exclusions, DUPLICATES_FILE
+    dedup_stats = run_dedup(data_dir, formats, emb_cache, analysis_root, params.get('dedup', {}))
+
+    metrics["duplicate_groups"] = dedup_stats['groups']
+    metrics["duplicate_files"] = dedup_stats['duplicate_files']
+    metrics["dedup_files_processed"] = dedup_stats['phash_updated']
+
+    print(f"✅ 중복 그룹: {dedup_stats['groups']}개 (중복 파일 {dedup_stats['duplicate_files']}개)")
+    print(f"   📝 중복 목록 저장: {analysis_root / DUPLICATES_FILE}")
+    print()
+    return load_duplicate_exclusions(analysis_root)
+
+def run_clustering_step(data_dir, params, emb_cache, duplicate_files, metrics, recluster=False):
+    """Step 4: 클러스터링 분석
+
+    Args:
+        recluster: True면 임베딩 캐시로 클러스터링 재계산 (단계별 실행에서
+            임베딩 단계와 독립적으로 clustering 파라미터 변경을 반영)
+    """
+    print("🎯 Step 4: Clustering Analysis")
+    print("-" * 80)
+
+    clustering_params = params['clustering']
+    dedup_params = params.get('dedup', {})
+
+    if clustering_params.get('incremental', False) and emb_cache:
+        # MiniBatchKMeans 증분 갱신 (신규 임베딩만 partial_fit)
+        from incremental_clustering import update_clustering
+        exclude = duplicate_files if dedup_params.get('exclude_from_clustering', False) else None
+        cluster_stats = update_clustering(data_dir, emb_cache, clustering_params, exclude=exclude)
+        if cluster_stats:
+            metrics["clustering_new_files"] = cluster_stats['new_files']
+            metrics["clustering_refit"] = cluster_stats['refit']
+            mode = "전체 재학습" if cluster_stats['refit'] else "증분 갱신"
+            print(f"   {mode}: 신규 {cluster_stats['new_files']}개 반영")
+    elif recluster and emb_cache:
+        if clustering_params['method'] == 'kmeans':
+            from embedding_backend import cluster_embeddings
+            clustering = cluster_embeddings(emb_cache, clustering_params)
+            if clustering:
+                save_cache(data_dir, clustering, "clustering_analysis")
+        else:
+            print(f"   ⚠️ {clustering_params['method']}: 임베딩 단계의 ddoc 클러스터링 결과 사용")
+
     cluster_cache = get_cached_analysis_data(data_dir, "clustering_analysis")
-    
+
     if cluster_cache:
         n_clusters = cluster_cache.get('n_clusters', 0)
-        
         metrics["num_clusters"] = n_clusters
-        
         print(f"✅ 클러스터링 완료: {n_clusters}개 클러스터")
-        
-        # 시각화: 클러스터 분포 (개별 차트로 저장)
-        if 'cluster_labels' in cluster_cache and 'embeddings_2d' in cluster_cache:
-            labels = np.array(cluster_cache['cluster_labels'])
-            emb_2d = np.array(cluster_cache['embeddings_2d'])
-            
-            from collections import Counter
-            cluster_counts = Counter(labels)
-            
-            # 1. 클러스터 크기 분포
-            plt.figure(figsize=(10, 6))
-            plt.bar(cluster_counts.keys(), cluster_counts.values(), 
-                   color='lightcoral', edgecolor='black', alpha=0.7)
-            plt.title('Cluster Size Distribution', fontsize=14, fontweight='bold')
-            plt.xlabel('Cluster ID')
-            plt.ylabel('Count')
-            plt.grid(alpha=0.3, axis='y')
-            plt.tight_layout()
-            plt.savefig(plot_dir / 'cluster_distribution.png', dpi=300, bbox_inches='tight')
-            plt.close()
-            
-            # 2. 클러스터 시각화 (2D PCA)
-            plt.figure(figsize=(10, 8))
-            scatter = plt.scatter(emb_2d[:, 0], emb_2d[:, 1], c=labels, 
-                                cmap='tab10', alpha=0.6, s=100, edgecolors='black')
-            plt.title('Cluster Visualization', fontsize=14, fontweight='bold')
-            plt.xlabel('PC1')
-            plt.ylabel('PC2')
-            plt.colorbar(scatter, label='Cluster ID')
-            plt.grid(alpha=0.3)
-            plt.tight_layout()
-            plt.savefig(plot_dir / 'cluster_visualization.png', dpi=300, bbox_inches='tight')
-            plt.close()
-            
-            print(f"   📊 클러스터 분석 시각화 저장: {plot_dir}/*.png (2개 파일)")
     else:
         print("⚠️ 클러스터링 분석 결과 없음")
-    
+
     print()
-    
-    # 4. 메트릭 저장
+    return cluster_cache
+
+def plot_attributes(attr_cache, plot_dir, dpi=DEFAULT_PLOT_DPI):
+    """시각화: 속성 분석 (개별 차트로 저장)"""
+    import matplotlib.pyplot as plt
+
+    sizes = [v['size'] for v in attr_cache.values() if 'size' in v]
+    widths = [v['width'] for v in attr_cache.values() if 'width' in v]
+    heights = [v['height'] for v in attr_cache.values() if 'height' in v]
+
+    # 화질 관련 데이터 추출
+    noise_levels = [v['noise_level'] for v in attr_cache.values() if 'noise_level' in v]
+    sharpness_vals = [v['sharpness'] for v in attr_cache.values() if 'sharpness' in v]
+
+    quality_scores = []
+    if noise_levels and sharpness_vals and len(noise_levels) == len(sharpness_vals):
+        quality_scores = [calculate_quality_score(s, n) for s, n in zip(sharpness_vals, noise_levels)]
+
+    # 1. 파일 크기 분포
+    plt.figure(figsize=(10, 6))
+    plt.hist(sizes, bins=20, color='skyblue', edgecolor='black', alpha=0.7)
+    plt.title('File Size Distribution', fontsize=14, fontweight='bold')
+    plt.xlabel('Size (MB)')
+    plt.ylabel('Count')
+    plt.grid(alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(plot_dir / 'size_distribution.png', dpi=dpi, bbox_inches='tight')
+    plt.close()
+
+    # 2. 노이즈 레벨 분포
+    if noise_levels:
+        plt.figure(figsize=(10, 6))
+        plt.hist(noise_levels, bins=20, color='lightcoral', edgecolor='black', alpha=0.7)
+        plt.title('Noise Level Distribution', fontsize=14, fontweight='bold')
+        plt.xlabel('Noise Level')
+        plt.ylabel('Count')
+        plt.grid(alpha=0.3)
+        plt.tight_layout()
+        plt.savefig(plot_dir / 'noise_distribution.png', dpi=dpi, bbox_inches='tight')
+        plt.close()
+
+    # 3. 선명도 분포
+    if sharpness_vals:
+        plt.figure(figsize=(10, 6))
+        plt.hist(sharpness_vals, bins=20, color='lightgreen', edgecolor='black', alpha=0.7)
+        plt.title('Sharpness Distribution', fontsize=14, fontweight='bold')
+        plt.xlabel('Sharpness')
+        plt.ylabel('Count')
+        plt.grid(alpha=0.3)
+        plt.tight_layout()
+        plt.savefig(plot_dir / 'sharpness_distribution.png', dpi=dpi, bbox_inches='tight')
+        plt.close()
+
+    # 4. 품질 맵 (노이즈 vs 선명도)
+    if noise_levels and sharpness_vals:
+        plt.figure(figsize=(10, 8))
+        scatter = plt.scatter(noise_levels, sharpness_vals,
+                            alpha=0.6, s=100, c=sizes, cmap='viridis', edgecolors='black')
+        plt.title('Quality Map: Noise vs Sharpness', fontsize=14, fontweight='bold')
+        plt.xlabel('Noise Level')
+        plt.ylabel('Sharpness')
+        plt.colorbar(scatter, label='File Size (MB)')
+        plt.grid(alpha=0.3)
+        plt.tight_layout()
+        plt.savefig(plot_dir / 'quality_map.png', dpi=dpi, bbox_inches='tight')
+        plt.close()
+
+    # 5. 종합 품질 스코어 분포
+    if quality_scores:
+        plt.figure(figsize=(10, 6))
+        plt.hist(quality_scores, bins=20, color='gold', edgecolor='black', alpha=0.7)
+        plt.title('Quality Score Distribution', fontsize=14, fontweight='bold')
+        plt.xlabel('Quality Score (0-100)')
+        plt.ylabel('Count')
+        plt.axvline(30, color='red', linestyle='--', alpha=0.5, label='Poor')
+        plt.axvline(50, color='orange', linestyle='--', alpha=0.5, label='Fair')
+        plt.axvline(70, color='green', linestyle='--', alpha=0.5, label='Good')
+        plt.legend()
+        plt.grid(alpha=0.3)
+        plt.tight_layout()
+        plt.savefig(plot_dir / 'quality_score.png', dpi=dpi, bbox_inches='tight')
+        plt.close()
+
+    # 6. 해상도 분포
+    if widths and heights:
+        resolutions = [w * h / 1000000 for w, h in zip(widths, heights)]
+        plt.figure(figsize=(10, 6))
+        plt.hist(resolutions, bins=20, color='lightblue', edgecolor='black', alpha=0.7)
+        plt.title('Resolution Distribution', fontsize=14, fontweight='bold')
+        plt.xlabel('Megapixels')
+        plt.ylabel('Count')
+        plt.grid(alpha=0.3)
+        plt.tight_layout()
+        plt.savefig(plot_dir / 'resolution_distribution.png', dpi=dpi, bbox_inches='tight')
+        plt.close()
+
+    print(f"   📊 속성 분석 시각화 저장: {plot_dir}/*.png (6개 파일)")
+
+def plot_embeddings(emb_cache, plot_dir, dpi=DEFAULT_PLOT_DPI):
+    """시각화: 임베딩 PCA 3D"""
+    embeddings = [v['embedding'] for v in emb_cache.values() if 'embedding' in v]
+    if len(embeddings) <= 1:
+        return
+
+    import matplotlib.pyplot as plt
+    from sklearn.decomposition import PCA
+    from mpl_toolkits.mplot3d import Axes3D
+
+    emb_array = np.array(embeddings)
+    pca = PCA(n_components=3)
+    emb_3d = pca.fit_transform(emb_array)
+
+    fig = plt.figure(figsize=(12, 9))
+    ax = fig.add_subplot(111, projection='3d')
+
+    scatter = ax.scatter(emb_3d[:, 0], emb_3d[:, 1], emb_3d[:, 2],
+                        alpha=0.6, s=100, c=range(len(emb_3d)),
+                        cmap='viridis', edgecolors='black', linewidth=0.5)
+
+    ax.set_title(f'Embedding Space (PCA 3D)\nVariance: {pca.explained_variance_ratio_.sum():.1%}',
+                fontsize=14, fontweight='bold')
+    ax.set_xlabel(f'PC1 ({pca.explained_variance_ratio_[0]:.1%})')
+    ax.set_ylabel(f'PC2 ({pca.explained_variance_ratio_[1]:.1%})')
+    ax.set_zlabel(f'PC3 ({pca.explained_variance_ratio_[2]:.1%})')
+
+    plt.colorbar(scatter, label='Sample Index', pad=0.1)
+    plt.tight_layout()
+    plt.savefig(plot_dir / 'embedding_pca_3d.png', dpi=dpi, bbox_inches='tight')
+    plt.close()
+    print(f"   📊 임베딩 3D 시각화 저장: {plot_dir / 'embedding_pca_3d.png'}")
+
+def plot_clusters(cluster_cache, plot_dir, dpi=DEFAULT_PLOT_DPI):
+    """시각화: 클러스터 분포 (개별 차트로 저장)"""
+    if 'cluster_labels' not in cluster_cache or 'embeddings_2d' not in cluster_cache:
+        return
+
+    import matplotlib.pyplot as plt
+    from collections import Counter
+
+    labels = np.array(cluster_cache['cluster_labels'])
+    emb_2d = np.array(cluster_cache['embeddings_2d'])
+    cluster_counts = Counter(labels)
+
+    # 1. 클러스터 크기 분포
+    plt.figure(figsize=(10, 6))
+    plt.bar(cluster_counts.keys(), cluster_counts.values(),
+           color='lightcoral', edgecolor='black', alpha=0.7)
+    plt.title('Cluster Size Distribution', fontsize=14, fontweight='bold')
+    plt.xlabel('Cluster ID')
+    plt.ylabel('Count')
+    plt.grid(alpha=0.3, axis='y')
+    plt.tight_layout()
+    plt.savefig(plot_dir / 'cluster_distribution.png', dpi=dpi, bbox_inches='tight')
+    plt.close()
+
+    # 2. 클러스터 시각화 (2D PCA)
+    plt.figure(figsize=(10, 8))
+    scatter = plt.scatter(emb_2d[:, 0], emb_2d[:, 1], c=labels,
+                        cmap='tab10', alpha=0.6, s=100, edgecolors='black')
+    plt.title('Cluster Visualization', fontsize=14, fontweight='bold')
+    plt.xlabel('PC1')
+    plt.ylabel('PC2')
+    plt.colorbar(scatter, label='Cluster ID')
+    plt.grid(alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(plot_dir / 'cluster_visualization.png', dpi=dpi, bbox_inches='tight')
+    plt.close()
+
+    print(f"   📊 클러스터 분석 시각화 저장: {plot_dir}/*.png (2개 파일)")
+
+def analyze_dataset(dataset_name=None, stage='all'):
+    """ddoc 모듈로 데이터셋 분석 (데이터셋별 독립 관리)
+
+    Args:
+        dataset_name: 분석할 데이터셋 이름 (None이면 기본값 사용)
+        stage: 'all' 또는 STAGES 중 하나 (단계별 DVC 스테이지 실행)
+    """
+
+    # params.yaml 로드
+    with open('params.yaml', 'r') as f:
+        params = yaml.safe_load(f)
+
+    # 데이터셋 정보 추출
+    if dataset_name:
+        # 특정 데이터셋 찾기
+        dataset_config = next(
+            (ds for ds in params.get('datasets', []) if ds['name'] == dataset_name),
+            None
+        )
+        if not dataset_config:
+            print(f"❌ 데이터셋 '{dataset_name}'을 찾을 수 없습니다.")
+            sys.exit(1)
+
+        data_dir = dataset_config['path']
+        formats = tuple(dataset_config['formats'])
+    else:
+        # 기본값 사용 (하위 호환)
+        data_dir = params['analysis']['data_dir']
+        formats = tuple(params['analysis']['formats'])
+
+    data_dir = Path(data_dir)
+    dataset_name_only = data_dir.name  # "test_data"
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    # 분석 결과를 datasets 밖의 analysis/ 디렉토리에 저장
+    analysis_root = Path("analysis") / dataset_name_only
+
+    plot_dir = analysis_root / "plots"
+    plot_dir.mkdir(parents=True, exist_ok=True)
+
+    # drift 디렉토리도 미리 생성
+    drift_plot_dir = analysis_root / "drift" / "plots"
+    drift_plot_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"🚀 DVC + ddoc 통합 분석 시작")
+    print(f"=" * 80)
+    print(f"시간: {timestamp}")
+    print(f"데이터 디렉토리: {data_dir}")
+    print(f"지원 형식: {formats}")
+    if stage != 'all':
+        print(f"단계: {stage}")
+    print()
+
+    run_all = stage == 'all'
+    dedup_enabled = params.get('dedup', {}).get('enabled', False)
+    plot_dpi = (params.get('plots') or {}).get('dpi', DEFAULT_PLOT_DPI)
+
+    # 메트릭 저장용 딕셔너리
+    metrics = {}
+    attr_cache = emb_cache = cluster_cache = None
+
+    # 캐시를 갱신하는 단계(1~4)는 데이터셋 잠금 하에서 실행 (ddoc 내부 저장 포함, 동시 실행 직렬화)
+    # 1. 속성 분석
+    if run_all or stage == 'attribute':
+        start = time.perf_counter()
+        with dataset_lock(data_dir):
+            attr_cache = run_attribute_step(data_dir, formats, metrics, params)
+        # 단계 소요 시간은 analysis_planner의 처리량 추정에 사용
+        metrics["attribute_seconds"] = time.perf_counter() - start
+        write_stage_manifest(analysis_root, 'attribute', metrics, cache_fingerprint(attr_cache))
+
+    # 2. 임베딩 분석
+    if run_all or stage == 'embedding':
+        stage_metrics = {}
+        start = time.perf_counter()
+        with dataset_lock(data_dir):
+            emb_cache = run_embedding_step(data_dir, formats, params, stage_metrics)
+        stage_metrics["embedding_seconds"] = time.perf_counter() - start
+        write_stage_manifest(analysis_root, 'embedding', stage_metrics, cache_fingerprint(emb_cache))
+        metrics.update(stage_metrics)
+
+    # 3. 중복 탐지 (dedup.enabled)
+    duplicate_files = set()
+    if dedup_enabled and (run_all or stage == 'dedup'):
+        if emb_cache is None:
+            emb_cache = read_cache(data_dir, "embedding_analysis")
+        stage_metrics = {}
+        start = time.perf_counter()
+        with dataset_lock(data_dir):
+            duplicate_files = run_dedup_step(data_dir, formats, params, emb_cache, analysis_root,
+                                             stage_metrics)
+        stage_metrics["dedup_seconds"] = time.perf_counter() - start
+        write_stage_manifest(analysis_root, 'dedup', stage_metrics, cache_fingerprint(
+            {f: {'file': f} for f in sorted(duplicate_files)}
+        ))
+        metrics.update(stage_metrics)
+
+    # 4. 클러스터링 분석
+    if run_all or stage == 'clustering':
+        if emb_cache is None:
+            emb_cache = read_cache(data_dir, "embedding_analysis")
+        if dedup_enabled and not run_all:
+            from dedup import load_duplicate_exclusions
+            duplicate_files = load_duplicate_exclusions(analysis_root)
+        stage_metrics = {}
+        start = time.perf_counter()
+        with dataset_lock(data_dir):
+            cluster_cache = run_clustering_step(
+                data_dir, params, emb_cache, duplicate_files, stage_metrics, recluster=not run_all
+            )
+        stage_metrics["clustering_seconds"] = time.perf_counter() - start
+        fingerprint = hashlib.md5(np.asarray(
+            (cluster_cache or {}).get('cluster_labels', []), dtype=np.int64
+        ).tobytes()).hexdigest()
+        write_stage_manifest(analysis_root, 'clustering', stage_metrics, fingerprint)
+        metrics.update(stage_metrics)
+
+    if stage not in ('all', 'plots'):
+        print(f"✅ 단계 완료: {stage} → {analysis_root / 'stages' / f'{stage}.json'}")
+        return
+
+    # 5. 시각화 (캐시만 읽어 생성, plots.dpi 변경 시 이 단계만 재실행)
+    print("🎨 Step 5: Plots")
+    print("-" * 80)
+    if not run_all:
+        attr_cache = read_cache(data_dir, "attribute_analysis")
+        emb_cache = read_cache(data_dir, "embedding_analysis")
+        cluster_cache = read_cache(data_dir, "clustering_analysis")
+        metrics = load_stage_metrics(analysis_root)
+    if attr_cache:
+        plot_attributes(attr_cache, plot_dir, plot_dpi)
+    if emb_cache:
+        plot_embeddings(emb_cache, plot_dir, plot_dpi)
+    if cluster_cache:
+        plot_clusters(cluster_cache, plot_dir, plot_dpi)
+    print()
+
+    # 6. 메트릭 저장
     metrics["timestamp"] = timestamp
     metrics["dataset_path"] = str(data_dir)
     metrics_file = analysis_root / "metrics.json"
-    with open(metrics_file, 'w') as f:
-        json.dump(metrics, f, indent=2)
+    write_json_atomic(metrics_file, metrics, indent=2)
     print(f"📝 메트릭 저장: {metrics_file}")
-    
+
+    # 실행 이력 기록 (run_history.py로 추세 조회)
+    history_params = params.get('history') or {}
+    if history_params.get('enabled', True):
+        from run_history import record_run, DEFAULT_DB_PATH
+        record_run(dataset_name_only, 'analysis', metrics, timestamp,
+                   db_path=history_params.get('db_path', DEFAULT_DB_PATH))
+
     print("=" * 80)
     print(f"✅ 전체 분석 완료: {timestamp}")
     print(f"   데이터셋: {data_dir}")
     if 'num_files' in metrics:
         print(f"   총 파일: {metrics['num_files']}개")
-        print(f"   새로 분석: {metrics['files_processed']}개")
-        print(f"   캐시 활용: {metrics['files_cached']}개")
+        print(f"   새로 분석: {metrics.get('files_processed', 0)}개")
+        print(f"   캐시 활용: {metrics.get('files_cached', 0)}개")
 
 if __name__ == "__main__":
-    import sys
-    
+    parser = argparse.ArgumentParser(description="DVC + ddoc 통합 분석")
+    parser.add_argument('dataset', nargs='?', default=None, help="데이터셋 이름 (생략 시 기본값)")
+    parser.add_argument('--stage', default='all', choices=('all',) + STAGES,
+                        help="단계별 실행 (DVC 세분화 스테이지)")
+    parser.add_argument('--plan', action='store_true',
+                        help="분석 없이 단계별 처리 대상/읽을 데이터/예상 시간만 출력")
+    parser.add_argument('--verify', action='store_true',
+                        help="--plan: 캐시된 파일도 내용 해시로 변경 여부 확인 (전체 읽기)")
+    args = parser.parse_args()
+
+    if args.plan:
+        from analysis_planner import plan_from_params, print_plan
+        with open('params.yaml', 'r') as f:
+            print_plan(plan_from_params(yaml.safe_load(f), args.dataset, args.verify))
+        sys.exit(0)
+
     # CLI 인자로 데이터셋 지정 가능
-    dataset_name = sys.argv[1] if len(sys.argv) > 1 else None
-    
-    if dataset_name:
-        print(f"📦 데이터셋: {dataset_name}")
+    if args.dataset:
+        print(f"📦 데이터셋: {args.dataset}")
     else:
         print("📦 기본 데이터셋 사용")
-    
-    analyze_dataset(dataset_name)
+
+    analyze_dataset(args.dataset, args.stage)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+임베딩 백엔드 처리량 벤치마크 (images/s)
+현재 경로(ddoc run_embedding_analysis)와 CPU 백엔드 설정별 비교
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+# ddoc 모듈 import
+sys.path.insert(0, str(Path(__file__).parent.parent / 'datadrift_app_engine'))
+
+from dataset_utils import load_params, resolve_dataset, list_dataset_files, staged_files
+from embedding_backend import EmbeddingEncoder, embed_files
+
+# (이름, runtime, quantize, batch_size, num_workers) — batch_size None이면 params.yaml 값
+BENCHMARK_CONFIGS = [
+    ('torch_fp32_sequential', 'torch', 'none', 1, 0),
+    ('torch_fp32_batched', 'torch', 'none', None, None),
+    ('torch_int8_batched', 'torch', 'int8', None, None),
+    ('onnx_fp32_batched', 'onnx', 'none', None, None),
+    ('onnx_int8_batched', 'onnx', 'int8', None, None),
+]
+
+def benchmark_ddoc(paths, formats, emb_params):
+    """현재 경로: 샘플만 담은 임시 디렉토리에서 ddoc 임베딩 분석 (클러스터링 포함)"""
+    from main import run_embedding_analysis
+
+    with staged_files(paths) as stage_dir:
+        start = time.perf_counter()
+        run_embedding_analysis(
+            [str(stage_dir)],
+            formats,
+            model=emb_params['model'],
+            device=emb_params['device']
+        )
+        elapsed = time.perf_counter() - start
+    return {'images_per_second': len(paths) / elapsed, 'seconds': elapsed}
+
+def benchmark_backend(paths, emb_params, runtime, quantize, batch_size, num_workers):
+    """CPU 백엔드 설정 하나 측정 (모델 로드 시간은 별도 집계)"""
+    start = time.perf_counter()
+    encoder = EmbeddingEncoder(
+        model_name=emb_params['model'],
+        runtime=runtime,
+        quantize=quantize,
+        intra_op_threads=emb_params.get('intra_op_threads'),
+        inter_op_threads=emb_params.get('inter_op_threads')
+    )
+    load_seconds = time.perf_counter() - start
+
+    # 워밍업 (첫 배치의 지연 초기화 비용 제외)
+    embed_files(paths[:batch_size], encoder, batch_size=batch_size, num_workers=0)
+
+    start = time.perf_counter()
+    vectors, failed = embed_files(paths, encoder, batch_size=batch_size, num_workers=num_workers)
+    elapsed = time.perf_counter() - start
+    return {
+        'images_per_second': len(vectors) / elapsed if elapsed > 0 else 0.0,
+        'seconds': elapsed,
+        'load_seconds': load_seconds,
+        'failed': len(failed),
+        'batch_size': batch_size,
+        'num_workers': num_workers
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="임베딩 백엔드 처리량 벤치마크")
+    parser.add_argument('dataset', nargs='?', default=None, help="데이터셋 이름")
+    parser.add_argument('--num-images', type=int, default=256, help="측정에 사용할 이미지 수")
+    parser.add_argument('--skip-ddoc', action='store_true', help="현재 경로(ddoc) 측정 생략")
+    args = parser.parse_args()
+
+    params = load_params()
+    data_dir, formats = resolve_dataset(params, args.dataset)
+    emb_params = params['embedding']
+
+    image_formats = tuple(f for f in formats if f.lower() in ('.jpg', '.jpeg', '.png', '.bmp', '.webp'))
+    files = sorted(list_dataset_files(data_dir, image_formats).values())[:args.num_images]
+    if not files:
+        print("⚠️ 벤치마크할 이미지가 없습니다.")
+        return
+
+    print(f"⏱️  임베딩 벤치마크: {data_dir} ({len(files)}개 이미지)")
+    print("=" * 80)
+
+    results = {}
+    if not args.skip_ddoc:
+        try:
+            results['ddoc_current'] = benchmark_ddoc(files, formats, emb_params)
+        except ImportError as e:
+            print(f"⚠️ ddoc 경로 측정 생략: {e}")
+
+    for name, runtime, quantize, batch_size, num_workers in BENCHMARK_CONFIGS:
+        batch_size = batch_size or emb_params.get('batch_size', 32)
+        num_workers = emb_params.get('num_workers', 4) if num_workers is None else num_workers
+        try:
+            results[name] = benchmark_backend(files, emb_params, runtime, quantize, batch_size, num_workers)
+        except ImportError as e:
+            print(f"⚠️ {name} 생략: {e}")
+
+    baseline = results.get('ddoc_current') or results.get('torch_fp32_sequential')
+    print(f"{'config':<26}{'images/s':>12}{'speedup':>10}")
+    print("-" * 48)
+    for name, res in results.items():
+        speedup = res['images_per_second'] / baseline['images_per_second'] if baseline else 0
+        res['speedup'] = speedup
+        print(f"{name:<26}{res['images_per_second']:>12.1f}{speedup:>9.2f}x")
+
+    out_file = Path("analysis") / data_dir.name / "embedding_benchmark.json"
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_file, 'w') as f:
+        json.dump({'num_images': len(files), 'results': results}, f, indent=2)
+    print(f"\n📝 벤치마크 결과 저장: {out_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+동시 실행에 안전한 캐시/출력 쓰기
+크론 중첩 실행이나 병렬 오케스트레이터가 같은 데이터셋을 다뤄도 캐시와 출력이 깨지지 않도록
+
+- 데이터셋 잠금: <dataset>/cache/.lock (fcntl.flock, 같은 스레드 안에서는 재진입 가능)
+  쓰기는 배타 잠금, 캐시 읽기(read_cache/load_cache)는 공유 잠금 → ddoc 저장 중인 캐시를 읽지 않음
+- 원자적 쓰기: 같은 디렉토리 임시 파일에 쓰고 fsync 후 os.replace → 읽는 쪽은 이전/새 파일만 봄
+- 저널: 증분 항목을 <dataset>/cache/<key>.journal에 먼저 append,
+  캐시 저장 전에 중단돼도 다음 실행에서 재생해 이미 계산한 항목을 다시 계산하지 않음
+"""
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from dataset_utils import CACHE_DIR_NAME
+
+try:
+    import fcntl
+except ImportError:  # 비 POSIX: 잠금 없이 동작
+    fcntl = None
+
+LOCK_FILE = ".lock"
+JOURNAL_SUFFIX = ".journal"
+LOCK_POLL_INTERVAL = 0.1
+
+_local = threading.local()
+
+def cache_dir(data_dir):
+    """ddoc 캐시 디렉토리 (<dataset>/cache)"""
+    return Path(data_dir) / CACHE_DIR_NAME
+
+def dataset_lock(data_dir, timeout=None, shared=False):
+    """데이터셋 단위 잠금 (<dataset>/cache/.lock, shared=True면 읽기용 공유 잠금)"""
+    return file_lock(cache_dir(data_dir) / LOCK_FILE, timeout, shared)
+
+@contextmanager
+def file_lock(path, timeout=None, shared=False):
+    """잠금 파일 기준 배타(또는 공유) 잠금
+
+    같은 스레드의 중첩 호출은 카운트만 증가 (flock은 열린 파일 단위라 재획득 시 교착)
+    배타 잠금 안의 공유 잠금 요청은 그대로 통과, 공유 잠금 안의 배타 잠금 요청은 RuntimeError
+
+    Args:
+        timeout: 대기 초 (None이면 무제한), 초과 시 TimeoutError
+    """
+    path = Path(path)
+    key = str(path.resolve())
+    held = getattr(_local, 'held', None)
+    if held is None:
+        held = _local.held = {}
+
+    if key in held:
+        if held[key][2] and not shared:
+            raise RuntimeError(f"공유 잠금을 가진 상태에서 배타 잠금 요청: {path}")
+        held[key][1] += 1
+        try:
+            yield
+        finally:
+            held[key][1] -= 1
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) |
+                                (fcntl.LOCK_NB if deadline else 0))
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f"잠금 대기 시간 초과: {path}")
+                    time.sleep(LOCK_POLL_INTERVAL)
+        held[key] = [fd, 1, shared]
+        try:
+            yield
+        finally:
+            del held[key]
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def atomic_write(path, mode='w', **kwargs):
+    """임시 파일에 쓴 뒤 rename으로 교체 (예외 시 기존 파일 유지)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp는 0600으로 생성 → 기존 파일 권한 유지 (새 파일은 0644)
+        os.chmod(tmp, path.stat().st_mode & 0o777 if path.exists() else 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+def write_json_atomic(path, obj, **kwargs):
+    with atomic_write(path) as f:
+        json.dump(obj, f, **kwargs)
+
+def append_lines(path, lines, header=None):
+    """텍스트 행 append (한 번의 write + fsync, header는 빈 파일일 때만)
+
+    O_APPEND 단일 write라 동시 append도 행이 섞이지 않음
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        text = ''.join(lines)
+        if header and f.tell() == 0:
+            text = header + text
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+class CacheJournal:
+    """캐시 키별 write-ahead 저널 (pickle 레코드 append, 마지막 불완전 레코드는 무시)
+
+    레코드: ('set', {파일명: 항목}) 또는 ('del', [파일명, ...])
+    """
+
+    def __init__(self, data_dir, key):
+        self.data_dir = Path(data_dir)
+        self.path = cache_dir(data_dir) / f"{key}{JOURNAL_SUFFIX}"
+
+    def _append(self, record):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with dataset_lock(self.data_dir), open(self.path, 'ab') as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def set(self, entries):
+        if entries:
+            self._append(('set', dict(entries)))
+
+    def delete(self, names):
+        names = list(names)
+        if names:
+            self._append(('del', names))
+
+    def replay(self, cache):
+        """저널 레코드를 cache dict에 적용
+
+        Returns:
+            적용한 레코드 수
+        """
+        if not self.path.exists():
+            return 0
+        applied = 0
+        with open(self.path, 'rb') as f:
+            while True:
+                try:
+                    op, payload = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    break
+                if op == 'set':
+                    cache.update(payload)
+                else:
+                    for name in payload:
+                        cache.pop(name, None)
+                applied += 1
+        return applied
+
+    def clear(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+def read_cache(data_dir, key):
+    """공유 잠금 하에서 ddoc 캐시 읽기 (save_cache가 쓰는 도중의 캐시를 읽지 않음)
+
+    캐시 디렉토리가 없으면 잠금 파일을 만들지 않고 바로 읽음
+    """
+    from cache_utils import get_cached_analysis_data
+
+    if not cache_dir(data_dir).is_dir():
+        return get_cached_analysis_data(data_dir, key)
+    with dataset_lock(data_dir, shared=True):
+        return get_cached_analysis_data(data_dir, key)
+
+def load_cache(data_dir, key):
+    """ddoc 캐시 + 저널 재생 (저장되지 않은 증분 항목 복구)"""
+    journal = CacheJournal(data_dir, key)
+    if not cache_dir(data_dir).is_dir():
+        return read_cache(data_dir, key)
+    with dataset_lock(data_dir, shared=True):
+        cache = read_cache(data_dir, key)
+        if journal.path.exists():
+            if cache is None:
+                cache = {}
+            recovered = journal.replay(cache)
+            if recovered:
+                print(f"   ♻️  저널 복구: {key} ({recovered}개 레코드)")
+    return cache
+
+def save_cache(data_dir, obj, key):
+    """잠금 하에서 ddoc 캐시 저장 후 저널 정리 (저장본이 저널 내용을 포함)"""
+    from cache_utils import save_analysis_data
+
+    with dataset_lock(data_dir):
+        save_analysis_data(data_dir, obj, key)
+        CacheJournal(data_dir, key).clear()
+
+def merge_cache(data_dir, key, entries=None, removed=()):
+    """잠금 하에서 최신 캐시를 다시 읽어 항목 병합 후 저장 (동시 실행의 갱신 유실 방지)
+
+    Returns:
+        병합된 캐시
+    """
+    with dataset_lock(data_dir):
+        cache = load_cache(data_dir, key) or {}
+        cache.update(entries or {})
+        for name in removed:
+            cache.pop(name, None)
+        save_cache(data_dir, cache, key)
+    return cache
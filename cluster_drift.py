@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+클러스터 단위 드리프트 분석
+baseline 클러스터링(clustering_analysis)의 centroid에 현재 임베딩을 배정하고
+클러스터별 비율 변화, 클러스터별 MMD, 신규/소멸 클러스터를 리포트
+
+임베딩은 float 배열 또는 압축 캐시(embedding_codec compact dict) 모두 지원
+"""
+import numpy as np
+
+from drift_metrics import DEFAULT_BLOCK_SIZE, calculate_mmd
+from embedding_codec import decode
+
+DEFAULT_CONFIG = {
+    'block_size': 4096,
+    'max_samples_per_cluster': 500,   # 클러스터별 MMD 샘플 수
+    'outlier_quantile': 0.95,         # baseline 클러스터 반경 (거리 분위수)
+    'emerging_fraction': 0.15,        # 반경 밖 신규 파일 비율 임계값
+    'growth_ratio': 2.0,              # 비율이 이 배수 이상 증가하면 GROWING
+    'vanishing_ratio': 0.25,          # 비율이 이 배수 미만으로 감소하면 VANISHING
+    'seed': 42
+}
+
+def _num_rows(X):
+    return len(X['codes']) if isinstance(X, dict) else len(X)
+
+def _rows(X, idx):
+    """행 인덱스 → float32 임베딩 (압축 캐시는 해당 행만 역양자화)"""
+    if isinstance(X, dict):
+        return decode(X['codes'][idx], X['params'])
+    return np.asarray(X[idx], dtype=np.float32)
+
+def _raw_rows(X, idx):
+    """동일성 비교용 원본 행 (압축 캐시는 코드 그대로)"""
+    return X['codes'][idx] if isinstance(X, dict) else X[idx]
+
+def assign_to_centroids(X, centroids, indices=None, block_size=DEFAULT_BLOCK_SIZE):
+    """최근접 centroid 배정 (블록 단위 행렬곱, Python 루프는 블록 수만큼)
+
+    Returns:
+        (labels, distances): 각 행의 centroid 인덱스와 유클리드 거리
+    """
+    centroids = np.asarray(centroids, dtype=np.float32)
+    c_sqnorms = (centroids ** 2).sum(axis=1)
+    if indices is None:
+        indices = np.arange(_num_rows(X))
+
+    labels = np.empty(len(indices), dtype=np.int64)
+    distances = np.empty(len(indices), dtype=np.float32)
+    for start in range(0, len(indices), block_size):
+        block = _rows(X, indices[start:start + block_size])
+        sq = (block ** 2).sum(axis=1)[:, None] - 2 * block @ centroids.T + c_sqnorms[None, :]
+        best = sq.argmin(axis=1)
+        labels[start:start + len(block)] = best
+        distances[start:start + len(block)] = np.sqrt(np.maximum(sq[np.arange(len(block)), best], 0))
+    return labels, distances
+
+def prepare_baseline_clusters(clustering, ref_files, ref_X, config):
+    """baseline 클러스터 정보 (centroid, 파일별 label, 클러스터 반경) 준비
+
+    ddoc 캐시에 centroid/files가 없으면 label과 baseline 임베딩으로 계산.
+    계산된 값은 clustering dict에 채워 넣어 다음 실행에서 재사용
+
+    Returns:
+        (clustering, updated): 보강된 clustering dict, 저장 필요 여부
+    """
+    updated = False
+    labels = np.asarray(clustering.get('cluster_labels', []))
+    files = clustering.get('files')
+    if files is None and len(labels) == len(ref_files):
+        # ddoc 클러스터링은 임베딩 캐시 순서와 동일하다고 가정
+        files = list(ref_files)
+        clustering['files'] = files
+        updated = True
+
+    ref_index = {f: i for i, f in enumerate(ref_files)}
+
+    if 'centroids' not in clustering:
+        if files is None or len(files) != len(labels):
+            return None, False
+        rows = np.array([ref_index.get(f, -1) for f in files])
+        valid = (rows >= 0) & (labels >= 0)  # DBSCAN 노이즈(-1) 제외
+        cluster_ids = np.unique(labels[valid])
+        centroids = []
+        for k in cluster_ids:
+            members = rows[valid & (labels == k)]
+            centroids.append(_rows(ref_X, members).mean(axis=0))
+        clustering['centroids'] = np.stack(centroids).tolist()
+        clustering['centroid_ids'] = cluster_ids.tolist()
+        updated = True
+
+    centroids = np.asarray(clustering['centroids'], dtype=np.float32)
+    if 'centroid_ids' not in clustering:
+        clustering['centroid_ids'] = list(range(len(centroids)))
+        updated = True
+
+    if 'file_labels' not in clustering or 'radii' not in clustering:
+        # baseline 전체 배정 (최초 1회) → 파일별 label, 클러스터 반경
+        ref_labels, ref_dists = assign_to_centroids(ref_X, centroids, block_size=config['block_size'])
+        clustering['file_labels'] = dict(zip(ref_files, ref_labels.tolist()))
+        radii = []
+        for k in range(len(centroids)):
+            d = ref_dists[ref_labels == k]
+            radii.append(float(np.quantile(d, config['outlier_quantile'])) if len(d) else 0.0)
+        clustering['radii'] = radii
+        updated = True
+
+    return clustering, updated
+
+def compute_cluster_drift(clustering, ref_files, ref_X, cur_files, cur_X, config=None, gamma=1.0):
+    """클러스터 단위 드리프트 계산
+
+    현재 파일 중 baseline과 동일한 임베딩은 baseline 배정을 재사용하고
+    신규/변경 파일만 centroid에 배정 (비용이 신규 파일 수에 선형)
+
+    Args:
+        gamma: 클러스터별 MMD RBF gamma (detect_drift 전체 MMD와 같은 값)
+
+    Returns:
+        (result, clustering, updated)
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    clustering, updated = prepare_baseline_clusters(clustering, ref_files, ref_X, config)
+    if clustering is None:
+        return None, None, False
+
+    centroids = np.asarray(clustering['centroids'], dtype=np.float32)
+    cluster_ids = clustering['centroid_ids']
+    radii = np.asarray(clustering['radii'])
+    ref_labels_by_file = clustering['file_labels']
+    n_clusters = len(centroids)
+
+    ref_index = {f: i for i, f in enumerate(ref_files)}
+    ref_labels = np.array([ref_labels_by_file.get(f, -1) for f in ref_files])
+
+    # 재사용 가능한 배정 판별 (동일 파일명 + 동일 임베딩)
+    cur_labels = np.full(len(cur_files), -1, dtype=np.int64)
+    common_cur = np.array([i for i, f in enumerate(cur_files) if f in ref_index], dtype=np.int64)
+    if len(common_cur):
+        common_ref = np.array([ref_index[cur_files[i]] for i in common_cur], dtype=np.int64)
+        same = np.all(_raw_rows(cur_X, common_cur) == _raw_rows(ref_X, common_ref), axis=1)
+        cur_labels[common_cur[same]] = ref_labels[common_ref[same]]
+
+    new_idx = np.flatnonzero(cur_labels < 0)
+    new_labels, new_dists = assign_to_centroids(cur_X, centroids, new_idx, config['block_size'])
+    cur_labels[new_idx] = new_labels
+
+    # 반경 밖 신규 파일 → 신규 클러스터 후보
+    outliers = new_dists > radii[new_labels] if len(new_idx) else np.zeros(0, dtype=bool)
+    expected_fraction = 1.0 - config['outlier_quantile']
+    outlier_fraction = float(outliers.mean()) if len(outliers) else 0.0
+
+    ref_counts = np.bincount(ref_labels[ref_labels >= 0], minlength=n_clusters)
+    cur_counts = np.bincount(cur_labels, minlength=n_clusters)
+    ref_share = ref_counts / max(ref_counts.sum(), 1)
+    cur_share = cur_counts / max(cur_counts.sum(), 1)
+    outlier_counts = np.bincount(new_labels[outliers], minlength=n_clusters) if len(outliers) else np.zeros(n_clusters, int)
+
+    rng = np.random.default_rng(config['seed'])
+    max_samples = config['max_samples_per_cluster']
+    clusters = {}
+    for k in range(n_clusters):
+        ref_members = np.flatnonzero(ref_labels == k)
+        cur_members = np.flatnonzero(cur_labels == k)
+
+        mmd = None
+        if len(ref_members) > 1 and len(cur_members) > 1:
+            if len(ref_members) > max_samples:
+                ref_members = np.sort(rng.choice(ref_members, max_samples, replace=False))
+            if len(cur_members) > max_samples:
+                cur_members = np.sort(rng.choice(cur_members, max_samples, replace=False))
+            mmd = calculate_mmd(_rows(ref_X, ref_members), _rows(cur_X, cur_members), gamma)
+
+        if ref_counts[k] > 0 and cur_counts[k] == 0:
+            status = 'VANISHED'
+        elif ref_share[k] > 0 and cur_share[k] < ref_share[k] * config['vanishing_ratio']:
+            status = 'VANISHING'
+        elif cur_share[k] > ref_share[k] * config['growth_ratio']:
+            status = 'GROWING'
+        else:
+            status = 'STABLE'
+
+        clusters[str(cluster_ids[k])] = {
+            'baseline_count': int(ref_counts[k]),
+            'current_count': int(cur_counts[k]),
+            'baseline_share': float(ref_share[k]),
+            'current_share': float(cur_share[k]),
+            'share_change': float(cur_share[k] - ref_share[k]),
+            'mmd': mmd,
+            'outliers': int(outlier_counts[k]),
+            'status': status
+        }
+
+    emerging = outlier_fraction > max(config['emerging_fraction'], expected_fraction)
+    result = {
+        'n_clusters': n_clusters,
+        # 클러스터 비율 분포의 Total Variation Distance
+        'population_shift': float(0.5 * np.abs(cur_share - ref_share).sum()),
+        'assigned_files': int(len(new_idx)),
+        'reused_assignments': int(len(cur_files) - len(new_idx)),
+        'emerging': {
+            'flag': bool(emerging),
+            'outlier_count': int(outliers.sum()) if len(outliers) else 0,
+            'outlier_fraction': outlier_fraction,
+            'expected_fraction': float(expected_fraction)
+        },
+        'vanishing_clusters': [cid for cid, c in clusters.items() if c['status'] in ('VANISHED', 'VANISHING')],
+        'growing_clusters': [cid for cid, c in clusters.items() if c['status'] == 'GROWING'],
+        'clusters': clusters
+    }
+    return result, clustering, updated
+
+def plot_cluster_drift(result, out_path):
+    """클러스터별 baseline/current 비율 비교 막대 차트"""
+    import matplotlib.pyplot as plt
+
+    ids = list(result['clusters'].keys())
+    ref_share = [result['clusters'][c]['baseline_share'] for c in ids]
+    cur_share = [result['clusters'][c]['current_share'] for c in ids]
+    x = np.arange(len(ids))
+    status_color = {'VANISHED': 'red', 'VANISHING': 'orange', 'GROWING': 'purple', 'STABLE': 'black'}
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.bar(x - 0.2, ref_share, 0.4, label='Baseline', color='blue', alpha=0.6, edgecolor='black')
+    ax.bar(x + 0.2, cur_share, 0.4, label='Current', color='red', alpha=0.6, edgecolor='black')
+    ax.set_xticks(x)
+    ax.set_xticklabels(ids)
+    for tick, cid in zip(ax.get_xticklabels(), ids):
+        tick.set_color(status_color.get(result['clusters'][cid]['status'], 'black'))
+
+    title = f"Cluster Population Drift (TVD={result['population_shift']:.3f})"
+    if result['emerging']['flag']:
+        title += f" - EMERGING ({result['emerging']['outlier_fraction']:.1%} outliers)"
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.set_xlabel('Cluster ID')
+    ax.set_ylabel('Share')
+    ax.legend()
+    ax.grid(alpha=0.3, axis='y')
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=300, bbox_inches='tight')
+    plt.close()
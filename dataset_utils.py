@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+분석/드리프트 스크립트 공용 유틸리티
+params.yaml 로드, 데이터셋 경로 해석, 파일 목록 수집, 임시 staging 디렉토리
+"""
+import os
+import sys
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import yaml
+
+# ddoc가 자동으로 제외하는 캐시 디렉토리 이름
+CACHE_DIR_NAME = "cache"
+
+def load_params(path='params.yaml'):
+    """params.yaml 로드"""
+    with open(path, 'r') as f:
+        return yaml.safe_load(f)
+
+def resolve_dataset(params, dataset_name=None):
+    """데이터셋 이름으로 (data_dir, formats) 조회 (None이면 analysis 기본값)"""
+    if dataset_name:
+        dataset_config = next(
+            (ds for ds in params.get('datasets', []) if ds['name'] == dataset_name),
+            None
+        )
+        if not dataset_config:
+            print(f"❌ 데이터셋 '{dataset_name}'을 찾을 수 없습니다.")
+            sys.exit(1)
+        return Path(dataset_config['path']), tuple(dataset_config['formats'])
+
+    return Path(params['analysis']['data_dir']), tuple(params['analysis']['formats'])
+
+def list_dataset_files(data_dir, formats):
+    """데이터셋 내 분석 대상 파일 목록 {파일명: 경로}
+
+    ddoc 캐시와 동일하게 파일명(basename)을 키로 사용하며 cache/ 디렉토리는 제외
+    """
+    files = {}
+    for root, dirs, names in os.walk(data_dir):
+        dirs[:] = [d for d in dirs if d != CACHE_DIR_NAME]
+        for name in names:
+            if name.endswith(tuple(formats)):
+                files[name] = Path(root) / name
+    return files
+
+@contextmanager
+def staged_files(paths, prefix='ddoc_stage_'):
+    """파일 일부만 담은 임시 디렉토리 생성 (심볼릭 링크)
+
+    디렉토리 단위로 동작하는 ddoc 함수를 파일 부분집합에 적용할 때 사용
+    """
+    stage_dir = Path(tempfile.mkdtemp(prefix=prefix))
+    try:
+        for path in paths:
+            path = Path(path).resolve()
+            link = stage_dir / path.name
+            if not link.exists():
+                os.symlink(path, link)
+        yield stage_dir
+    finally:
+        shutil.rmtree(stage_dir, ignore_errors=True)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+파일 부분집합 증분 분석
+변경된 파일만 임시 staging 디렉토리에서 ddoc로 분석한 뒤
+결과를 데이터셋 캐시(attribute_analysis / embedding_analysis)에 병합
+
+ddoc 함수는 디렉토리 단위로 동작하므로 전체 재스캔 없이 소수 파일을 반영할 때 사용
+"""
+import time
+import inspect
+from pathlib import Path
+
+from dataset_utils import staged_files
+
+# cpu 백엔드 인코더 재사용 (감시 데몬처럼 반복 호출되는 경우 모델 로드 1회)
+_ENCODERS = {}
+
+def _merge_staged(data_dir, stage_dir, cache_key, names):
+    """staging 디렉토리 캐시에서 지정 파일 결과만 데이터셋 캐시로 병합"""
+    from cache_utils import get_cached_analysis_data
+    from cache_io import load_cache, merge_cache
+
+    staged = get_cached_analysis_data(stage_dir, cache_key) or {}
+    entries = {name: staged[name] for name in names if name in staged}
+    if not entries:
+        return load_cache(data_dir, cache_key) or {}, 0
+    # 잠금 하에서 최신 캐시에 병합 (동시 분석 실행의 갱신 유실 방지)
+    return merge_cache(data_dir, cache_key, entries), len(entries)
+
+def no_clustering_kwargs(run_embedding_analysis, num_files):
+    """부분집합 임베딩에서 ddoc 클러스터링을 생략하는 인자
+
+    skip_clustering을 지원하는 ddoc 버전은 클러스터링을 끄고,
+    아니면 k를 고정해 최소 비용(silhouette 탐색 없음)으로 실행
+    """
+    if 'skip_clustering' in inspect.signature(run_embedding_analysis).parameters:
+        return {'skip_clustering': True}
+    return {'n_clusters': max(1, min(2, num_files))}
+
+def remove_from_caches(data_dir, names, cache_keys=("attribute_analysis", "embedding_analysis")):
+    """삭제된 파일을 데이터셋 캐시에서 제거
+
+    Returns:
+        제거된 항목 수
+    """
+    from cache_io import dataset_lock, load_cache, save_cache
+
+    removed = 0
+    with dataset_lock(data_dir):
+        for key in cache_keys:
+            cache = load_cache(data_dir, key)
+            if not cache:
+                continue
+            hits = [n for n in names if n in cache]
+            for name in hits:
+                del cache[name]
+            if hits:
+                save_cache(data_dir, cache, key)
+                removed += len(hits)
+    return removed
+
+def _embed_subset_cpu(data_dir, paths, emb_params):
+    """cpu 백엔드: staging 없이 변경 파일만 바로 임베딩"""
+    from cache_io import load_cache, merge_cache
+    from embedding_backend import build_encoder, embed_files, file_hash, DEFAULT_BATCH_SIZE
+
+    key = (emb_params.get('model'), emb_params.get('runtime'), emb_params.get('quantize'))
+    if key not in _ENCODERS:
+        _ENCODERS[key] = build_encoder(emb_params)
+
+    # 소수 파일이므로 워커 프로세스 생성 비용을 피해 메인 프로세스에서 디코딩
+    vectors, failed = embed_files(
+        paths, _ENCODERS[key],
+        batch_size=emb_params.get('batch_size', DEFAULT_BATCH_SIZE),
+        num_workers=0
+    )
+    entries = {Path(path).name: {'embedding': vec.tolist(), 'file_hash': file_hash(path)}
+               for path, vec in vectors.items()}
+    if entries:
+        cache = merge_cache(data_dir, "embedding_analysis", entries)
+    else:
+        cache = load_cache(data_dir, "embedding_analysis") or {}
+    return cache, len(vectors), len(failed)
+
+def analyze_subset(data_dir, paths, formats, params):
+    """변경된 파일만 속성/임베딩 분석 후 데이터셋 캐시에 병합
+
+    Args:
+        data_dir: 데이터셋 경로 (캐시 위치)
+        paths: 분석할 파일 경로 목록
+        formats: 지원 확장자 튜플
+        params: params.yaml 전체
+
+    Returns:
+        (attr_cache, emb_cache, stats)
+    """
+    from main import run_attribute_analysis_wrapper, run_embedding_analysis
+
+    data_dir = Path(data_dir)
+    paths = [Path(p) for p in paths if Path(p).exists()]
+    names = [p.name for p in paths]
+    emb_params = params['embedding']
+    stats = {'files': len(paths)}
+
+    start = time.perf_counter()
+    with staged_files(paths, prefix='ddoc_subset_') as stage_dir:
+        run_attribute_analysis_wrapper([str(stage_dir)], formats)
+        attr_cache, stats['attribute_merged'] = _merge_staged(
+            data_dir, stage_dir, "attribute_analysis", names
+        )
+
+        if emb_params.get('backend', 'ddoc') == 'cpu':
+            emb_cache, stats['embedding_merged'], stats['embedding_failed'] = _embed_subset_cpu(
+                data_dir, paths, emb_params
+            )
+        else:
+            # 부분집합 클러스터링 결과는 사용하지 않음 (데이터셋 클러스터링은 별도 갱신)
+            run_embedding_analysis(
+                [str(stage_dir)],
+                formats,
+                model=emb_params['model'],
+                device=emb_params['device'],
+                **no_clustering_kwargs(run_embedding_analysis, len(paths))
+            )
+            emb_cache, stats['embedding_merged'] = _merge_staged(
+                data_dir, stage_dir, "embedding_analysis", names
+            )
+    stats['seconds'] = time.perf_counter() - start
+    return attr_cache, emb_cache, stats
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+근접 중복(near-duplicate) 탐지
+- 임베딩: random hyperplane(SimHash) LSH 다중 테이블 → 버킷 내 코사인 유사도 검증
+  max_bucket_size를 넘는 버킷은 추가 hyperplane으로 재분할, 재분할되지 않는 버킷(거의 동일한 임베딩 다수)은
+  대표 임베딩과 비교해 묶음
+- 이미지: dHash(64bit) 비둘기집 밴드 분할 → 버킷 내 해밍 거리 검증 (벡터화)
+  동일 해시는 먼저 하나로 합치고, 큰 버킷은 남은 비트에 비둘기집 분할을 다시 적용 (누락 없음)
+- 후보 쌍을 union-find로 묶어 중복 그룹 생성, analysis/<dataset>/duplicates.tsv 저장
+"""
+import csv
+from pathlib import Path
+
+import numpy as np
+
+from dataset_utils import list_dataset_files
+from cache_io import atomic_write
+
+PHASH_CACHE = "perceptual_hash"
+DUPLICATES_FILE = "duplicates.tsv"
+IMAGE_FORMATS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+DEFAULT_CONFIG = {
+    'embedding_threshold': 0.97,   # 코사인 유사도 임계값
+    'phash_max_distance': 4,       # dHash 해밍 거리 임계값
+    'lsh_bits': 12,                # 테이블당 hyperplane 수
+    'lsh_tables': 10,              # LSH 테이블 수 (재현율 ↑, 비용 ↑)
+    'max_bucket_size': 1000,       # 이보다 큰 버킷은 재분할 후 검증 (쌍 비교 비용 상한)
+    'seed': 42
+}
+
+# 임베딩 버킷 재분할 최대 깊이 (깊이마다 lsh_bits개 hyperplane 추가)
+MAX_RESPLIT_DEPTH = 4
+
+# 바이트별 1 비트 수 (해밍 거리 계산)
+POPCOUNT_8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def dhash(path):
+    """차이 해시(dHash) 64bit 정수 (9x8 그레이스케일 인접 픽셀 비교)"""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        small = img.convert('L').resize((9, 8), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+def update_phash_cache(data_dir, formats):
+    """이미지 dHash 캐시 증분 갱신 (파일 크기/수정시각이 바뀐 파일만 재계산)"""
+    from cache_utils import get_cached_analysis_data
+    from cache_io import save_cache
+
+    cache = get_cached_analysis_data(data_dir, PHASH_CACHE) or {}
+    image_formats = tuple(f for f in formats if f.lower() in IMAGE_FORMATS)
+    actual = list_dataset_files(data_dir, image_formats)
+
+    changed = 0
+    for fname, path in actual.items():
+        stat = path.stat()
+        signature = (stat.st_size, int(stat.st_mtime))
+        entry = cache.get(fname)
+        if entry and entry.get('signature') == signature:
+            continue
+        try:
+            cache[fname] = {'phash': dhash(path), 'signature': signature}
+            changed += 1
+        except Exception:
+            cache.pop(fname, None)
+
+    removed = set(cache) - set(actual)
+    for fname in removed:
+        del cache[fname]
+
+    if changed or removed:
+        save_cache(data_dir, cache, PHASH_CACHE)
+    return cache, changed
+
+class UnionFind:
+    """중복 그룹 병합용 union-find"""
+
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+def _buckets(codes):
+    """정렬 기반 버킷 분할 (크기 2 이상 버킷의 멤버 인덱스)"""
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+    for members in np.split(order, boundaries):
+        if len(members) > 1:
+            yield members
+
+def _simhash(X, planes):
+    weights = 1 << np.arange(planes.shape[1], dtype=np.int64)
+    return ((X @ planes) > 0).astype(np.int64) @ weights
+
+def _embedding_bucket_pairs(X, members, config, table, depth=0):
+    """버킷 하나의 (i, j, cosine) 후보 (큰 버킷은 hyperplane을 추가해 재분할)"""
+    threshold = config['embedding_threshold']
+    if len(members) <= config['max_bucket_size']:
+        sims = X[members] @ X[members].T
+        ii, jj = np.nonzero(np.triu(sims >= threshold, k=1))
+        for a, b in zip(ii, jj):
+            yield int(members[a]), int(members[b]), float(sims[a, b])
+        return
+
+    if depth < MAX_RESPLIT_DEPTH:
+        # 테이블/깊이별 고정 시드 → 재분할 여부와 무관하게 다른 테이블의 hyperplane은 그대로
+        rng = np.random.default_rng((config['seed'], table, depth + 1))
+        planes = rng.standard_normal((X.shape[1], config['lsh_bits'])).astype(np.float32)
+        children = list(_buckets(_simhash(X[members], planes)))
+        if all(len(child) < len(members) for child in children):
+            for child in children:
+                yield from _embedding_bucket_pairs(X, members[child], config, table, depth + 1)
+            return
+
+    # hyperplane으로 나뉘지 않는 버킷 (동일/거의 동일한 임베딩 다수): 대표와 비교해 묶음
+    remaining = members
+    while len(remaining) > 1:
+        leader, rest = remaining[0], remaining[1:]
+        sims = X[rest] @ X[leader]
+        hit = sims >= threshold
+        for j, sim in zip(rest[hit], sims[hit]):
+            yield int(min(leader, j)), int(max(leader, j)), float(sim)
+        remaining = rest[~hit]
+
+def embedding_candidates(X, config):
+    """SimHash LSH로 코사인 유사도 임계값 이상인 쌍 탐색
+
+    Yields:
+        (i, j, cosine)
+    """
+    rng = np.random.default_rng(config['seed'])
+    X = np.asarray(X, dtype=np.float32)
+    X = X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+
+    seen = set()
+    for table in range(config['lsh_tables']):
+        planes = rng.standard_normal((X.shape[1], config['lsh_bits'])).astype(np.float32)
+        for members in _buckets(_simhash(X, planes)):
+            for i, j, sim in _embedding_bucket_pairs(X, members, config, table):
+                if (i, j) not in seen:
+                    seen.add((i, j))
+                    yield i, j, sim
+
+def hamming(a, b):
+    """uint64 배열 간 해밍 거리 (브로드캐스트)"""
+    x = np.ascontiguousarray(np.bitwise_xor(a, b))
+    return POPCOUNT_8[x.view(np.uint8)].reshape(*x.shape, 8).sum(axis=-1, dtype=np.int64)
+
+def _hamming_bucket_pairs(values, members, free_bits, max_dist, max_bucket_size):
+    """일치한 비트를 제외한 free_bits로 버킷 하나의 (i, j, hamming) 후보
+
+    남은 비트에서도 거리 ≤ t이므로 free_bits를 t+1개로 나누면 최소 하나가 일치 → 재분할해도 누락 없음
+    """
+    if len(members) <= max_bucket_size or len(free_bits) <= max_dist:
+        h = values[members]
+        dist = hamming(h[:, None], h[None, :])
+        ii, jj = np.nonzero(np.triu(dist <= max_dist, k=1))
+        for a, b in zip(ii, jj):
+            yield int(members[a]), int(members[b]), int(dist[a, b])
+        return
+
+    for band in np.array_split(free_bits, max_dist + 1):
+        mask = np.uint64(sum(1 << int(bit) for bit in band))
+        rest = np.setdiff1d(free_bits, band)
+        for child in _buckets(values[members] & mask):
+            yield from _hamming_bucket_pairs(values, members[child], rest, max_dist, max_bucket_size)
+
+def phash_candidates(hashes, config):
+    """dHash 해밍 거리 임계값 이하인 쌍 탐색
+
+    거리 ≤ t인 쌍은 64bit를 t+1개 밴드로 나눴을 때 최소 하나의 밴드가 일치 (비둘기집 원리)
+    동일 해시는 하나로 합쳐 비교 (대량의 완전 중복이 한 버킷에 몰리지 않도록)
+
+    Yields:
+        (i, j, hamming)
+    """
+    max_dist = config['phash_max_distance']
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    values, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+
+    # 같은 해시끼리는 거리 0 → 대표(첫 파일)와 묶음
+    for k in np.flatnonzero(first[inverse] != np.arange(len(hashes))):
+        yield int(first[inverse[k]]), int(k), 0
+
+    if len(values) < 2:
+        return
+    seen = set()
+    all_bits = np.arange(64)
+    for i, j, dist in _hamming_bucket_pairs(values, np.arange(len(values)), all_bits,
+                                            max_dist, config['max_bucket_size']):
+        if (i, j) not in seen:
+            seen.add((i, j))
+            a, b = int(first[i]), int(first[j])
+            yield min(a, b), max(a, b), dist
+
+def find_duplicate_groups(emb_cache, phash_cache, config=None):
+    """임베딩 + dHash 기반 중복 그룹 탐색
+
+    Returns:
+        그룹 리스트 [{'representative': 파일명, 'members': [(파일명, 매칭 정보), ...]}]
+        매칭 정보: {'embedding': 최대 코사인, 'phash_distance': 최소 해밍 거리}
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    emb_cache = emb_cache or {}
+    phash_cache = phash_cache or {}
+
+    files = sorted(set(f for f, v in emb_cache.items() if 'embedding' in v) | set(phash_cache))
+    index = {f: i for i, f in enumerate(files)}
+    uf = UnionFind(len(files))
+    matches = {}
+
+    emb_files = [f for f in files if f in emb_cache and 'embedding' in emb_cache[f]]
+    if len(emb_files) > 1:
+        X = np.asarray([emb_cache[f]['embedding'] for f in emb_files], dtype=np.float32)
+        for i, j, sim in embedding_candidates(X, config):
+            a, b = index[emb_files[i]], index[emb_files[j]]
+            uf.union(a, b)
+            for k in (a, b):
+                prev = matches.setdefault(k, {}).get('embedding', 0.0)
+                matches[k]['embedding'] = max(sim, prev)
+
+    hash_files = [f for f in files if f in phash_cache]
+    if len(hash_files) > 1:
+        hashes = [phash_cache[f]['phash'] for f in hash_files]
+        for i, j, dist in phash_candidates(hashes, config):
+            a, b = index[hash_files[i]], index[hash_files[j]]
+            uf.union(a, b)
+            for k in (a, b):
+                prev = matches.setdefault(k, {}).get('phash_distance', 64)
+                matches[k]['phash_distance'] = min(dist, prev)
+
+    components = {}
+    for k in matches:
+        components.setdefault(uf.find(k), []).append(k)
+
+    groups = []
+    for root, members in sorted(components.items()):
+        members = sorted(members)
+        groups.append({
+            'representative': files[members[0]],
+            'members': [(files[k], matches[k]) for k in members]
+        })
+    return groups
+
+def write_duplicates(groups, out_file):
+    """중복 그룹을 TSV로 저장"""
+    # 드리프트 실행이 쓰는 중인 목록을 읽지 않도록 원자적 교체
+    with atomic_write(out_file, newline='') as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow(['group_id', 'file', 'representative', 'method', 'cosine', 'phash_distance'])
+        for gid, group in enumerate(groups):
+            for fname, match in group['members']:
+                methods = []
+                if 'embedding' in match:
+                    methods.append('embedding')
+                if 'phash_distance' in match:
+                    methods.append('phash')
+                method = '+'.join(methods)
+                writer.writerow([
+                    gid, fname, group['representative'], method,
+                    f"{match['embedding']:.4f}" if 'embedding' in match else '',
+                    match.get('phash_distance', '')
+                ])
+
+def load_duplicate_exclusions(analysis_root):
+    """duplicates.tsv에서 제외 대상(대표 파일이 아닌 중복) 파일명 집합 로드"""
+    path = Path(analysis_root) / DUPLICATES_FILE
+    if not path.exists():
+        return set()
+    with open(path, newline='') as f:
+        return {row['file'] for row in csv.DictReader(f, delimiter='\t')
+                if row['file'] != row['representative']}
+
+def run_dedup(data_dir, formats, emb_cache, analysis_root, config=None):
+    """중복 탐지 실행 후 duplicates.tsv 저장
+
+    Returns:
+        통계 dict (groups, duplicate_files)
+    """
+    phash_cache, changed = update_phash_cache(data_dir, formats)
+    groups = find_duplicate_groups(emb_cache, phash_cache, config)
+    write_duplicates(groups, Path(analysis_root) / DUPLICATES_FILE)
+    return {
+        'groups': len(groups),
+        'duplicate_files': sum(len(g['members']) - 1 for g in groups),
+        'phash_updated': changed
+    }
@@ -7,7 +7,6 @@ import sys
 import os
 from pathlib import Path
 from datetime import datetime
-import json
 import pickle
 import yaml
 import numpy as np
@@ -16,60 +15,53 @@ import numpy as np
 sys.path.insert(0, str(Path(__file__).parent.parent / 'datadrift_app_engine'))
 
 try:
-    from cache_utils import get_cached_analysis_data, save_analysis_data
+    from cache_utils import get_cached_analysis_data
     print("✅ ddoc 모듈 로드 성공")
 except ImportError as e:
-    print(f"❌ ddoc 모듈 로드 실패: {e}")
-    sys.exit(1)
+    # 캐시 전용 모드(--cache-only)는 ddoc 없이 아티팩트만으로 실행
+    get_cached_analysis_data = None
+    ddoc_import_error = e
 
-def calculate_kl_divergence(p, q, bins=20):
-    """KL Divergence 계산"""
-    p_hist, edges = np.histogram(p, bins=bins, density=True)
-    q_hist, _ = np.histogram(q, bins=edges, density=True)
-    
-    # 0 방지
-    p_hist = p_hist + 1e-10
-    q_hist = q_hist + 1e-10
-    
-    # 정규화
-    p_hist = p_hist / p_hist.sum()
-    q_hist = q_hist / q_hist.sum()
-    
-    return float(np.sum(p_hist * np.log(p_hist / q_hist)))
+from drift_metrics import (
+    calculate_mmd, calculate_mmd_blocked, attribute_values, attribute_drift_metrics,
+    overall_drift_score, base_score_weights, drift_status
+)
+from embedding_codec import (
+    COMPACT_CACHE, COMPACT_BASELINE_CACHE, build_compact, filter_compact, decode_blocks,
+    decode_sample, compressed_mean, compressed_variance, compact_nbytes, clip_rate
+)
 
-def calculate_mmd(X, Y, gamma=1.0):
-    """Maximum Mean Discrepancy 계산"""
-    XX = np.dot(X, X.T)
-    YY = np.dot(Y, Y.T)
-    XY = np.dot(X, Y.T)
-    
-    X_sqnorms = np.diagonal(XX)
-    Y_sqnorms = np.diagonal(YY)
-    
-    def rbf_kernel(X_sqnorms, Y_sqnorms, XY):
-        K = -2 * XY + X_sqnorms[:, None] + Y_sqnorms[None, :]
-        K = np.exp(-gamma * K)
-        return K
-    
-    K_XX = rbf_kernel(X_sqnorms, X_sqnorms, XX)
-    K_YY = rbf_kernel(Y_sqnorms, Y_sqnorms, YY)
-    K_XY = rbf_kernel(X_sqnorms, Y_sqnorms, XY)
-    
-    m = X.shape[0]
-    n = Y.shape[0]
-    
-    mmd = (K_XX.sum() - np.trace(K_XX)) / (m * (m - 1))
-    mmd += (K_YY.sum() - np.trace(K_YY)) / (n * (n - 1))
-    mmd -= 2 * K_XY.sum() / (m * n)
-    
-    return float(np.sqrt(max(mmd, 0)))
+from cluster_drift import compute_cluster_drift, plot_cluster_drift
+from drift_snapshots import (
+    SNAPSHOT_CACHE, build_snapshot, drift_matrix, apply_retention, baseline_signature, plot_drift_matrix
+)
+from run_history import (
+    DEFAULT_DB_PATH, TIMELINE_HEADER, record_run, append_timeline, timeline_row
+)
+from drift_sampling import should_sample, sample_caches, bootstrap_overall_score
+from group_drift import (
+    GROUP_CACHE, update_group_map, compute_group_drift, plot_group_heatmap, embedding_rows
+)
+from metric_engine import (
+    load_config as load_metric_config, metric_timer, resolve_gamma, embedding_metrics,
+    joint_attribute_metrics
+)
+from cache_io import write_json_atomic, atomic_write
+from drift_artifacts import DatasetCaches, ArtifactCaches, artifact_dir
 
-def detect_drift(dataset_name=None):
+# 압축 임베딩 모드에서 3D 시각화에 사용할 최대 샘플 수
+MAX_PLOT_EMBEDDINGS = 2000
+
+def detect_drift(dataset_name=None, cache_only=False):
     """Baseline과 Current 비교하여 드리프트 탐지 (데이터셋별 독립 관리)
     
     Args:
         dataset_name: 분석할 데이터셋 이름 (None이면 기본값 사용)
+        cache_only: True면 원본 이미지/ddoc 없이 analysis/<dataset>/artifacts만 사용
     """
+    if not cache_only and get_cached_analysis_data is None:
+        print(f"❌ ddoc 모듈 로드 실패: {ddoc_import_error}")
+        sys.exit(1)
     
     # params.yaml 로드
     with open('params.yaml', 'r') as f:
@@ -86,10 +78,23 @@ def detect_drift(dataset_name=None):
             sys.exit(1)
         
         data_dir = Path(dataset_config['path'])
+        formats = tuple(dataset_config['formats'])
     else:
         data_dir = Path(params['analysis']['data_dir'])
+        formats = tuple(params['analysis']['formats'])
     
     dataset_name_only = data_dir.name  # "test_data"
+    
+    # 캐시 접근: 데이터셋 ddoc 캐시 또는 DVC로 추적되는 드리프트 아티팩트
+    if cache_only:
+        try:
+            caches = ArtifactCaches(artifact_dir(data_dir))
+        except FileNotFoundError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"📦 캐시 전용 모드: {caches.root}")
+    else:
+        caches = DatasetCaches(data_dir)
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     
     # 분석 결과를 datasets 밖의 analysis/ 디렉토리에 저장
@@ -100,23 +105,47 @@ def detect_drift(dataset_name=None):
     plot_dir = drift_dir / "plots"
     plot_dir.mkdir(parents=True, exist_ok=True)
     
+    # 실행 이력 DB (run_history.py로 조회/내보내기)
+    history_params = params.get('history') or {}
+    history_enabled = history_params.get('enabled', True)
+    history_db = history_params.get('db_path', DEFAULT_DB_PATH)
+    
     print(f"🔍 드리프트 탐지 시작")
     print(f"=" * 80)
     
+    # 압축 임베딩 모드에서는 원본 임베딩 캐시를 로드하지 않음 (오차 리포트 시 제외)
+    use_compact = params['drift'].get('use_compact_embeddings', False)
+    report_compression = params['drift'].get('report_compression_error', False)
+    load_full_embeddings = not use_compact or report_compression
+    
     # Baseline 로드
-    baseline_attr = get_cached_analysis_data(data_dir, "attribute_analysis_baseline")
-    baseline_emb = get_cached_analysis_data(data_dir, "embedding_analysis_baseline")
+    baseline_attr = caches.get("attribute_analysis_baseline")
+    baseline_emb = None
+    if load_full_embeddings:
+        baseline_emb = caches.get("embedding_analysis_baseline")
     
     # Current 로드
-    current_attr = get_cached_analysis_data(data_dir, "attribute_analysis")
-    current_emb = get_cached_analysis_data(data_dir, "embedding_analysis")
+    current_attr = caches.get("attribute_analysis")
+    current_emb = None
+    if load_full_embeddings:
+        current_emb = caches.get("embedding_analysis")
     
     # Baseline이 없으면 현재를 baseline으로 설정
     if not baseline_attr and current_attr:
         print("⚠️ Baseline이 없습니다. 현재 상태를 Baseline으로 설정합니다.")
-        save_analysis_data(data_dir, current_attr, "attribute_analysis_baseline")
-        if current_emb:
-            save_analysis_data(data_dir, current_emb, "embedding_analysis_baseline")
+        # baseline 캐시 묶음은 한 잠금 안에서 저장 (분석 실행과 섞이지 않도록)
+        with caches.lock():
+            caches.save(current_attr, "attribute_analysis_baseline")
+            if current_emb is None:
+                current_emb = caches.get("embedding_analysis")
+            if current_emb:
+                caches.save(current_emb, "embedding_analysis_baseline")
+            current_compact = caches.get(COMPACT_CACHE)
+            if current_compact:
+                caches.save(current_compact, COMPACT_BASELINE_CACHE)
+            current_clustering = caches.get("clustering_analysis")
+            if current_clustering:
+                caches.save(current_clustering, "clustering_analysis_baseline")
         
         # 초기 메트릭 저장
         metrics = {
@@ -125,13 +154,16 @@ def detect_drift(dataset_name=None):
             'num_files': len(current_attr)
         }
         
-        with open(drift_dir / 'metrics.json', 'w') as f:
-            json.dump(metrics, f, indent=2)
+        write_json_atomic(drift_dir / 'metrics.json', metrics, indent=2)
+        
+        # 실행 이력 기록
+        if history_enabled:
+            record_run(dataset_name_only, 'drift', metrics, timestamp, 0, 0, db_path=history_db)
         
         # 초기 timeline.tsv 생성 (DVC plots 오류 방지)
         timeline_file = drift_dir / "timeline.tsv"
-        with open(timeline_file, 'w') as f:
-            f.write("timestamp\toverall_score\tstatus\tfiles_added\tfiles_removed\n")
+        with atomic_write(timeline_file) as f:
+            f.write(TIMELINE_HEADER)
             f.write(f"{timestamp}\t0.00\tBASELINE\t0\t0\n")
         
         # 빈 plots 디렉토리에 placeholder 생성 (DVC 오류 방지)
@@ -161,105 +193,130 @@ def detect_drift(dataset_name=None):
     print(f"   Total: {len(ref_files)} → {len(cur_files)}")
     print()
     
+    # 중복 파일 제외 (duplicates.tsv의 대표 파일이 아닌 항목)
+    excluded = set()
+    if params.get('dedup', {}).get('exclude_from_drift', False):
+        from dedup import load_duplicate_exclusions
+        excluded = load_duplicate_exclusions(analysis_root)
+        if excluded:
+            baseline_attr = {k: v for k, v in baseline_attr.items() if k not in excluded}
+            current_attr = {k: v for k, v in current_attr.items() if k not in excluded}
+            if baseline_emb:
+                baseline_emb = {k: v for k, v in baseline_emb.items() if k not in excluded}
+            if current_emb:
+                current_emb = {k: v for k, v in current_emb.items() if k not in excluded}
+            common = common - excluded
+            print(f"🧬 중복 파일 제외: {len(excluded)}개")
+            print()
+    
+    # 압축 임베딩 캐시 (baseline이 압축 이전에 생성된 경우 현재 코덱 파라미터로 인코딩)
+    ref_compact = cur_compact = None
+    if use_compact:
+        cur_compact = caches.get(COMPACT_CACHE)
+        ref_compact = caches.get(COMPACT_BASELINE_CACHE)
+        if cur_compact and not ref_compact:
+            if baseline_emb is None:
+                baseline_emb = caches.get("embedding_analysis_baseline")
+            if baseline_emb:
+                ref_files = [f for f, v in baseline_emb.items() if 'embedding' in v]
+                ref_compact = build_compact(
+                    ref_files,
+                    np.array([baseline_emb[f]['embedding'] for f in ref_files]),
+                    cur_compact['params']
+                )
+                caches.save(ref_compact, COMPACT_BASELINE_CACHE)
+        if excluded and ref_compact and cur_compact:
+            ref_compact = filter_compact(ref_compact, excluded)
+            cur_compact = filter_compact(cur_compact, excluded)
+        if not (ref_compact and cur_compact):
+            print("⚠️ 압축 임베딩 캐시가 없어 원본 임베딩으로 계산합니다.")
+            use_compact = False
+            if baseline_emb is None:
+                baseline_emb = caches.get("embedding_analysis_baseline")
+            if current_emb is None:
+                current_emb = caches.get("embedding_analysis")
+            if excluded:
+                baseline_emb = {k: v for k, v in (baseline_emb or {}).items() if k not in excluded}
+                current_emb = {k: v for k, v in (current_emb or {}).items() if k not in excluded}
+    
+    # 통계적 샘플링 (대용량 데이터셋: 층화 reservoir 샘플로 데이터셋 크기와 무관한 고정 비용)
+    sampling_config = params['drift'].get('sampling', {})
+    sampling = None
+    if should_sample(sampling_config, len(baseline_attr), len(current_attr)):
+        baseline_clustering = caches.get("clustering_analysis_baseline") or {}
+        # 임베딩 샘플은 실제로 임베딩이 있는 파일 중에서 선택
+        if use_compact:
+            ref_names, cur_names = ref_compact['files'], cur_compact['files']
+        else:
+            ref_names = [f for f, v in (baseline_emb or {}).items() if 'embedding' in v]
+            cur_names = [f for f, v in (current_emb or {}).items() if 'embedding' in v]
+        full_common = common
+        common, ref_sample, cur_sample, sampling = sample_caches(
+            baseline_attr, current_attr, ref_names, cur_names, common,
+            file_labels=baseline_clustering.get('file_labels'), config=sampling_config
+        )
+        print(f"🎲 샘플링 모드 (목표 오차 {sampling['target_error']}, 신뢰수준 {sampling['confidence']:.0%}, "
+              f"층: {sampling['strata']})")
+        print(f"   속성: {sampling['attribute']['sample']}/{sampling['attribute']['population']}개")
+        print(f"   임베딩: baseline {sampling['embedding_baseline']['sample']}개, "
+              f"current {sampling['embedding_current']['sample']}개")
+        print()
+    
     drift_metrics = {}
     
+    # 추가 메트릭 선택/점수 가중치 (drift.metrics, drift.score_weights), 메트릭별 실행 시간
+    metric_config, score_weights = load_metric_config(params['drift'])
+    # 스냅샷/그룹 점수는 기본 메트릭만 계산 → 추가 메트릭 가중치는 제외하고 재정규화
+    _, secondary_dropped = base_score_weights(score_weights)
+    timing = {}
+    
     # 1. 속성 드리프트 분석
     print("📈 Attribute Drift Analysis:")
     print("-" * 80)
     
     if common:
-        # 파일 크기 드리프트
-        ref_sizes = [baseline_attr[f]['size'] for f in common if 'size' in baseline_attr[f]]
-        cur_sizes = [current_attr[f]['size'] for f in common if 'size' in current_attr[f]]
+        ref_values = attribute_values(baseline_attr, common)
+        cur_values = attribute_values(current_attr, common)
+        ref_sizes, cur_sizes = ref_values['size'], cur_values['size']
+        ref_noise, cur_noise = ref_values['noise'], cur_values['noise']
+        ref_sharp, cur_sharp = ref_values['sharpness'], cur_values['sharpness']
         
-        # 노이즈 레벨 드리프트
-        ref_noise = [baseline_attr[f]['noise_level'] for f in common if 'noise_level' in baseline_attr[f]]
-        cur_noise = [current_attr[f]['noise_level'] for f in common if 'noise_level' in current_attr[f]]
+        with metric_timer(timing, 'attribute'):
+            drift_metrics.update(attribute_drift_metrics(ref_values, cur_values))
         
-        # 선명도 드리프트
-        ref_sharp = [baseline_attr[f]['sharpness'] for f in common if 'sharpness' in baseline_attr[f]]
-        cur_sharp = [current_attr[f]['sharpness'] for f in common if 'sharpness' in current_attr[f]]
-        
-        from scipy.stats import wasserstein_distance, ks_2samp
+        # 속성 결합 공간 검정 (크기/노이즈/선명도 동시 분포)
+        if metric_config['joint_attribute']:
+            with metric_timer(timing, 'joint_attribute'):
+                joint = joint_attribute_metrics(baseline_attr, current_attr, common, metric_config)
+            if joint:
+                drift_metrics['joint_attribute'] = joint
+                print(f"   속성 결합 MMD: {joint['mmd']:.4f} (gamma={joint['gamma']:.4f}, "
+                      f"energy={joint['energy_distance']:.4f})")
         
         # 크기 드리프트
-        if ref_sizes and cur_sizes:
-            size_kl = calculate_kl_divergence(ref_sizes, cur_sizes)
-            size_wd = wasserstein_distance(ref_sizes, cur_sizes)
-            size_ks = ks_2samp(ref_sizes, cur_sizes)
-            
-            drift_metrics['size'] = {
-                'kl_divergence': size_kl,
-                'wasserstein_distance': float(size_wd),
-                'ks_statistic': float(size_ks.statistic),
-                'ks_pvalue': float(size_ks.pvalue)
-            }
-            
-            
+        if 'size' in drift_metrics:
+            size_kl = drift_metrics['size']['kl_divergence']
             print(f"   크기 KL Divergence: {size_kl:.4f}")
-            print(f"   크기 Wasserstein: {size_wd:.4f}")
+            print(f"   크기 Wasserstein: {drift_metrics['size']['wasserstein_distance']:.4f}")
         
         # 노이즈 드리프트
-        if ref_noise and cur_noise:
-            noise_kl = calculate_kl_divergence(ref_noise, cur_noise)
-            noise_wd = wasserstein_distance(ref_noise, cur_noise)
-            
-            drift_metrics['noise'] = {
-                'kl_divergence': noise_kl,
-                'wasserstein_distance': float(noise_wd),
-                'mean_change': float(np.mean(cur_noise) - np.mean(ref_noise))
-            }
-            
-            
+        if 'noise' in drift_metrics:
+            noise_kl = drift_metrics['noise']['kl_divergence']
             print(f"   노이즈 KL Divergence: {noise_kl:.4f}")
             print(f"   노이즈 평균 변화: {drift_metrics['noise']['mean_change']:.4f}")
         
         # 선명도 드리프트
-        if ref_sharp and cur_sharp:
-            sharp_kl = calculate_kl_divergence(ref_sharp, cur_sharp)
-            sharp_wd = wasserstein_distance(ref_sharp, cur_sharp)
-            
-            drift_metrics['sharpness'] = {
-                'kl_divergence': sharp_kl,
-                'wasserstein_distance': float(sharp_wd),
-                'mean_change': float(np.mean(cur_sharp) - np.mean(ref_sharp))
-            }
-            
-            
+        if 'sharpness' in drift_metrics:
+            sharp_kl = drift_metrics['sharpness']['kl_divergence']
             print(f"   선명도 KL Divergence: {sharp_kl:.4f}")
             print(f"   선명도 평균 변화: {drift_metrics['sharpness']['mean_change']:.4f}")
         
         # 종합 품질 스코어 드리프트
-        if ref_noise and ref_sharp and cur_noise and cur_sharp:
-            def calculate_quality_score(sharpness, noise_level):
-                """종합 품질 점수 계산 (0~100, 높을수록 좋음)"""
-                sharp_norm = min(sharpness / 100, 1.0)
-                noise_norm = max(0, 1.0 - (noise_level / 50))
-                quality = (sharp_norm * 0.6 + noise_norm * 0.4) * 100
-                return quality
-            
-            ref_quality = [calculate_quality_score(s, n) for s, n in zip(ref_sharp, ref_noise)]
-            cur_quality = [calculate_quality_score(s, n) for s, n in zip(cur_sharp, cur_noise)]
-            
-            quality_kl = calculate_kl_divergence(ref_quality, cur_quality)
-            quality_mean_change = np.mean(cur_quality) - np.mean(ref_quality)
-            
-            # 품질 상태 판정
-            if quality_mean_change < -10:
-                quality_status = "DEGRADED"
-            elif quality_mean_change > 10:
-                quality_status = "IMPROVED"
-            else:
-                quality_status = "STABLE"
-            
-            drift_metrics['quality'] = {
-                'kl_divergence': quality_kl,
-                'mean_change': float(quality_mean_change),
-                'baseline_mean': float(np.mean(ref_quality)),
-                'current_mean': float(np.mean(cur_quality)),
-                'status': quality_status
-            }
-            
+        if 'quality' in drift_metrics:
+            ref_quality, cur_quality = ref_values['quality'], cur_values['quality']
+            quality_kl = drift_metrics['quality']['kl_divergence']
+            quality_mean_change = drift_metrics['quality']['mean_change']
+            quality_status = drift_metrics['quality']['status']
             
             print(f"   종합 품질 KL Divergence: {quality_kl:.4f}")
             print(f"   종합 품질 평균: {np.mean(ref_quality):.2f} → {np.mean(cur_quality):.2f} ({quality_mean_change:+.2f})")
@@ -368,13 +425,45 @@ def detect_drift(dataset_name=None):
     print("🔬 Embedding Drift Analysis:")
     print("-" * 80)
     
-    if baseline_emb and current_emb:
+    if sampling:
+        # 그룹 드리프트는 샘플 이전 데이터로 계산하므로 보관
+        unsampled = (ref_compact, cur_compact, baseline_emb, current_emb)
+        # 임베딩 드리프트도 샘플 파일만 사용 (baseline 캐시 자체는 그대로 유지)
+        if use_compact:
+            ref_compact = filter_compact(ref_compact, set(ref_compact['files']) - ref_sample)
+            cur_compact = filter_compact(cur_compact, set(cur_compact['files']) - cur_sample)
+        if baseline_emb:
+            baseline_emb = {f: v for f, v in baseline_emb.items() if f in ref_sample}
+        if current_emb:
+            current_emb = {f: v for f, v in current_emb.items() if f in cur_sample}
+    
+    has_embedding_drift = False
+    if use_compact:
+        # 시각화/추가 메트릭/bandwidth 추정은 샘플만 역양자화
+        ref_embeddings = decode_sample(ref_compact, MAX_PLOT_EMBEDDINGS)
+        cur_embeddings = decode_sample(cur_compact, MAX_PLOT_EMBEDDINGS)
+        gamma = resolve_gamma(metric_config, ref_embeddings, cur_embeddings)
+        
+        # 블록 단위 역양자화 MMD + 압축 형태에서 직접 평균/분산 계산
+        with metric_timer(timing, 'mmd'):
+            mmd = calculate_mmd_blocked(
+                lambda: decode_blocks(ref_compact),
+                lambda: decode_blocks(cur_compact),
+                gamma
+            )
+        mean_shift = float(np.linalg.norm(compressed_mean(ref_compact) - compressed_mean(cur_compact)))
+        ref_var = compressed_variance(ref_compact)
+        cur_var = compressed_variance(cur_compact)
+        has_embedding_drift = True
+    elif baseline_emb and current_emb:
         ref_embeddings = np.array([v['embedding'] for v in baseline_emb.values() if 'embedding' in v])
         cur_embeddings = np.array([v['embedding'] for v in current_emb.values() if 'embedding' in v])
         
         if len(ref_embeddings) > 0 and len(cur_embeddings) > 0:
             # MMD 계산
-            mmd = calculate_mmd(ref_embeddings, cur_embeddings)
+            gamma = resolve_gamma(metric_config, ref_embeddings, cur_embeddings)
+            with metric_timer(timing, 'mmd'):
+                mmd = calculate_mmd(ref_embeddings, cur_embeddings, gamma)
             
             # Mean shift
             ref_mean = ref_embeddings.mean(axis=0)
@@ -384,75 +473,276 @@ def detect_drift(dataset_name=None):
             # 분산 변화
             ref_var = float(np.var(ref_embeddings))
             cur_var = float(np.var(cur_embeddings))
-            variance_ratio = abs(cur_var - ref_var) / ref_var if ref_var > 0 else 0
-            
-            drift_metrics['embedding'] = {
-                'mmd': mmd,
-                'mean_shift': mean_shift,
-                'variance_change': float(variance_ratio),
-                'baseline_variance': ref_var,
-                'current_variance': cur_var
-            }
-            
-            
-            print(f"   MMD: {mmd:.4f}")
-            print(f"   Mean Shift: {mean_shift:.4f}")
-            print(f"   Variance Change: {variance_ratio:.1%}")
-            
-            # 시각화: PCA 3D Overlay
-            from sklearn.decomposition import PCA
-            from mpl_toolkits.mplot3d import Axes3D
-            
-            all_emb = np.vstack([ref_embeddings, cur_embeddings])
-            pca = PCA(n_components=3)
-            all_pca = pca.fit_transform(all_emb)
-            
-            ref_pca = all_pca[:len(ref_embeddings)]
-            cur_pca = all_pca[len(ref_embeddings):]
-            
-            fig = plt.figure(figsize=(14, 10))
-            ax = fig.add_subplot(111, projection='3d')
-            
-            # 데이터 포인트
-            ax.scatter(ref_pca[:, 0], ref_pca[:, 1], ref_pca[:, 2],
-                      alpha=0.5, s=80, label='Baseline', color='blue', 
-                      edgecolors='darkblue', linewidth=0.5)
-            ax.scatter(cur_pca[:, 0], cur_pca[:, 1], cur_pca[:, 2],
-                      alpha=0.5, s=80, label='Current', color='red', 
-                      edgecolors='darkred', linewidth=0.5)
-            
-            # 중심점
-            ref_center = ref_pca.mean(axis=0)
-            cur_center = cur_pca.mean(axis=0)
-            ax.scatter(*ref_center, s=400, marker='*', color='darkblue', 
-                      edgecolors='black', linewidth=2, label='Baseline Center', zorder=5)
-            ax.scatter(*cur_center, s=400, marker='*', color='darkred', 
-                      edgecolors='black', linewidth=2, label='Current Center', zorder=5)
-            
-            # 이동 벡터 (3D)
-            if np.linalg.norm(cur_center - ref_center) > 0.1:
-                from mpl_toolkits.mplot3d.art3d import Line3D
-                line = Line3D([ref_center[0], cur_center[0]], 
-                             [ref_center[1], cur_center[1]],
-                             [ref_center[2], cur_center[2]], 
-                             color='green', linewidth=3, label='Shift Vector')
-                ax.add_line(line)
-            
-            ax.set_title(f'Embedding Space Drift (MMD={mmd:.4f})', 
-                        fontsize=14, fontweight='bold')
-            ax.set_xlabel(f'PC1 ({pca.explained_variance_ratio_[0]:.1%})')
-            ax.set_ylabel(f'PC2 ({pca.explained_variance_ratio_[1]:.1%})')
-            ax.set_zlabel(f'PC3 ({pca.explained_variance_ratio_[2]:.1%})')
-            ax.legend(loc='upper left')
-            ax.grid(alpha=0.3)
-            
-            plt.tight_layout()
-            plt.savefig(plot_dir / 'embedding_drift_3d.png', dpi=300, bbox_inches='tight')
-            plt.close()
-            print(f"   📊 임베딩 드리프트 3D 시각화 저장: {plot_dir / 'embedding_drift_3d.png'}")
+            has_embedding_drift = True
+    
+    if has_embedding_drift:
+        variance_ratio = abs(cur_var - ref_var) / ref_var if ref_var > 0 else 0
+        
+        drift_metrics['embedding'] = {
+            'mmd': mmd,
+            'mmd_gamma': gamma,
+            'mean_shift': mean_shift,
+            'variance_change': float(variance_ratio),
+            'baseline_variance': ref_var,
+            'current_variance': cur_var
+        }
+        
+        print(f"   MMD: {mmd:.4f} (gamma={gamma:.4g})")
+        print(f"   Mean Shift: {mean_shift:.4f}")
+        print(f"   Variance Change: {variance_ratio:.1%}")
+        
+        # 추가 임베딩 메트릭 (sliced Wasserstein / energy / 분류기 검정)
+        if metric_config['embedding']:
+            extra = embedding_metrics(ref_embeddings, cur_embeddings, metric_config, timing)
+            drift_metrics['embedding'].update(extra)
+            for key, value in extra.items():
+                print(f"   {key}: {value:.4f}")
+        
+        if use_compact:
+            codec = cur_compact['params']['codec']
+            drift_metrics['embedding']['codec'] = codec
+            print(f"   압축 코덱: {codec} ({compact_nbytes(cur_compact):.0f} bytes/embedding)")
+            if codec == 'int8':
+                # baseline 범위로 학습한 코드 공간 밖의 값은 포화 → 비율이 높으면 드리프트 과소 추정
+                drift_metrics['embedding']['compact_clip_rate'] = {
+                    'baseline': clip_rate(ref_compact),
+                    'current': clip_rate(cur_compact)
+                }
+                print(f"   int8 포화 비율: baseline {clip_rate(ref_compact):.2%}, "
+                      f"current {clip_rate(cur_compact):.2%}")
+            
+            # 원본 대비 압축 오차 리포트
+            if report_compression and baseline_emb and current_emb:
+                ref_full = np.array([v['embedding'] for v in baseline_emb.values() if 'embedding' in v])
+                cur_full = np.array([v['embedding'] for v in current_emb.values() if 'embedding' in v])
+                mmd_full = calculate_mmd(ref_full, cur_full, gamma)
+                shift_full = float(np.linalg.norm(ref_full.mean(axis=0) - cur_full.mean(axis=0)))
+                
+                drift_metrics['embedding']['compression_error'] = {
+                    'bytes_per_embedding': compact_nbytes(cur_compact),
+                    'bytes_per_embedding_float32': int(cur_full.shape[1] * 4),
+                    'mmd_full': mmd_full,
+                    'mmd_abs_error': abs(mmd - mmd_full),
+                    'mmd_rel_error': abs(mmd - mmd_full) / mmd_full if mmd_full > 0 else 0.0,
+                    'mean_shift_full': shift_full,
+                    'mean_shift_abs_error': abs(mean_shift - shift_full)
+                }
+                print(f"   압축 오차: MMD {mmd_full:.4f} → {mmd:.4f}, "
+                      f"Mean Shift {shift_full:.4f} → {mean_shift:.4f}")
+        
+        # 시각화: PCA 3D Overlay
+        from sklearn.decomposition import PCA
+        from mpl_toolkits.mplot3d import Axes3D
+        import matplotlib.pyplot as plt
+
+        all_emb = np.vstack([ref_embeddings, cur_embeddings])
+        pca = PCA(n_components=3)
+        all_pca = pca.fit_transform(all_emb)
+
+        ref_pca = all_pca[:len(ref_embeddings)]
+        cur_pca = all_pca[len(ref_embeddings):]
+
+        fig = plt.figure(figsize=(14, 10))
+        ax = fig.add_subplot(111, projection='3d')
+
+        # 데이터 포인트
+        ax.scatter(ref_pca[:, 0], ref_pca[:, 1], ref_pca[:, 2],
+                  alpha=0.5, s=80, label='Baseline', color='blue', 
+                  edgecolors='darkblue', linewidth=0.5)
+        ax.scatter(cur_pca[:, 0], cur_pca[:, 1], cur_pca[:, 2],
+                  alpha=0.5, s=80, label='Current', color='red', 
+                  edgecolors='darkred', linewidth=0.5)
+
+        # 중심점
+        ref_center = ref_pca.mean(axis=0)
+        cur_center = cur_pca.mean(axis=0)
+        ax.scatter(*ref_center, s=400, marker='*', color='darkblue', 
+                  edgecolors='black', linewidth=2, label='Baseline Center', zorder=5)
+        ax.scatter(*cur_center, s=400, marker='*', color='darkred', 
+                  edgecolors='black', linewidth=2, label='Current Center', zorder=5)
+
+        # 이동 벡터 (3D)
+        if np.linalg.norm(cur_center - ref_center) > 0.1:
+            from mpl_toolkits.mplot3d.art3d import Line3D
+            line = Line3D([ref_center[0], cur_center[0]], 
+                         [ref_center[1], cur_center[1]],
+                         [ref_center[2], cur_center[2]], 
+                         color='green', linewidth=3, label='Shift Vector')
+            ax.add_line(line)
+
+        ax.set_title(f'Embedding Space Drift (MMD={mmd:.4f})', 
+                    fontsize=14, fontweight='bold')
+        ax.set_xlabel(f'PC1 ({pca.explained_variance_ratio_[0]:.1%})')
+        ax.set_ylabel(f'PC2 ({pca.explained_variance_ratio_[1]:.1%})')
+        ax.set_zlabel(f'PC3 ({pca.explained_variance_ratio_[2]:.1%})')
+        ax.legend(loc='upper left')
+        ax.grid(alpha=0.3)
+
+        plt.tight_layout()
+        plt.savefig(plot_dir / 'embedding_drift_3d.png', dpi=300, bbox_inches='tight')
+        plt.close()
+        print(f"   📊 임베딩 드리프트 3D 시각화 저장: {plot_dir / 'embedding_drift_3d.png'}")
     
     print()
     
+    # 2-1. 클러스터 단위 드리프트 (baseline centroid에 현재 임베딩 배정)
+    cluster_config = params['drift'].get('cluster_drift', {})
+    if has_embedding_drift and cluster_config.get('enabled', True):
+        print("🎯 Cluster Drift Analysis:")
+        print("-" * 80)
+        
+        baseline_clustering = caches.get("clustering_analysis_baseline")
+        if not baseline_clustering:
+            # 클러스터 스냅샷 없이 생성된 baseline: 현재 클러스터링을 기준으로 고정
+            baseline_clustering = caches.get("clustering_analysis")
+            if baseline_clustering:
+                print("⚠️ Baseline 클러스터링이 없어 현재 클러스터링을 기준으로 저장합니다.")
+                caches.save(baseline_clustering, "clustering_analysis_baseline")
+        
+        if use_compact:
+            ref_emb_files, ref_X = ref_compact['files'], ref_compact
+            cur_emb_files, cur_X = cur_compact['files'], cur_compact
+        else:
+            ref_emb_files = [f for f, v in baseline_emb.items() if 'embedding' in v]
+            cur_emb_files = [f for f, v in current_emb.items() if 'embedding' in v]
+            ref_X, cur_X = ref_embeddings, cur_embeddings
+        
+        cluster_result = None
+        if baseline_clustering:
+            cluster_result, baseline_clustering, clustering_updated = compute_cluster_drift(
+                baseline_clustering, ref_emb_files, ref_X, cur_emb_files, cur_X, cluster_config,
+                gamma=drift_metrics.get('embedding', {}).get('mmd_gamma', 1.0)
+            )
+            # centroid/반경/파일별 label은 baseline 스냅샷에 저장해 다음 실행에서 재사용
+            # (샘플링 모드의 label은 샘플 파일만 포함하므로 저장하지 않음)
+            if clustering_updated and not sampling:
+                caches.save(baseline_clustering, "clustering_analysis_baseline")
+        
+        if cluster_result:
+            drift_metrics['cluster'] = cluster_result
+            
+            print(f"   클러스터 수: {cluster_result['n_clusters']}")
+            print(f"   Population Shift (TVD): {cluster_result['population_shift']:.4f}")
+            print(f"   신규 배정: {cluster_result['assigned_files']}개 "
+                  f"(재사용: {cluster_result['reused_assignments']}개)")
+            if cluster_result['vanishing_clusters']:
+                print(f"   소멸/감소 클러스터: {', '.join(cluster_result['vanishing_clusters'])}")
+            if cluster_result['growing_clusters']:
+                print(f"   증가 클러스터: {', '.join(cluster_result['growing_clusters'])}")
+            if cluster_result['emerging']['flag']:
+                print(f"   🆕 신규 클러스터 의심: 반경 밖 {cluster_result['emerging']['outlier_count']}개 "
+                      f"({cluster_result['emerging']['outlier_fraction']:.1%})")
+            
+            plot_cluster_drift(cluster_result, plot_dir / 'cluster_drift.png')
+            print(f"   📊 클러스터 드리프트 시각화 저장: {plot_dir / 'cluster_drift.png'}")
+        else:
+            print("⚠️ Baseline 클러스터링 정보가 없어 클러스터 드리프트를 생략합니다.")
+        
+        print()
+    
+    # 2-2. 다중 기준 드리프트 (실행별 compact 스냅샷: baseline / 직전 실행 / rolling)
+    snapshot_config = params['drift'].get('snapshots', {})
+    group_config = params['drift'].get('groups', {})
+    if secondary_dropped and (snapshot_config.get('enabled', True) or group_config.get('enabled', False)):
+        drift_metrics['secondary_score_weights_dropped'] = secondary_dropped
+        print(f"ℹ️  스냅샷/그룹 점수는 추가 메트릭({', '.join(secondary_dropped)}) 없이 "
+              f"기본 메트릭 가중치를 재정규화해 계산")
+        print()
+    if snapshot_config.get('enabled', True):
+        print("🗂️  Multi-Reference Drift:")
+        print("-" * 80)
+        
+        thresholds = (params['drift']['threshold_warning'], params['drift']['threshold_critical'])
+        
+        if use_compact:
+            snap_ref_emb, snap_cur_emb = {'compact': ref_compact}, {'compact': cur_compact}
+        elif has_embedding_drift:
+            snap_ref_emb, snap_cur_emb = {'embeddings': ref_embeddings}, {'embeddings': cur_embeddings}
+        else:
+            snap_ref_emb, snap_cur_emb = {}, {}
+        
+        # 현재 데이터 요약은 한 번만 계산하고 모든 기준과 비교
+        current_snapshot = build_snapshot(timestamp, current_attr, config=snapshot_config, **snap_cur_emb)
+        
+        # 스냅샷 저장소 읽기-수정-쓰기는 잠금 하에서 (동시 실행의 스냅샷 유실 방지)
+        with caches.lock():
+            store = caches.get(SNAPSHOT_CACHE) or {'runs': []}
+            
+            # baseline 스냅샷은 baseline이 바뀐 경우에만 재생성
+            signature = baseline_signature(baseline_attr, **snap_ref_emb)
+            if store.get('baseline_signature') != signature:
+                store['baseline'] = build_snapshot(timestamp, baseline_attr, config=snapshot_config,
+                                                   **snap_ref_emb)
+                store['baseline_signature'] = signature
+            
+            matrix = drift_matrix(
+                store, current_snapshot,
+                snapshot_config.get('references', ['baseline', 'previous', 'rolling:10']),
+                thresholds, config=snapshot_config, weights=score_weights,
+                gamma=drift_metrics.get('embedding', {}).get('mmd_gamma', 1.0)
+            )
+            
+            store['runs'].append(current_snapshot)
+            apply_retention(store, config=snapshot_config)
+            caches.save(store, SNAPSHOT_CACHE)
+        
+        if matrix:
+            drift_metrics['references'] = matrix
+            for ref_name, ref_metrics in matrix.items():
+                print(f"   vs {ref_name:<12} ({ref_metrics['reference_timestamp']}): "
+                      f"{ref_metrics['overall_score']:.4f} {ref_metrics['status']}")
+            plot_drift_matrix(matrix, plot_dir / 'drift_matrix.png')
+            print(f"   📊 드리프트 행렬 시각화 저장: {plot_dir / 'drift_matrix.png'}")
+        print(f"   스냅샷 보존: {len(store['runs'])}개")
+        print()
+    
+    # 2-3. 그룹별 드리프트 (하위 디렉토리 / 매핑 파일)
+    if group_config.get('enabled', False):
+        print("🗃️  Group Drift Analysis:")
+        print("-" * 80)
+        
+        if cache_only:
+            # 원본 파일이 없으므로 분석 시점에 저장된 그룹 매핑 사용
+            group_map = caches.get(GROUP_CACHE) or {}
+        else:
+            group_map = update_group_map(data_dir, formats, group_config)
+        if sampling:
+            # 샘플 대신 전체 데이터 사용: min_group_size 판정(전체 파일 수)과 메트릭 대상 일치
+            # (그룹별 임베딩은 max_samples_per_group개로 제한)
+            group_common = full_common
+            g_ref_compact, g_cur_compact, g_baseline_emb, g_current_emb = unsampled
+        else:
+            group_common = common
+            g_ref_compact, g_cur_compact, g_baseline_emb, g_current_emb = (
+                ref_compact, cur_compact, baseline_emb, current_emb
+            )
+        if use_compact:
+            group_ref = (g_ref_compact['files'], g_ref_compact)
+            group_cur = (g_cur_compact['files'], g_cur_compact)
+        elif has_embedding_drift:
+            group_ref = embedding_rows(g_baseline_emb)
+            group_cur = embedding_rows(g_current_emb)
+        else:
+            group_ref = group_cur = ([], None)
+        
+        with metric_timer(timing, 'groups'):
+            groups = compute_group_drift(
+                group_map, baseline_attr, current_attr, group_common, *group_ref, *group_cur,
+                thresholds=(params['drift']['threshold_warning'], params['drift']['threshold_critical']),
+                config=group_config, weights=score_weights,
+                gamma=drift_metrics.get('embedding', {}).get('mmd_gamma', 1.0)
+            )
+        if groups:
+            drift_metrics['groups'] = groups
+            for group, row in groups.items():
+                score = f"{row['overall_score']:.4f}" if 'overall_score' in row else "-"
+                print(f"   {group:<24} {row['baseline_files']:>7} → {row['current_files']:<7} "
+                      f"{score:>8} {row['status']}")
+            if plot_group_heatmap(groups, plot_dir / 'group_drift.png',
+                                  group_config.get('max_plot_groups', 40)):
+                print(f"   📊 그룹 드리프트 시각화 저장: {plot_dir / 'group_drift.png'}")
+        print()
+    
     # 3. 전체 드리프트 스코어 계산
     print("🎯 Overall Drift Score:")
     print("-" * 80)
@@ -463,34 +753,46 @@ def detect_drift(dataset_name=None):
     quality_kl = drift_metrics.get('quality', {}).get('kl_divergence', 0)
     emb_mmd = drift_metrics.get('embedding', {}).get('mmd', 0)
     
-    # 가중 평균 (품질 지표 포함)
-    overall_score = (
-        size_kl * 0.15 +           # 크기 15%
-        noise_kl * 0.15 +          # 노이즈 15%
-        sharp_kl * 0.15 +          # 선명도 15%
-        quality_kl * 0.15 +        # 종합 품질 15%
-        emb_mmd * 0.40             # 임베딩 40% (가장 중요)
-    )
+    # 가중 합 (품질 지표 포함, 가중치는 drift.score_weights 또는 drift_metrics.SCORE_WEIGHTS)
+    overall_score = overall_drift_score(drift_metrics, score_weights)
     
-    drift_metrics['overall_score'] = float(overall_score)
+    drift_metrics['overall_score'] = overall_score
     
     # 임계값 체크
     warning_threshold = params['drift']['threshold_warning']
     critical_threshold = params['drift']['threshold_critical']
     
-    if overall_score > critical_threshold:
-        status = 'CRITICAL'
+    status = drift_status(overall_score, warning_threshold, critical_threshold)
+    if status == 'CRITICAL':
         print(f"🚨 CRITICAL: {overall_score:.4f} > {critical_threshold}")
-    elif overall_score > warning_threshold:
-        status = 'WARNING'
+    elif status == 'WARNING':
         print(f"⚠️  WARNING: {overall_score:.4f} > {warning_threshold}")
     else:
-        status = 'NORMAL'
         print(f"✅ NORMAL: {overall_score:.4f}")
     
     drift_metrics['status'] = status
     drift_metrics['timestamp'] = timestamp
     
+    # 샘플링 모드: bootstrap 신뢰구간
+    if sampling:
+        if common:
+            ref_values, cur_values = attribute_values(baseline_attr, common), attribute_values(current_attr, common)
+        else:
+            ref_values = cur_values = {}
+        sampling['overall_score_ci'] = bootstrap_overall_score(
+            ref_values, cur_values,
+            ref_embeddings if has_embedding_drift else None,
+            cur_embeddings if has_embedding_drift else None,
+            thresholds=(warning_threshold, critical_threshold), config=sampling_config,
+            gamma=drift_metrics.get('embedding', {}).get('mmd_gamma', 1.0),
+            weights=score_weights, fixed_metrics=drift_metrics
+        )
+        drift_metrics['sampling'] = sampling
+        ci = sampling['overall_score_ci']
+        print(f"   {sampling['confidence']:.0%} 신뢰구간: [{ci['ci_low']:.4f}, {ci['ci_high']:.4f}] "
+              f"(bootstrap {ci['iterations']}회)")
+        print(f"   상태 확률: " + ", ".join(f"{k} {v:.0%}" for k, v in ci['status_probability'].items()))
+    
     # 드리프트 스코어 바 차트 (품질 지표 포함)
     import matplotlib.pyplot as plt
     
@@ -531,24 +833,17 @@ def detect_drift(dataset_name=None):
     print(f"   📊 드리프트 스코어 시각화 저장: {plot_dir / 'drift_scores.png'}")
     
     # 결과 저장
-    with open(drift_dir / 'metrics.json', 'w') as f:
-        json.dump(drift_metrics, f, indent=2)
+    drift_metrics['timing'] = {k: round(v, 4) for k, v in timing.items()}
+    write_json_atomic(drift_dir / 'metrics.json', drift_metrics, indent=2)
     
-    # 드리프트 타임라인 업데이트 (TSV for DVC plots)
-    timeline_file = drift_dir / "timeline.tsv"
+    # 실행 이력 기록 (전체 메트릭, append-only)
+    if history_enabled:
+        record_run(dataset_name_only, 'drift', drift_metrics, timestamp, len(added), len(removed),
+                   db_path=history_db)
     
-    # 기존 타임라인 로드 또는 생성
-    if timeline_file.exists():
-        with open(timeline_file, 'r') as f:
-            lines = f.readlines()
-    else:
-        lines = ['timestamp\toverall_score\tstatus\tfiles_added\tfiles_removed\n']
-    
-    # 새 데이터 추가
-    lines.append(f"{timestamp}\t{overall_score:.4f}\t{status}\t{len(added)}\t{len(removed)}\n")
-    
-    with open(timeline_file, 'w') as f:
-        f.writelines(lines)
+    # 드리프트 타임라인 업데이트 (TSV for DVC plots, 기존 행은 다시 쓰지 않고 append)
+    timeline_file = drift_dir / "timeline.tsv"
+    append_timeline(timeline_file, timeline_row(timestamp, overall_score, status, len(added), len(removed)))
     
     print()
     print("=" * 80)
@@ -557,14 +852,18 @@ def detect_drift(dataset_name=None):
     print(f"   파일 변경: +{len(added)} -{len(removed)}")
 
 if __name__ == "__main__":
-    import sys
+    import argparse
     
     # CLI 인자로 데이터셋 지정 가능
-    dataset_name = sys.argv[1] if len(sys.argv) > 1 else None
-    
-    if dataset_name:
-        print(f"📦 데이터셋: {dataset_name}")
+    parser = argparse.ArgumentParser(description="Baseline 대비 드리프트 탐지")
+    parser.add_argument('dataset', nargs='?', default=None, help="데이터셋 이름 (생략 시 기본값)")
+    parser.add_argument('--cache-only', action='store_true',
+                        help="원본 이미지 없이 analysis/<dataset>/artifacts만으로 실행")
+    args = parser.parse_args()
+    
+    if args.dataset:
+        print(f"📦 데이터셋: {args.dataset}")
     else:
         print("📦 기본 데이터셋 사용")
     
-    detect_drift(dataset_name)
+    detect_drift(args.dataset, cache_only=args.cache_only)
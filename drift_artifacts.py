@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+드리프트 아티팩트 (원본 이미지 없이 드리프트 탐지)
+detect_drift에 필요한 ddoc 캐시/baseline만 analysis/<dataset>/artifacts/로 내보내
+DVC out으로 별도 추적 → CI·리뷰 환경은 데이터셋 대신 아티팩트만 pull (수 MB)
+
+- 속성 캐시: 드리프트 계산에 쓰는 필드만 유지 (artifacts.attribute_fields)
+- 임베딩: compact 캐시가 있으면 그대로, 원본 임베딩은 (파일명, float16 행렬)로 압축
+- manifest.json: 키별 파일명/크기/md5/항목 수 (로드 시 md5 검증)
+- detect_drift.py <dataset> --cache-only: ddoc/데이터셋 없이 아티팩트만으로 실행
+  실행 중 저장(baseline 생성, 스냅샷)은 DVC가 추적하지 않는 overlay(analysis/<dataset>/.artifacts_overlay)에 기록,
+  아티팩트 manifest가 바뀌면(dvc pull/재export) overlay는 폐기
+
+사용법:
+    python drift_artifacts.py export test_data
+    dvc pull artifacts_test_data && python detect_drift.py test_data --cache-only
+"""
+import sys
+import gzip
+import json
+import pickle
+import hashlib
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+
+# ddoc 모듈 import
+sys.path.insert(0, str(Path(__file__).parent.parent / 'datadrift_app_engine'))
+
+from dataset_utils import load_params, resolve_dataset
+from cache_io import dataset_lock, file_lock, read_cache, save_cache, atomic_write, write_json_atomic
+from embedding_codec import COMPACT_CACHE, COMPACT_BASELINE_CACHE
+from drift_snapshots import SNAPSHOT_CACHE
+from group_drift import GROUP_CACHE
+
+ARTIFACT_DIR = "artifacts"
+OVERLAY_DIR = ".artifacts_overlay"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".artifacts.lock"
+
+ATTRIBUTE_KEYS = ("attribute_analysis", "attribute_analysis_baseline")
+EMBEDDING_KEYS = ("embedding_analysis", "embedding_analysis_baseline")
+COMPACT_KEYS = (COMPACT_CACHE, COMPACT_BASELINE_CACHE)
+OTHER_KEYS = ("clustering_analysis", "clustering_analysis_baseline", SNAPSHOT_CACHE, GROUP_CACHE)
+
+DEFAULT_CONFIG = {
+    'full_embeddings': 'auto',      # auto: detect_drift가 원본 임베딩을 읽을 때만 | true | false
+    'embedding_dtype': 'float16',
+    'attribute_fields': ['size', 'width', 'height', 'noise_level', 'sharpness']
+}
+
+def artifact_dir(data_dir):
+    """analysis/<dataset>/artifacts"""
+    return Path("analysis") / Path(data_dir).name / ARTIFACT_DIR
+
+def pack_embeddings(emb_cache, dtype='float16'):
+    """{파일명: {'embedding': [...]}} → {'files', 'embeddings'} (행렬 한 개로 저장)"""
+    files = [f for f, v in emb_cache.items() if 'embedding' in v]
+    embeddings = np.asarray([emb_cache[f]['embedding'] for f in files], dtype=dtype)
+    return {'packed_embeddings': True, 'files': files, 'embeddings': embeddings}
+
+def unpack_embeddings(packed):
+    """pack_embeddings 역변환 (행은 float32 배열)"""
+    embeddings = packed['embeddings'].astype(np.float32)
+    return {f: {'embedding': row} for f, row in zip(packed['files'], embeddings)}
+
+def _md5(path):
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _entries(obj):
+    if isinstance(obj, dict) and obj.get('packed_embeddings'):
+        return len(obj['files'])
+    if isinstance(obj, dict) and 'files' in obj:
+        return len(obj['files'])
+    return len(obj) if isinstance(obj, dict) else None
+
+class DatasetCaches:
+    """데이터셋 디렉토리의 ddoc 캐시 (detect_drift 기본 모드)"""
+
+    def __init__(self, data_dir):
+        self.data_dir = Path(data_dir)
+
+    def get(self, key):
+        return read_cache(self.data_dir, key)
+
+    def save(self, obj, key):
+        save_cache(self.data_dir, obj, key)
+
+    def lock(self):
+        return dataset_lock(self.data_dir)
+
+class ArtifactCaches:
+    """아티팩트 디렉토리 캐시 (detect_drift --cache-only, DatasetCaches와 같은 인터페이스)
+
+    DVC out인 아티팩트 디렉토리는 읽기 전용, 드리프트 실행 중 저장(baseline 생성/스냅샷)은
+    overlay 디렉토리에 기록하고 읽을 때 overlay를 우선
+    overlay는 기반 아티팩트 manifest의 md5를 기록해 아티팩트가 바뀌면 무시
+    """
+
+    def __init__(self, root, overlay=None):
+        self.root = Path(root)
+        self.overlay = Path(overlay) if overlay else self.root.parent / OVERLAY_DIR
+        manifest_path = self.root / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"아티팩트 manifest 없음: {manifest_path} "
+                                    f"(drift_artifacts.py export 또는 dvc pull 필요)")
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        self.source_md5 = _md5(manifest_path)
+
+        self.overlay_manifest = {'source_md5': self.source_md5, 'files': {}}
+        overlay_path = self.overlay / MANIFEST_FILE
+        if overlay_path.exists():
+            with open(overlay_path) as f:
+                overlay_manifest = json.load(f)
+            if overlay_manifest.get('source_md5') == self.source_md5:
+                self.overlay_manifest = overlay_manifest
+            else:
+                print(f"   ♻️  아티팩트가 갱신되어 이전 overlay 폐기: {self.overlay}")
+                with self.lock():
+                    for path in self.overlay.glob("*.pkl.gz"):
+                        path.unlink()
+                    overlay_path.unlink()
+
+    def get(self, key):
+        root, entry = self.overlay, self.overlay_manifest['files'].get(key)
+        if not entry:
+            root, entry = self.root, self.manifest['files'].get(key)
+        if not entry:
+            return None
+        path = root / entry['file']
+        if _md5(path) != entry['md5']:
+            raise ValueError(f"아티팩트 손상: {path} (md5 불일치)")
+        with gzip.open(path, 'rb') as f:
+            obj = pickle.load(f)
+        if isinstance(obj, dict) and obj.get('packed_embeddings'):
+            return unpack_embeddings(obj)
+        return obj
+
+    def save(self, obj, key):
+        with self.lock():
+            self.overlay_manifest['files'][key] = write_artifact(self.overlay, key, obj)
+            write_json_atomic(self.overlay / MANIFEST_FILE, self.overlay_manifest, indent=2, sort_keys=True)
+
+    def lock(self):
+        # 잠금 파일은 DVC out(artifacts/) 밖에 둠
+        return file_lock(self.root.parent / LOCK_FILE)
+
+def write_artifact(root, key, obj):
+    """캐시 하나를 <key>.pkl.gz로 원자적 저장
+
+    Returns:
+        manifest 항목 {'file', 'bytes', 'md5', 'entries'}
+    """
+    path = Path(root) / f"{key}.pkl.gz"
+    # mtime=0: 내용이 같으면 바이트도 같아 DVC가 변경으로 보지 않음
+    with atomic_write(path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {'file': path.name, 'bytes': path.stat().st_size, 'md5': _md5(path), 'entries': _entries(obj)}
+
+def export_artifacts(data_dir, config=None, out_dir=None, drift_params=None):
+    """ddoc 캐시 → 아티팩트 디렉토리
+
+    임베딩은 detect_drift가 읽는 것만 내보냄 (drift.use_compact_embeddings 기준):
+    압축 모드면 compact 캐시, 원본 모드(또는 오차 리포트/compact 캐시 없음)면 원본 임베딩
+
+    Returns:
+        manifest dict
+    """
+    from cache_utils import get_cached_analysis_data
+
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    drift_params = drift_params or {}
+    use_compact = drift_params.get('use_compact_embeddings', False)
+    data_dir = Path(data_dir)
+    out_dir = Path(out_dir) if out_dir else artifact_dir(data_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    fields = set(config['attribute_fields'])
+
+    files = {}
+    with dataset_lock(data_dir), file_lock(out_dir.parent / LOCK_FILE):
+        for key in ATTRIBUTE_KEYS:
+            cache = get_cached_analysis_data(data_dir, key)
+            if cache:
+                pruned = {f: {k: v for k, v in entry.items() if k in fields} for f, entry in cache.items()}
+                files[key] = write_artifact(out_dir, key, pruned)
+
+        has_compact = False
+        if use_compact:
+            for key in COMPACT_KEYS:
+                compact = get_cached_analysis_data(data_dir, key)
+                if compact:
+                    files[key] = write_artifact(out_dir, key, compact)
+                    has_compact = True
+
+        # detect_drift는 원본 모드, 압축 오차 리포트, compact 캐시가 없을 때 원본 임베딩을 읽음
+        needs_full = (not use_compact or drift_params.get('report_compression_error', False)
+                      or not has_compact)
+        full = config['full_embeddings']
+        if full is True or (full == 'auto' and needs_full):
+            for key in EMBEDDING_KEYS:
+                cache = get_cached_analysis_data(data_dir, key)
+                if cache:
+                    files[key] = write_artifact(out_dir, key, pack_embeddings(cache, config['embedding_dtype']))
+
+        for key in OTHER_KEYS:
+            obj = get_cached_analysis_data(data_dir, key)
+            if obj:
+                files[key] = write_artifact(out_dir, key, obj)
+
+        # 이번에 내보내지 않은 이전 아티팩트 제거
+        for path in out_dir.glob("*.pkl.gz"):
+            if path.name not in {entry['file'] for entry in files.values()}:
+                path.unlink()
+
+        manifest = {
+            'dataset': data_dir.name,
+            'source': str(data_dir),
+            'files': files
+        }
+        write_json_atomic(out_dir / MANIFEST_FILE, manifest, indent=2, sort_keys=True)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="드리프트 아티팩트 내보내기 (원본 없이 드리프트 탐지용)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('export', help="ddoc 캐시 → analysis/<dataset>/artifacts")
+    p.add_argument('dataset', nargs='?', default=None, help="데이터셋 이름 (생략 시 기본값)")
+    p.add_argument('--out', default=None, help="출력 디렉토리 (기본 analysis/<dataset>/artifacts)")
+    args = parser.parse_args()
+
+    params = load_params()
+    data_dir, _ = resolve_dataset(params, args.dataset)
+    start = datetime.now()
+    manifest = export_artifacts(data_dir, params.get('artifacts'), args.out, params.get('drift'))
+
+    total = sum(entry['bytes'] for entry in manifest['files'].values())
+    print(f"📦 아티팩트 내보내기: {args.out or artifact_dir(data_dir)} "
+          f"({len(manifest['files'])}개, {total / 1e6:.2f} MB, "
+          f"{(datetime.now() - start).total_seconds():.1f}s)")
+    for key, entry in sorted(manifest['files'].items()):
+        print(f"   {key:<32} {entry['bytes'] / 1e6:>8.2f} MB  {entry['entries'] or '-'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+드리프트 메트릭 계산 함수 모음
+detect_drift.py 및 부가 모듈에서 공용으로 사용
+"""
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 2048
+
+# Overall Drift Score 가중치 (임베딩 40%, 속성 각 15%)
+# params.yaml drift.score_weights로 변경 가능 (SCORE_METRICS의 추가 메트릭 포함)
+SCORE_WEIGHTS = {
+    'size': 0.15,
+    'noise': 0.15,
+    'sharpness': 0.15,
+    'quality': 0.15,
+    'embedding': 0.40
+}
+
+# 가중치 키 → drift_metrics 내 (섹션, 메트릭)
+SCORE_METRICS = {
+    'size': ('size', 'kl_divergence'),
+    'noise': ('noise', 'kl_divergence'),
+    'sharpness': ('sharpness', 'kl_divergence'),
+    'quality': ('quality', 'kl_divergence'),
+    'embedding': ('embedding', 'mmd'),
+    'sliced_wasserstein': ('embedding', 'sliced_wasserstein'),
+    'energy': ('embedding', 'energy_distance'),
+    'classifier': ('embedding', 'classifier_score'),
+    'joint_attribute': ('joint_attribute', 'mmd')
+}
+
+
+def calculate_kl_divergence(p, q, bins=20):
+    """KL Divergence 계산"""
+    p_hist, edges = np.histogram(p, bins=bins, density=True)
+    q_hist, _ = np.histogram(q, bins=edges, density=True)
+
+    # 0 방지
+    p_hist = p_hist + 1e-10
+    q_hist = q_hist + 1e-10
+
+    # 정규화
+    p_hist = p_hist / p_hist.sum()
+    q_hist = q_hist / q_hist.sum()
+
+    return float(np.sum(p_hist * np.log(p_hist / q_hist)))
+
+def calculate_mmd(X, Y, gamma=1.0):
+    """Maximum Mean Discrepancy 계산"""
+    XX = np.dot(X, X.T)
+    YY = np.dot(Y, Y.T)
+    XY = np.dot(X, Y.T)
+
+    X_sqnorms = np.diagonal(XX)
+    Y_sqnorms = np.diagonal(YY)
+
+    def rbf_kernel(X_sqnorms, Y_sqnorms, XY):
+        K = -2 * XY + X_sqnorms[:, None] + Y_sqnorms[None, :]
+        K = np.exp(-gamma * K)
+        return K
+
+    K_XX = rbf_kernel(X_sqnorms, X_sqnorms, XX)
+    K_YY = rbf_kernel(Y_sqnorms, Y_sqnorms, YY)
+    K_XY = rbf_kernel(X_sqnorms, Y_sqnorms, XY)
+
+    m = X.shape[0]
+    n = Y.shape[0]
+
+    mmd = (K_XX.sum() - np.trace(K_XX)) / (m * (m - 1))
+    mmd += (K_YY.sum() - np.trace(K_YY)) / (n * (n - 1))
+    mmd -= 2 * K_XY.sum() / (m * n)
+
+    return float(np.sqrt(max(mmd, 0)))
+
+def iter_blocks(X, block_size=DEFAULT_BLOCK_SIZE):
+    """배열을 행 블록 단위로 분할"""
+    for start in range(0, len(X), block_size):
+        yield X[start:start + block_size]
+
+def _rbf_kernel_sum(A, B, gamma):
+    """RBF 커널 행렬 합 (블록 하나)"""
+    sq = (A * A).sum(axis=1)[:, None] + (B * B).sum(axis=1)[None, :] - 2 * A @ B.T
+    return float(np.exp(-gamma * np.maximum(sq, 0)).sum())
+
+def calculate_mmd_blocked(X_blocks, Y_blocks, gamma=1.0):
+    """블록 단위 MMD 계산 (calculate_mmd와 동일한 추정량, 메모리 O(block²))
+
+    Args:
+        X_blocks, Y_blocks: 호출할 때마다 float32 블록 iterator를 반환하는 함수
+            (압축 임베딩의 블록 단위 역양자화 등)
+    """
+    def pair_sum(blocks_a, blocks_b):
+        total = 0.0
+        count_a = 0
+        for A in blocks_a():
+            A = np.asarray(A, dtype=np.float64)
+            count_a += len(A)
+            for B in blocks_b():
+                total += _rbf_kernel_sum(A, np.asarray(B, dtype=np.float64), gamma)
+        return total, count_a
+
+    k_xx, m = pair_sum(X_blocks, X_blocks)
+    k_yy, n = pair_sum(Y_blocks, Y_blocks)
+    k_xy, _ = pair_sum(X_blocks, Y_blocks)
+
+    if m < 2 or n < 2:
+        return 0.0
+
+    # 대각 원소 k(x, x) = 1 제외
+    mmd = (k_xx - m) / (m * (m - 1))
+    mmd += (k_yy - n) / (n * (n - 1))
+    mmd -= 2 * k_xy / (m * n)
+
+    return float(np.sqrt(max(mmd, 0)))
+
+def calculate_quality_score(sharpness, noise_level):
+    """종합 품질 점수 계산 (0~100, 높을수록 좋음)"""
+    sharp_norm = min(sharpness / 100, 1.0)
+    noise_norm = max(0, 1.0 - (noise_level / 50))
+    quality = (sharp_norm * 0.6 + noise_norm * 0.4) * 100
+    return quality
+
+def attribute_values(attr_cache, files=None):
+    """속성 캐시 → 드리프트 계산용 값 리스트 {'size', 'noise', 'sharpness', 'quality'}"""
+    files = attr_cache.keys() if files is None else files
+    values = {
+        'size': [attr_cache[f]['size'] for f in files if 'size' in attr_cache[f]],
+        'noise': [attr_cache[f]['noise_level'] for f in files if 'noise_level' in attr_cache[f]],
+        'sharpness': [attr_cache[f]['sharpness'] for f in files if 'sharpness' in attr_cache[f]]
+    }
+    values['quality'] = [calculate_quality_score(s, n) for s, n in zip(values['sharpness'], values['noise'])]
+    return values
+
+def quality_status(mean_change):
+    """품질 평균 변화 → DEGRADED / IMPROVED / STABLE"""
+    if mean_change < -10:
+        return "DEGRADED"
+    if mean_change > 10:
+        return "IMPROVED"
+    return "STABLE"
+
+def histogram_sketch(p, bins=20):
+    """baseline 히스토그램 스케치 (calculate_kl_divergence의 baseline 측 계산을 미리 수행)"""
+    p_hist, edges = np.histogram(p, bins=bins, density=True)
+    p_hist = p_hist + 1e-10
+    return {'p': p_hist / p_hist.sum(), 'edges': edges}
+
+def kl_from_sketch(sketch, q):
+    """히스토그램 스케치 기준 KL Divergence (calculate_kl_divergence와 동일한 값)"""
+    q_hist, _ = np.histogram(q, bins=sketch['edges'], density=True)
+    q_hist = q_hist + 1e-10
+    q_hist = q_hist / q_hist.sum()
+    p_hist = sketch['p']
+    return float(np.sum(p_hist * np.log(p_hist / q_hist)))
+
+class MMDReference:
+    """baseline 측 커널 항을 미리 계산한 MMD 기준 샘플
+
+    calculate_mmd(X, Y)에서 X 관련 항(K_XX)은 baseline이 고정이면 상수이므로
+    배치 Y마다 K_YY, K_XY만 계산 (비용 O(m·n + n²))
+    """
+
+    def __init__(self, X, gamma=1.0, block_size=DEFAULT_BLOCK_SIZE):
+        self.X = np.asarray(X, dtype=np.float64)
+        self.gamma = gamma
+        self.X_sqnorms = (self.X ** 2).sum(axis=1)
+        m = len(self.X)
+        k_xx = sum(_rbf_kernel_sum(A, self.X, gamma) for A in iter_blocks(self.X, block_size))
+        self.k_xx_term = (k_xx - m) / (m * (m - 1)) if m > 1 else 0.0
+
+    def kernel_mean(self, Y):
+        """행별 baseline 커널 평균 mean_x k(x, y) (MMD witness 함수의 baseline 항)"""
+        Y = np.asarray(Y, dtype=np.float64)
+        sq = self.X_sqnorms[:, None] + (Y ** 2).sum(axis=1)[None, :] - 2 * self.X @ Y.T
+        return np.exp(-self.gamma * np.maximum(sq, 0)).mean(axis=0)
+
+    def mmd(self, Y):
+        """calculate_mmd(self.X, Y)와 동일한 값"""
+        Y = np.asarray(Y, dtype=np.float64)
+        m, n = len(self.X), len(Y)
+        if m < 2 or n < 2:
+            return 0.0
+        k_yy = _rbf_kernel_sum(Y, Y, self.gamma)
+        sq = self.X_sqnorms[:, None] + (Y ** 2).sum(axis=1)[None, :] - 2 * self.X @ Y.T
+        k_xy = float(np.exp(-self.gamma * np.maximum(sq, 0)).sum())
+        mmd = self.k_xx_term + (k_yy - n) / (n * (n - 1)) - 2 * k_xy / (m * n)
+        return float(np.sqrt(max(mmd, 0)))
+
+def load_baseline_reference(data_dir, params, max_rows, seed=42):
+    """baseline 임베딩 기준 샘플(최대 max_rows개)과 전체 평균 (압축 캐시 우선)
+
+    Returns:
+        (reference, mean) — baseline 임베딩이 없으면 (None, None)
+    """
+    from cache_io import read_cache
+
+    if params['drift'].get('use_compact_embeddings', False):
+        from embedding_codec import COMPACT_BASELINE_CACHE, compressed_mean, decode_sample
+        compact = read_cache(data_dir, COMPACT_BASELINE_CACHE)
+        if compact and len(compact['files']):
+            return decode_sample(compact, max_rows, seed), compressed_mean(compact)
+
+    baseline_emb = read_cache(data_dir, "embedding_analysis_baseline")
+    if not baseline_emb:
+        return None, None
+    X = np.asarray([v['embedding'] for v in baseline_emb.values() if 'embedding' in v], dtype=np.float32)
+    if len(X) == 0:
+        return None, None
+    mean = X.mean(axis=0, dtype=np.float64)
+    if len(X) > max_rows:
+        idx = np.random.default_rng(seed).choice(len(X), max_rows, replace=False)
+        X = X[np.sort(idx)]
+    return X, mean
+
+def calculate_mmd_batched(pairs, gamma=1.0, max_elements=1 << 24):
+    """여러 (X, Y) 쌍의 MMD를 배치 커널로 계산 (각 값은 calculate_mmd(X, Y)와 동일)
+
+    크기가 다른 샘플은 0으로 패딩하고 mask 가중치로 제외, 커널 텐서 원소 수가
+    max_elements를 넘지 않도록 쌍을 나눠 처리
+
+    Args:
+        pairs: [(X, Y)] 리스트 (각각 (n, D) 배열, D는 모든 쌍에서 동일)
+
+    Returns:
+        MMD 리스트 (샘플이 2개 미만인 쌍은 0.0)
+    """
+    results = [0.0] * len(pairs)
+    valid = [i for i, (X, Y) in enumerate(pairs) if len(X) > 1 and len(Y) > 1]
+    # 크기가 비슷한 쌍끼리 묶어 패딩 낭비 최소화
+    valid.sort(key=lambda i: max(len(pairs[i][0]), len(pairs[i][1])))
+
+    def padded(arrays):
+        n = max(len(a) for a in arrays)
+        out = np.zeros((len(arrays), n, arrays[0].shape[1]))
+        mask = np.zeros((len(arrays), n))
+        for b, a in enumerate(arrays):
+            out[b, :len(a)] = a
+            mask[b, :len(a)] = 1.0
+        return out, mask
+
+    def kernel(A, B):
+        sq = (A ** 2).sum(-1)[:, :, None] + (B ** 2).sum(-1)[:, None, :] - 2 * A @ B.transpose(0, 2, 1)
+        return np.exp(-gamma * np.maximum(sq, 0))
+
+    start = 0
+    while start < len(valid):
+        size = max(len(pairs[valid[start]][0]), len(pairs[valid[start]][1]))
+        end = start + 1
+        while end < len(valid):
+            size = max(size, len(pairs[valid[end]][0]), len(pairs[valid[end]][1]))
+            if (end - start + 1) * size * size > max_elements:
+                break
+            end += 1
+        batch = valid[start:end]
+        X, mx = padded([np.asarray(pairs[i][0], dtype=np.float64) for i in batch])
+        Y, my = padded([np.asarray(pairs[i][1], dtype=np.float64) for i in batch])
+        m, n = mx.sum(1), my.sum(1)
+
+        # 대각 원소 k(x, x) = 1 제외
+        k_xx = np.einsum('bi,bij,bj->b', mx, kernel(X, X), mx) - m
+        k_yy = np.einsum('bi,bij,bj->b', my, kernel(Y, Y), my) - n
+        k_xy = np.einsum('bi,bij,bj->b', mx, kernel(X, Y), my)
+        mmd = k_xx / (m * (m - 1)) + k_yy / (n * (n - 1)) - 2 * k_xy / (m * n)
+        for b, i in enumerate(batch):
+            results[i] = float(np.sqrt(max(mmd[b], 0)))
+        start = end
+    return results
+
+def median_heuristic_gamma(X, Y=None, max_samples=1000, seed=0):
+    """RBF 커널 bandwidth median heuristic: gamma = 1 / median(||a - b||²)
+
+    X (와 Y)를 합친 샘플에서 최대 max_samples개로 쌍별 거리 계산
+    """
+    Z = np.asarray(X, dtype=np.float64) if Y is None else \
+        np.vstack([np.asarray(X, dtype=np.float64), np.asarray(Y, dtype=np.float64)])
+    if len(Z) > max_samples:
+        Z = Z[np.random.default_rng(seed).choice(len(Z), max_samples, replace=False)]
+    sq = (Z ** 2).sum(axis=1)
+    d2 = sq[:, None] + sq[None, :] - 2 * Z @ Z.T
+    d2 = d2[np.triu_indices(len(Z), k=1)]
+    median = float(np.median(np.maximum(d2, 0))) if len(d2) else 0.0
+    return 1.0 / median if median > 0 else 1.0
+
+def random_projections(dim, n_projections, seed=0):
+    """단위 구면 위의 랜덤 방향 (dim, n_projections)"""
+    P = np.random.default_rng(seed).standard_normal((dim, n_projections))
+    return P / np.linalg.norm(P, axis=0, keepdims=True)
+
+def sliced_distances(X, Y, n_projections=128, seed=0):
+    """랜덤 투영 1차원 분포 거리 (sliced Wasserstein-1 / sliced energy distance)
+
+    모든 투영을 한 번에 정렬해 경험 CDF 차이 F - G로 계산, 비용 O(L·n log n)
+    (1차원 값은 scipy wasserstein_distance / energy_distance와 동일)
+
+    Returns:
+        {'sliced_wasserstein', 'energy_distance'} (투영 평균)
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    m, n = len(X), len(Y)
+    P = random_projections(X.shape[1], n_projections, seed)
+
+    values = np.vstack([X @ P, Y @ P])
+    order = np.argsort(values, axis=0, kind='stable')
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    from_x = order < m
+    cdf_gap = np.cumsum(from_x, axis=0)[:-1] / m - np.cumsum(~from_x, axis=0)[:-1] / n
+    deltas = np.diff(sorted_values, axis=0)
+
+    wasserstein = (np.abs(cdf_gap) * deltas).sum(axis=0)
+    energy = np.sqrt(2 * (cdf_gap ** 2 * deltas).sum(axis=0))
+    return {
+        'sliced_wasserstein': float(wasserstein.mean()),
+        'energy_distance': float(energy.mean())
+    }
+
+def classifier_two_sample_test(X, Y, folds=5, seed=0):
+    """도메인 분류기 2-표본 검정 (baseline vs current 로지스틱 회귀, 교차검증 AUC)
+
+    두 분포가 같으면 AUC ≈ 0.5, score = max(0, 2·AUC - 1) ∈ [0, 1]
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import StratifiedKFold, cross_val_predict
+    from sklearn.metrics import roc_auc_score
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    Z = np.vstack([np.asarray(X, dtype=np.float64), np.asarray(Y, dtype=np.float64)])
+    labels = np.concatenate([np.zeros(len(X)), np.ones(len(Y))])
+    folds = min(folds, len(X), len(Y))
+    if folds < 2:
+        return {'auc': 0.5, 'score': 0.0}
+
+    model = make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000))
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    proba = cross_val_predict(model, Z, labels, cv=cv, method='predict_proba')[:, 1]
+    auc = float(roc_auc_score(labels, proba))
+    return {'auc': auc, 'score': max(0.0, 2 * auc - 1)}
+
+def attribute_drift_metrics(ref_values, cur_values):
+    """속성 드리프트 메트릭 (크기/노이즈/선명도/종합 품질)
+
+    Args:
+        ref_values, cur_values: attribute_values() 결과
+
+    Returns:
+        detect_drift metrics.json과 동일한 구조의 dict ('size', 'noise', 'sharpness', 'quality')
+    """
+    from scipy.stats import wasserstein_distance, ks_2samp
+
+    metrics = {}
+    ref_sizes, cur_sizes = ref_values['size'], cur_values['size']
+    if ref_sizes and cur_sizes:
+        size_ks = ks_2samp(ref_sizes, cur_sizes)
+        metrics['size'] = {
+            'kl_divergence': calculate_kl_divergence(ref_sizes, cur_sizes),
+            'wasserstein_distance': float(wasserstein_distance(ref_sizes, cur_sizes)),
+            'ks_statistic': float(size_ks.statistic),
+            'ks_pvalue': float(size_ks.pvalue)
+        }
+
+    for key in ('noise', 'sharpness'):
+        ref, cur = ref_values[key], cur_values[key]
+        if ref and cur:
+            metrics[key] = {
+                'kl_divergence': calculate_kl_divergence(ref, cur),
+                'wasserstein_distance': float(wasserstein_distance(ref, cur)),
+                'mean_change': float(np.mean(cur) - np.mean(ref))
+            }
+
+    ref_quality, cur_quality = ref_values['quality'], cur_values['quality']
+    if ref_quality and cur_quality:
+        mean_change = float(np.mean(cur_quality) - np.mean(ref_quality))
+        metrics['quality'] = {
+            'kl_divergence': calculate_kl_divergence(ref_quality, cur_quality),
+            'mean_change': mean_change,
+            'baseline_mean': float(np.mean(ref_quality)),
+            'current_mean': float(np.mean(cur_quality)),
+            'status': quality_status(mean_change)
+        }
+    return metrics
+
+def overall_drift_score(drift_metrics, weights=None):
+    """항목별 KL / 임베딩 MMD (및 추가 메트릭) 가중 합
+
+    Args:
+        weights: {SCORE_METRICS 키: 가중치} (None이면 SCORE_WEIGHTS)
+    """
+    score = 0.0
+    for key, weight in (weights or SCORE_WEIGHTS).items():
+        section, metric = SCORE_METRICS[key]
+        score += weight * drift_metrics.get(section, {}).get(metric, 0)
+    return float(score)
+
+def base_score_weights(weights=None):
+    """기본 메트릭(SCORE_WEIGHTS 키)만 계산하는 경로(스냅샷/그룹/상주 서버/스트리밍)용 가중치
+
+    추가 메트릭 키는 제외하고 가중치 합이 같도록 나머지를 재정규화 (임계값 척도 유지)
+
+    Returns:
+        (가중치, 제외된 키 리스트 — 가중치가 0이 아닌 추가 메트릭)
+    """
+    weights = weights or SCORE_WEIGHTS
+    kept = {k: w for k, w in weights.items() if k in SCORE_WEIGHTS}
+    dropped = sorted(k for k, w in weights.items() if k not in SCORE_WEIGHTS and w)
+    kept_total = sum(kept.values())
+    if dropped and kept_total > 0:
+        scale = sum(weights.values()) / kept_total
+        kept = {k: w * scale for k, w in kept.items()}
+    return kept, dropped
+
+def drift_status(score, warning_threshold, critical_threshold):
+    """Overall Drift Score → NORMAL / WARNING / CRITICAL"""
+    if score > critical_threshold:
+        return 'CRITICAL'
+    if score > warning_threshold:
+        return 'WARNING'
+    return 'NORMAL'
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+대용량 데이터셋용 통계적 샘플링 드리프트
+전체 캐시 대신 층화 reservoir 샘플로 속성/임베딩 드리프트를 계산하고
+bootstrap으로 Overall Drift Score 신뢰구간 산출 → 데이터셋 크기와 무관한 고정 비용
+
+- 샘플 크기: DKW 부등식 n = ln(2/α) / (2ε²)
+  (ε = 목표 오차: 경험 CDF 최대 오차, 1-α = 신뢰수준)
+- 층(stratum): baseline 클러스터 label (클러스터 드리프트가 저장한 file_labels),
+  없으면 파일 크기 분위수 구간
+- 층별 bottom-k reservoir: 파일명 해시를 우선순위로 사용해 한 번 순회로 고정 크기 샘플 유지,
+  데이터셋이 바뀌어도 공통 파일은 계속 샘플에 남아 실행 간 변동이 작음
+"""
+import bisect
+import heapq
+import hashlib
+import math
+
+import numpy as np
+
+from drift_metrics import calculate_kl_divergence, overall_drift_score, drift_status
+
+DEFAULT_CONFIG = {
+    'enabled': False,
+    'target_error': 0.02,           # 경험 CDF 최대 오차 ε
+    'confidence': 0.95,             # 신뢰수준 1-α (샘플 크기, 신뢰구간 공용)
+    'min_population': 20000,        # 파일 수가 이보다 작으면 샘플링 없이 전체 사용
+    'max_embedding_samples': 2000,  # MMD는 O(n²)이므로 임베딩 샘플 상한
+    'size_strata': 10,              # 클러스터 label이 없을 때 크기 분위수 층 수
+    'bootstrap_iterations': 200,
+    'seed': 42
+}
+
+ATTRIBUTE_KEYS = ('size', 'noise', 'sharpness', 'quality')
+
+def required_sample_size(target_error, confidence):
+    """목표 오차/신뢰수준을 만족하는 샘플 크기 (DKW 부등식)"""
+    alpha = 1.0 - confidence
+    return int(math.ceil(math.log(2.0 / alpha) / (2.0 * target_error ** 2)))
+
+def _priority(name, seed):
+    return int.from_bytes(hashlib.md5(f"{seed}:{name}".encode()).digest()[:8], 'big')
+
+def allocate(strata_counts, n):
+    """층별 할당량 (비례 배분, 최대 잔여 방식, 비어 있지 않은 층은 최소 1개)"""
+    total = sum(strata_counts.values())
+    if n >= total:
+        return dict(strata_counts)
+    exact = {s: n * c / total for s, c in strata_counts.items()}
+    quota = {s: min(c, max(1, int(exact[s]))) for s, c in strata_counts.items()}
+    remainder = n - sum(quota.values())
+    for s in sorted(exact, key=lambda s: exact[s] - int(exact[s]), reverse=True):
+        if remainder <= 0:
+            break
+        if quota[s] < strata_counts[s]:
+            quota[s] += 1
+            remainder -= 1
+    return quota
+
+def stratified_reservoir(names, stratum_of, n, seed=42):
+    """층화 bottom-k reservoir 샘플 (해시 우선순위이므로 순회 순서와 무관)
+
+    Args:
+        names: 파일명 iterable
+        stratum_of: 파일명 → 층 키
+        n: 전체 샘플 크기
+
+    Returns:
+        샘플 파일명 set
+    """
+    names = list(names)
+    strata = [stratum_of(name) for name in names]
+    counts = {}
+    for s in strata:
+        counts[s] = counts.get(s, 0) + 1
+    quota = allocate(counts, n)
+
+    # 층별 최대 힙 (우선순위가 가장 작은 k개 유지)
+    heaps = {s: [] for s in counts}
+    for name, s in zip(names, strata):
+        item = (-_priority(name, seed), name)
+        heap = heaps[s]
+        if len(heap) < quota[s]:
+            heapq.heappush(heap, item)
+        elif quota[s] and item > heap[0]:
+            heapq.heapreplace(heap, item)
+    return {name for heap in heaps.values() for _, name in heap}
+
+def build_stratum_fn(reference_attr, attr_cache, file_labels=None, size_strata=10):
+    """파일명 → 층 키 함수
+
+    baseline 클러스터 label이 있는 파일은 label, 그 외(신규 파일 등)는 baseline 크기 분위수 구간
+
+    Args:
+        reference_attr: 분위수 경계를 정할 속성 캐시 (baseline)
+        attr_cache: 파일 크기를 조회할 속성 캐시
+    """
+    file_labels = file_labels or {}
+    sizes = np.array([v['size'] for v in reference_attr.values() if 'size' in v])
+    edges = []
+    if len(sizes) and size_strata > 1:
+        edges = np.unique(np.quantile(sizes, np.linspace(0, 1, size_strata + 1)[1:-1])).tolist()
+
+    def stratum_of(name):
+        if name in file_labels:
+            return ('cluster', file_labels[name])
+        return ('size', bisect.bisect_left(edges, attr_cache.get(name, {}).get('size', 0.0)))
+    return stratum_of
+
+def _rbf_kernel(A, B, gamma):
+    sq = (A * A).sum(axis=1)[:, None] + (B * B).sum(axis=1)[None, :] - 2 * A @ B.T
+    return np.exp(-gamma * np.maximum(sq, 0))
+
+def _weighted_mmd(K_XX, K_YY, K_XY, cx, cy):
+    """재표본 빈도 벡터로 calculate_mmd와 동일한 추정량 계산 (대각 k(x, x) = 1 제외)"""
+    m, n = cx.sum(), cy.sum()
+    mmd = (cx @ K_XX @ cx - m) / (m * (m - 1))
+    mmd += (cy @ K_YY @ cy - n) / (n * (n - 1))
+    mmd -= 2 * (cx @ K_XY @ cy) / (m * n)
+    return float(np.sqrt(max(mmd, 0)))
+
+def bootstrap_overall_score(ref_values, cur_values, ref_embeddings=None, cur_embeddings=None,
+                            thresholds=(0.15, 0.25), config=None, gamma=1.0, weights=None,
+                            fixed_metrics=None):
+    """Overall Drift Score bootstrap 분포 요약
+
+    속성 값과 임베딩 샘플을 각각 복원 추출해 detect_drift와 같은 가중치로 점수를 재계산
+    임베딩 커널 행렬은 한 번만 계산하고 재표본은 빈도 벡터 가중합으로 처리
+
+    Args:
+        weights: Overall Score 가중치 (None이면 SCORE_WEIGHTS)
+        fixed_metrics: 재표본하지 않는 메트릭 (추가 메트릭은 점 추정값으로 고정)
+
+    Returns:
+        {'ci_low', 'ci_high', 'std', 'iterations', 'status_probability': {상태: 비율}}
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    rng = np.random.default_rng(config['seed'])
+    iterations = config['bootstrap_iterations']
+
+    attr_pairs = {k: (np.asarray(ref_values[k]), np.asarray(cur_values[k]))
+                  for k in ATTRIBUTE_KEYS if ref_values.get(k) and cur_values.get(k)}
+
+    kernels = None
+    if ref_embeddings is not None and cur_embeddings is not None \
+            and len(ref_embeddings) > 1 and len(cur_embeddings) > 1:
+        X = np.asarray(ref_embeddings, dtype=np.float32)
+        Y = np.asarray(cur_embeddings, dtype=np.float32)
+        kernels = (_rbf_kernel(X, X, gamma), _rbf_kernel(Y, Y, gamma), _rbf_kernel(X, Y, gamma))
+
+    scores = np.empty(iterations)
+    for b in range(iterations):
+        metrics = {k: dict(v) for k, v in (fixed_metrics or {}).items() if isinstance(v, dict)}
+        for key, (ref, cur) in attr_pairs.items():
+            metrics.setdefault(key, {})['kl_divergence'] = calculate_kl_divergence(
+                ref[rng.integers(0, len(ref), len(ref))],
+                cur[rng.integers(0, len(cur), len(cur))]
+            )
+        if kernels is not None:
+            m, n = kernels[2].shape
+            cx = np.bincount(rng.integers(0, m, m), minlength=m).astype(np.float64)
+            cy = np.bincount(rng.integers(0, n, n), minlength=n).astype(np.float64)
+            metrics.setdefault('embedding', {})['mmd'] = _weighted_mmd(*kernels, cx, cy)
+        scores[b] = overall_drift_score(metrics, weights)
+
+    tail = (1.0 - config['confidence']) / 2 * 100
+    statuses = [drift_status(s, *thresholds) for s in scores]
+    return {
+        'ci_low': float(np.percentile(scores, tail)),
+        'ci_high': float(np.percentile(scores, 100 - tail)),
+        'std': float(scores.std()),
+        'iterations': iterations,
+        'status_probability': {s: statuses.count(s) / iterations for s in ('NORMAL', 'WARNING', 'CRITICAL')}
+    }
+
+def sample_caches(baseline_attr, current_attr, baseline_names, current_names, common,
+                  file_labels=None, config=None):
+    """드리프트 계산용 샘플 선택
+
+    Args:
+        baseline_names, current_names: 임베딩이 있는 파일명
+        common: baseline/current 공통 파일 (속성 드리프트 대상)
+
+    Returns:
+        (common 샘플, baseline 임베딩 샘플, current 임베딩 샘플, 요약 dict)
+        모집단이 샘플 크기 이하인 항목은 전체를 그대로 반환
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    n_attr = required_sample_size(config['target_error'], config['confidence'])
+    n_emb = min(n_attr, config['max_embedding_samples'])
+
+    # 층 경계는 baseline 기준으로 고정 (현재 파일도 같은 구간으로 분류)
+    ref_stratum = build_stratum_fn(baseline_attr, baseline_attr, file_labels, config['size_strata'])
+    cur_stratum = build_stratum_fn(baseline_attr, current_attr, file_labels, config['size_strata'])
+
+    def pick(names, n, stratum_of):
+        names = set(names)
+        if len(names) <= n:
+            return names
+        return stratified_reservoir(names, stratum_of, n, config['seed'])
+
+    common_sample = pick(common, n_attr, ref_stratum)
+    ref_sample = pick(baseline_names, n_emb, ref_stratum)
+    cur_sample = pick(current_names, n_emb, cur_stratum)
+
+    summary = {
+        'target_error': config['target_error'],
+        'confidence': config['confidence'],
+        'strata': 'cluster' if file_labels else 'size',
+        'attribute': {'population': len(common), 'sample': len(common_sample)},
+        'embedding_baseline': {'population': len(set(baseline_names)), 'sample': len(ref_sample)},
+        'embedding_current': {'population': len(set(current_names)), 'sample': len(cur_sample)}
+    }
+    return common_sample, ref_sample, cur_sample, summary
+
+def should_sample(config, *populations):
+    """샘플링 모드 적용 여부 (enabled + 모집단 크기)"""
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    return bool(config['enabled']) and max(populations, default=0) > config['min_population']
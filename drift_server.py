@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+상주 드리프트 서버 (asyncio HTTP, TCP 또는 Unix socket)
+데이터셋별 baseline(속성 히스토그램 스케치, 임베딩 기준 샘플과 커널 항)을 메모리에 유지하고
+새 배치(임베딩/속성 또는 파일 경로)에 대한 드리프트 메트릭과 상태를 즉시 반환
+
+detect_drift.py와 동일한 메트릭(drift_metrics)과 가중치/임계값 사용.
+배치는 baseline 전체와 비교되며 metrics.json/timeline.tsv는 갱신하지 않음
+요청은 스레드 풀에서 처리되며 데이터셋별 잠금으로 같은 데이터셋 요청(경로 분석 포함)은 직렬화
+임베딩이 2개 미만인 배치는 MMD를 계산할 수 없어 mean_shift만 반환 (overall_score의 임베딩 항은 0)
+
+사용법:
+    python drift_server.py                       # params.yaml drift_server 설정
+    python drift_server.py --port 8765
+    python drift_server.py --unix-socket /tmp/drift.sock
+
+API:
+    GET  /health
+    GET  /datasets
+    POST /drift/<dataset>   {"embeddings": [[...], ...], "attributes": [{"size": .., "noise_level": .., "sharpness": ..}, ...]}
+                            또는 {"paths": ["datasets/test_data/a.jpg", ...]}
+    POST /reload/<dataset>  baseline 다시 로드 (baseline 재설정 후)
+"""
+import sys
+import json
+import time
+import asyncio
+import threading
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# ddoc 모듈 import
+sys.path.insert(0, str(Path(__file__).parent.parent / 'datadrift_app_engine'))
+
+from dataset_utils import load_params, resolve_dataset
+from metric_engine import load_config as load_metric_config, resolve_gamma
+from drift_metrics import (
+    attribute_values, histogram_sketch, kl_from_sketch, quality_status, MMDReference,
+    load_baseline_reference, overall_drift_score, base_score_weights, drift_status
+)
+
+DEFAULT_CONFIG = {
+    'host': '127.0.0.1',
+    'port': 8765,
+    'unix_socket': None,            # 지정하면 TCP 대신 Unix socket
+    'max_reference_samples': 2000,  # MMD 기준 샘플 수 (배치당 비용 O(기준 샘플 × 배치))
+    'max_body_mb': 64,
+    'seed': 42
+}
+
+ATTRIBUTE_KEYS = ('size', 'noise', 'sharpness', 'quality')
+
+class DriftRequestError(Exception):
+    """잘못된 요청 (HTTP 4xx)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+class ResidentBaseline:
+    """데이터셋 하나의 baseline 상주 상태"""
+
+    def __init__(self, name, params, config):
+        from cache_io import read_cache
+
+        self.name = name
+        self.params = params
+        # 현재 캐시 갱신(resolve_paths)과 평가를 요청 간에 직렬화
+        self.lock = threading.Lock()
+        self.data_dir, self.formats = resolve_dataset(params, name)
+
+        baseline_attr = read_cache(self.data_dir, "attribute_analysis_baseline") or {}
+        values = attribute_values(baseline_attr)
+        self.sketches = {k: histogram_sketch(v) for k, v in values.items() if v}
+        self.attr_means = {k: float(np.mean(v)) for k, v in values.items() if v}
+
+        ref, self.embedding_mean = load_baseline_reference(
+            self.data_dir, params, config['max_reference_samples'], config['seed']
+        )
+        # detect_drift와 같은 점수 가중치/gamma ("median"이면 baseline 기준 샘플로 계산)
+        # 추가 메트릭은 계산하지 않으므로 가중치는 기본 메트릭으로 재정규화
+        metric_config, weights = load_metric_config(params['drift'])
+        self.weights, self.dropped_weights = base_score_weights(weights)
+        self.reference = None
+        if ref is not None and len(ref) > 1:
+            self.reference = MMDReference(ref, resolve_gamma(metric_config, ref))
+        self.embedding_dim = int(ref.shape[1]) if ref is not None else None
+        self.num_baseline_files = len(baseline_attr)
+
+        # 경로 요청용 현재 캐시 (없는 파일만 분석)
+        self.current_attr = read_cache(self.data_dir, "attribute_analysis") or {}
+        self.current_emb = read_cache(self.data_dir, "embedding_analysis") or {}
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'data_dir': str(self.data_dir),
+            'baseline_files': self.num_baseline_files,
+            'reference_samples': len(self.reference.X) if self.reference else 0,
+            'mmd_gamma': self.reference.gamma if self.reference else None,
+            'embedding_dim': self.embedding_dim,
+            'score_weights_dropped': self.dropped_weights
+        }
+
+    def resolve_paths(self, paths):
+        """파일 경로 → (속성 레코드, 임베딩) — 캐시에 없는 파일만 증분 분석"""
+        names = [Path(p).name for p in paths]
+        missing = [p for p, n in zip(paths, names) if n not in self.current_attr or n not in self.current_emb]
+        if missing:
+            from ddoc_subset import analyze_subset
+            attr_cache, emb_cache, _ = analyze_subset(self.data_dir, missing, self.formats, self.params)
+            self.current_attr = attr_cache or self.current_attr
+            self.current_emb = emb_cache or self.current_emb
+
+        attributes = [self.current_attr[n] for n in names if n in self.current_attr]
+        embeddings = [self.current_emb[n]['embedding'] for n in names
+                      if n in self.current_emb and 'embedding' in self.current_emb[n]]
+        unresolved = [n for n in names if n not in self.current_attr]
+        return attributes, embeddings, unresolved
+
+    def evaluate(self, attributes, embeddings):
+        """배치 드리프트 메트릭 (baseline 대비)"""
+        drift_metrics = {}
+
+        if attributes:
+            values = attribute_values(dict(enumerate(attributes)))
+            for key in ATTRIBUTE_KEYS:
+                if key in self.sketches and values[key]:
+                    drift_metrics[key] = {
+                        'kl_divergence': kl_from_sketch(self.sketches[key], values[key]),
+                        'mean_change': float(np.mean(values[key]) - self.attr_means[key])
+                    }
+            if 'quality' in drift_metrics:
+                drift_metrics['quality']['status'] = quality_status(drift_metrics['quality']['mean_change'])
+
+        if embeddings is not None and len(embeddings) and self.reference is not None:
+            Y = np.asarray(embeddings, dtype=np.float32)
+            if Y.ndim != 2 or Y.shape[1] != self.embedding_dim:
+                raise DriftRequestError(
+                    f"임베딩 차원 불일치: {Y.shape[-1]} (baseline {self.embedding_dim})"
+                )
+            drift_metrics['embedding'] = {
+                'mean_shift': float(np.linalg.norm(self.embedding_mean - Y.mean(axis=0)))
+            }
+            if len(Y) >= 2:
+                drift_metrics['embedding']['mmd'] = self.reference.mmd(Y)
+            else:
+                # 불편 MMD 추정에는 배치 샘플 2개 이상 필요 (0으로 보고하지 않음)
+                drift_metrics['embedding']['mmd_skipped'] = "배치 임베딩 2개 미만: mean_shift로 판단"
+
+        score = overall_drift_score(drift_metrics, self.weights)
+        drift_metrics['overall_score'] = score
+        if self.dropped_weights:
+            drift_metrics['score_weights_dropped'] = self.dropped_weights
+        drift_metrics['status'] = drift_status(
+            score, self.params['drift']['threshold_warning'], self.params['drift']['threshold_critical']
+        )
+        drift_metrics['batch_size'] = max(len(attributes), len(embeddings) if embeddings is not None else 0)
+        return drift_metrics
+
+class DriftServer:
+    """baseline 상주 드리프트 서버"""
+
+    def __init__(self, params, config):
+        self.params = params
+        self.config = config
+        self.baselines = {}
+        # baselines dict 변경 보호 (로드 중에는 잡지 않음)
+        self.lock = threading.Lock()
+        # 데이터셋별 로드 잠금: 같은 데이터셋은 한 번만 로드, 다른 데이터셋 요청은 막지 않음
+        self.loading = {}
+
+    def baseline(self, name, reload=False):
+        names = [ds['name'] for ds in self.params.get('datasets', [])]
+        if name not in names:
+            raise DriftRequestError(f"데이터셋 '{name}'을 찾을 수 없습니다.", status=404)
+        with self.lock:
+            if not reload and name in self.baselines:
+                return self.baselines[name]
+            loader = self.loading.setdefault(name, threading.Lock())
+
+        with loader:
+            with self.lock:
+                current = self.baselines.get(name)
+            if current is not None and not reload:
+                # 대기하는 동안 다른 요청이 로드함
+                return current
+            # 캐시 로드/디코딩은 전역 잠금 밖에서, 재로드 중에는 이전 baseline이 계속 응답
+            resident = ResidentBaseline(name, self.params, self.config)
+            with self.lock:
+                self.baselines[name] = resident
+            return resident
+
+    def load_all(self):
+        for ds in self.params.get('datasets', []):
+            start = time.perf_counter()
+            baseline = self.baseline(ds['name'])
+            info = baseline.describe()
+            print(f"   📦 {ds['name']}: baseline {info['baseline_files']}개 파일, "
+                  f"기준 샘플 {info['reference_samples']}개 ({time.perf_counter() - start:.1f}초)")
+
+    def handle(self, method, path, body):
+        """요청 처리 → (HTTP 상태, 응답 dict)"""
+        parts = [p for p in path.split('?')[0].split('/') if p]
+
+        with self.lock:
+            baselines = dict(self.baselines)
+        if method == 'GET' and parts == ['health']:
+            return 200, {'status': 'ok', 'datasets': list(baselines)}
+        if method == 'GET' and parts == ['datasets']:
+            return 200, {'datasets': [b.describe() for b in baselines.values()]}
+
+        if method == 'POST' and len(parts) == 2 and parts[0] == 'reload':
+            return 200, self.baseline(parts[1], reload=True).describe()
+
+        if method == 'POST' and len(parts) == 2 and parts[0] == 'drift':
+            baseline = self.baseline(parts[1])
+            try:
+                payload = json.loads(body or b'{}')
+            except json.JSONDecodeError as e:
+                raise DriftRequestError(f"JSON 파싱 실패: {e}")
+
+            start = time.perf_counter()
+            unresolved = []
+            with baseline.lock:
+                if payload.get('paths'):
+                    attributes, embeddings, unresolved = baseline.resolve_paths(payload['paths'])
+                else:
+                    attributes = payload.get('attributes') or []
+                    embeddings = payload.get('embeddings')
+                if not attributes and not embeddings:
+                    raise DriftRequestError("embeddings, attributes 또는 paths가 필요합니다.")
+
+                result = baseline.evaluate(attributes, embeddings)
+            if unresolved:
+                result['unresolved_paths'] = unresolved
+            result['latency_ms'] = (time.perf_counter() - start) * 1000
+            return 200, result
+
+        raise DriftRequestError(f"지원하지 않는 요청: {method} {path}", status=404)
+
+    async def serve_connection(self, reader, writer):
+        """HTTP/1.1 keep-alive 연결 처리"""
+        loop = asyncio.get_running_loop()
+        max_body = int(self.config['max_body_mb'] * 1024 * 1024)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # 본문 경계를 알 수 없으므로 응답 후 연결 종료
+                    status, response = 400, {'error': "잘못된 Content-Length 헤더"}
+                    keep_alive = False
+                elif length > max_body:
+                    status, response = 413, {'error': f"요청 크기 제한 초과 ({self.config['max_body_mb']}MB)"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    try:
+                        # numpy 연산/증분 분석은 이벤트 루프 밖에서 실행
+                        status, response = await loop.run_in_executor(None, self.handle, method, path, body)
+                    except DriftRequestError as e:
+                        status, response = e.status, {'error': str(e)}
+                    except Exception as e:
+                        status, response = 500, {'error': str(e)}
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+
+                data = json.dumps(response).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self):
+        if self.config['unix_socket']:
+            # 이전 실행이 남긴 소켓 파일 정리
+            Path(self.config['unix_socket']).unlink(missing_ok=True)
+            server = await asyncio.start_unix_server(self.serve_connection, path=self.config['unix_socket'])
+            address = f"unix:{self.config['unix_socket']}"
+        else:
+            server = await asyncio.start_server(self.serve_connection, self.config['host'], self.config['port'])
+            address = f"http://{self.config['host']}:{self.config['port']}"
+        print(f"✅ 드리프트 서버 시작: {address}")
+        async with server:
+            await server.serve_forever()
+
+def request_drift(dataset, payload, host=DEFAULT_CONFIG['host'], port=DEFAULT_CONFIG['port'],
+                  unix_socket=None, timeout=30):
+    """클라이언트 헬퍼: 드리프트 서버에 배치 요청
+
+    Returns:
+        응답 dict (status, overall_score, 항목별 메트릭, latency_ms)
+    """
+    import http.client
+    import socket
+
+    if unix_socket:
+        class UnixHTTPConnection(http.client.HTTPConnection):
+            def connect(self):
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.settimeout(timeout)
+                self.sock.connect(unix_socket)
+
+        conn = UnixHTTPConnection('localhost', timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    try:
+        conn.request('POST', f'/drift/{dataset}', body=json.dumps(payload),
+                     headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        return json.loads(response.read())
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="상주 드리프트 서버")
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--unix-socket', default=None)
+    args = parser.parse_args()
+
+    params = load_params()
+    config = {**DEFAULT_CONFIG, **(params.get('drift_server') or {})}
+    for key in ('host', 'port', 'unix_socket'):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    print("🔍 드리프트 서버 baseline 로드")
+    print("=" * 80)
+    server = DriftServer(params, config)
+    server.load_all()
+
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        print("\n🛑 드리프트 서버 종료")
+
+if __name__ == "__main__":
+    main()
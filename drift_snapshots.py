@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+실행별 compact 스냅샷과 다중 기준(reference) 드리프트 비교
+전체 캐시 복사본 대신 실행마다 요약만 보존
+- 속성: 항목별 샘플(reservoir, 최대 attribute_sample_size개)
+- 임베딩: 샘플(float16, 최대 embedding_sample_size개) + 평균 벡터 + 원소 분산/제곱평균 + 개수
+
+현재 데이터 요약을 한 번 만든 뒤 여러 기준과 비교해 드리프트 행렬 생성
+기준 지정: "baseline" (고정 baseline), "previous" (직전 실행), "rolling:N" (최근 N회 합산),
+          "age:7d" (7일 이상 지난 가장 최근 스냅샷)
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from drift_metrics import (
+    attribute_values, calculate_kl_divergence, MMDReference, overall_drift_score, base_score_weights,
+    drift_status
+)
+
+SNAPSHOT_CACHE = "drift_snapshots"
+TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+ATTRIBUTE_KEYS = ('size', 'noise', 'sharpness', 'quality')
+
+DEFAULT_CONFIG = {
+    'enabled': True,
+    'references': ['baseline', 'previous', 'rolling:10'],
+    'max_snapshots': 60,            # 보존할 최대 실행 스냅샷 수
+    'max_age_days': 90,             # 이보다 오래된 스냅샷 삭제 (null=무제한)
+    'attribute_sample_size': 2000,
+    'embedding_sample_size': 500,
+    'seed': 42
+}
+
+def _sample(values, size, rng):
+    values = np.asarray(values)
+    if len(values) > size:
+        values = values[np.sort(rng.choice(len(values), size, replace=False))]
+    return values
+
+def build_snapshot(timestamp, attr_cache, embeddings=None, compact=None, config=None):
+    """실행 하나의 compact 스냅샷
+
+    Args:
+        attr_cache: 속성 캐시 {파일명: {...}}
+        embeddings: (N, D) float 임베딩 배열 (compact와 택일)
+        compact: embedding_codec compact 캐시 (압축 임베딩 모드)
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    rng = np.random.default_rng(config['seed'])
+
+    values = attribute_values(attr_cache or {})
+    snapshot = {
+        'timestamp': timestamp,
+        'num_files': len(attr_cache or {}),
+        'attributes': {k: _sample(v, config['attribute_sample_size'], rng).astype(np.float32)
+                       for k, v in values.items() if v}
+    }
+
+    if compact is not None and len(compact['files']):
+        from embedding_codec import decode_sample, compressed_mean, compressed_variance
+
+        mean = compressed_mean(compact)
+        var = compressed_variance(compact)
+        sample = decode_sample(compact, config['embedding_sample_size'], config['seed'])
+        count = len(compact['files'])
+    elif embeddings is not None and len(embeddings):
+        X = np.asarray(embeddings, dtype=np.float32)
+        mean = X.mean(axis=0, dtype=np.float64)
+        var = float(np.var(X))
+        sample = _sample(X, config['embedding_sample_size'], rng)
+        count = len(X)
+    else:
+        return snapshot
+
+    snapshot['embedding'] = {
+        'sample': np.asarray(sample, dtype=np.float16),
+        'mean': np.asarray(mean, dtype=np.float32),
+        'variance': float(var),
+        # 원소 제곱평균 E[x²] (rolling 합산 시 분산 계산용)
+        'sq_mean': float(var + float(np.mean(mean)) ** 2),
+        'count': int(count)
+    }
+    return snapshot
+
+def pool_snapshots(snapshots, config=None):
+    """여러 스냅샷을 하나의 기준으로 합산 (샘플 합집합 재샘플링, 개수 가중 평균/분산)"""
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    rng = np.random.default_rng(config['seed'])
+
+    pooled = {
+        'timestamp': snapshots[-1]['timestamp'],
+        'num_files': int(np.mean([s['num_files'] for s in snapshots])),
+        'attributes': {}
+    }
+    for key in ATTRIBUTE_KEYS:
+        parts = [s['attributes'][key] for s in snapshots if key in s['attributes']]
+        if parts:
+            pooled['attributes'][key] = _sample(np.concatenate(parts), config['attribute_sample_size'], rng)
+
+    embs = [s['embedding'] for s in snapshots if 'embedding' in s]
+    dims = {e['mean'].shape[0] for e in embs}
+    if embs and len(dims) == 1:
+        counts = np.array([e['count'] for e in embs], dtype=np.float64)
+        weights = counts / counts.sum()
+        mean = sum(w * e['mean'].astype(np.float64) for w, e in zip(weights, embs))
+        sq_mean = float(sum(w * e['sq_mean'] for w, e in zip(weights, embs)))
+        pooled['embedding'] = {
+            'sample': _sample(np.concatenate([e['sample'] for e in embs]), config['embedding_sample_size'], rng),
+            'mean': mean.astype(np.float32),
+            'variance': sq_mean - float(np.mean(mean)) ** 2,
+            'sq_mean': sq_mean,
+            'count': int(counts.sum())
+        }
+    return pooled
+
+def resolve_reference(spec, store, now, config=None):
+    """기준 지정 문자열 → 스냅샷 (없으면 None)"""
+    runs = store.get('runs', [])
+    if spec == 'baseline':
+        return store.get('baseline')
+    if spec == 'previous':
+        return runs[-1] if runs else None
+    if spec.startswith('rolling:'):
+        n = int(spec.split(':', 1)[1])
+        return pool_snapshots(runs[-n:], config) if runs else None
+    if spec.startswith('age:'):
+        days = float(spec.split(':', 1)[1].rstrip('d'))
+        cutoff = (now - timedelta(days=days)).strftime(TIMESTAMP_FORMAT)
+        older = [s for s in runs if s['timestamp'] <= cutoff]
+        return older[-1] if older else None
+    raise ValueError(f"지원하지 않는 기준: {spec} (baseline | previous | rolling:N | age:Nd)")
+
+def compare_snapshot(reference, current, thresholds, weights=None, gamma=1.0):
+    """기준 스냅샷 대비 현재 스냅샷 드리프트 (detect_drift와 동일 메트릭/가중치/gamma)
+
+    스냅샷에는 추가 메트릭이 없으므로 가중치는 기본 메트릭으로 재정규화 (base_score_weights)
+    """
+    weights, dropped = base_score_weights(weights)
+    metrics = {}
+    for key in ATTRIBUTE_KEYS:
+        ref = reference['attributes'].get(key)
+        cur = current['attributes'].get(key)
+        if ref is not None and cur is not None and len(ref) and len(cur):
+            metrics[key] = {
+                'kl_divergence': calculate_kl_divergence(ref, cur),
+                'mean_change': float(np.mean(cur) - np.mean(ref))
+            }
+
+    ref_emb, cur_emb = reference.get('embedding'), current.get('embedding')
+    if ref_emb and cur_emb and ref_emb['mean'].shape == cur_emb['mean'].shape:
+        ref_var = ref_emb['variance']
+        metrics['embedding'] = {
+            'mmd': MMDReference(ref_emb['sample'].astype(np.float32), gamma).mmd(
+                cur_emb['sample'].astype(np.float32)
+            ),
+            'mean_shift': float(np.linalg.norm(ref_emb['mean'] - cur_emb['mean'])),
+            'variance_change': float(abs(cur_emb['variance'] - ref_var) / ref_var) if ref_var > 0 else 0.0
+        }
+
+    score = overall_drift_score(metrics, weights)
+    metrics['overall_score'] = score
+    metrics['status'] = drift_status(score, *thresholds)
+    metrics['reference_timestamp'] = reference['timestamp']
+    if dropped:
+        metrics['score_weights_dropped'] = dropped
+    return metrics
+
+def drift_matrix(store, current, references, thresholds, now=None, config=None, weights=None, gamma=1.0):
+    """여러 기준 대비 드리프트 행렬 {기준: 메트릭}"""
+    now = now or datetime.now()
+    matrix = {}
+    for spec in references:
+        reference = resolve_reference(spec, store, now, config)
+        if reference is not None:
+            matrix[spec] = compare_snapshot(reference, current, thresholds, weights, gamma)
+    return matrix
+
+def apply_retention(store, now=None, config=None):
+    """보존 정책 적용 (최대 개수, 최대 보존 기간)"""
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    now = now or datetime.now()
+    runs = store.get('runs', [])
+    if config.get('max_age_days'):
+        cutoff = (now - timedelta(days=config['max_age_days'])).strftime(TIMESTAMP_FORMAT)
+        runs = [s for s in runs if s['timestamp'] >= cutoff]
+    if config.get('max_snapshots'):
+        runs = runs[-config['max_snapshots']:]
+    store['runs'] = runs
+    return store
+
+def baseline_signature(baseline_attr, embeddings=None, compact=None):
+    """baseline 교체 감지용 서명 (파일 수, 크기 합, 임베딩 해시)
+
+    임베딩 해시는 build_snapshot에 전달하는 것과 같은 입력으로 계산
+    (compact: 파일 목록 + 코덱 params + 코드, embeddings: 배열 내용) → 임베딩만 재분석/재인코딩된 경우도 감지
+    """
+    import hashlib
+
+    sizes = [v.get('size', 0) for v in baseline_attr.values()]
+    digest = hashlib.md5()
+    if compact is not None:
+        digest.update("\n".join(compact['files']).encode())
+        for key, value in sorted(compact['params'].items()):
+            digest.update(key.encode())
+            digest.update(value.tobytes() if isinstance(value, np.ndarray) else repr(value).encode())
+        digest.update(np.ascontiguousarray(compact['codes']).tobytes())
+    elif embeddings is not None:
+        embeddings = np.ascontiguousarray(embeddings)
+        digest.update(repr(embeddings.shape).encode())
+        digest.update(embeddings.tobytes())
+    return (len(baseline_attr), round(float(sum(sizes)), 6), digest.hexdigest())
+
+def plot_drift_matrix(matrix, out_path, title='Drift Matrix (Reference x Metric)'):
+    """기준 × 메트릭 드리프트 행렬 히트맵 (행: 기준 또는 그룹)"""
+    import matplotlib.pyplot as plt
+
+    columns = [('Size', 'size'), ('Noise', 'noise'), ('Sharpness', 'sharpness'),
+               ('Quality', 'quality'), ('Embedding', 'embedding'), ('Overall', None)]
+    refs = list(matrix.keys())
+    data = np.zeros((len(refs), len(columns)))
+    for i, ref in enumerate(refs):
+        for j, (_, key) in enumerate(columns):
+            if key is None:
+                data[i, j] = matrix[ref]['overall_score']
+            elif key == 'embedding':
+                data[i, j] = matrix[ref].get('embedding', {}).get('mmd', 0)
+            else:
+                data[i, j] = matrix[ref].get(key, {}).get('kl_divergence', 0)
+
+    fig, ax = plt.subplots(figsize=(12, 1.2 * len(refs) + 2))
+    im = ax.imshow(data, cmap='Reds', aspect='auto')
+    ax.set_xticks(range(len(columns)))
+    ax.set_xticklabels([c for c, _ in columns])
+    ax.set_yticks(range(len(refs)))
+    ax.set_yticklabels([f"{r} ({matrix[r]['status']})" for r in refs])
+    for i in range(len(refs)):
+        for j in range(len(columns)):
+            ax.text(j, i, f'{data[i, j]:.3f}', ha='center', va='center', fontsize=10)
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    plt.colorbar(im, ax=ax, label='Drift Score')
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=300, bbox_inches='tight')
+    plt.close()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+CPU 최적화 임베딩 백엔드
+- 배치 처리 (params.yaml의 embedding.batch_size)
+- DataLoader 워커 프로세스에서 디코딩/리사이즈, 메인 프로세스는 모델 추론
+- int8 동적 양자화 또는 ONNX Runtime 추론 (선택)
+- intra/inter-op 스레드 수 설정
+- 이미지 형식만 처리, (크기, 수정시각) 시그니처가 같으면 해시 생략
+- 디코딩 실패는 내용 해시와 함께 기록해 내용이 바뀔 때까지 재시도하지 않음
+
+결과는 ddoc 임베딩 캐시와 동일한 포맷({파일명: {'embedding': [...]}})으로 저장
+"""
+import time
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+from dataset_utils import list_dataset_files
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_NUM_WORKERS = 4
+DEFAULT_ONNX_DIR = ".model_cache"
+
+# cluster_embeddings가 구현한 clustering.method
+CLUSTERING_METHODS = ('kmeans',)
+
+# 디코딩 실패 기록 {파일명: file_hash}
+FAILURE_CACHE = "embedding_failures"
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """PyTorch intra/inter-op 스레드 수 설정 (None이면 기본값 유지)"""
+    import torch
+
+    if intra_op_threads:
+        torch.set_num_threads(int(intra_op_threads))
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(int(inter_op_threads))
+        except RuntimeError:
+            # 병렬 작업이 이미 시작된 프로세스에서는 변경 불가
+            pass
+
+def file_hash(path, chunk_size=1 << 20):
+    """파일 내용 MD5 해시 (ddoc와 동일하게 내용 변경 시 재분석)"""
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_signature(path):
+    """(크기, 수정시각) 시그니처 — 같으면 내용 해시를 생략 (dedup dHash 캐시와 동일 기준)"""
+    stat = Path(path).stat()
+    return (stat.st_size, int(stat.st_mtime))
+
+class ImageFileDataset:
+    """워커 프로세스에서 이미지 디코딩 + CLIP 전처리를 수행하는 Dataset"""
+
+    def __init__(self, paths, preprocess):
+        self.paths = [str(p) for p in paths]
+        self.preprocess = preprocess
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, idx):
+        from PIL import Image
+
+        try:
+            with Image.open(self.paths[idx]) as img:
+                return self.preprocess(img.convert('RGB')), idx
+        except Exception:
+            # 손상/미지원 파일은 배치에서 제외
+            return None, idx
+
+def collate_skip_failed(batch):
+    """디코딩 실패 항목을 제외하고 배치 구성"""
+    import torch
+
+    ok = [(tensor, idx) for tensor, idx in batch if tensor is not None]
+    failed = [idx for tensor, idx in batch if tensor is None]
+    if not ok:
+        return None, [], failed
+    tensors, indices = zip(*ok)
+    return torch.stack(tensors), list(indices), failed
+
+class EmbeddingEncoder:
+    """CLIP 이미지 인코더 (torch fp32 / torch int8 / ONNX Runtime)
+
+    Args:
+        model_name: CLIP 모델 이름 (예: "ViT-B/16")
+        runtime: "torch" 또는 "onnx"
+        quantize: "none" 또는 "int8"
+        intra_op_threads / inter_op_threads: 스레드 수 (None이면 기본값)
+        onnx_dir: ONNX 모델 export 경로
+    """
+
+    def __init__(self, model_name="ViT-B/16", runtime="torch", quantize="none",
+                 intra_op_threads=None, inter_op_threads=None, onnx_dir=DEFAULT_ONNX_DIR):
+        import torch
+        import clip
+
+        configure_threads(intra_op_threads, inter_op_threads)
+
+        model, self.preprocess = clip.load(model_name, device="cpu", jit=False)
+        model.eval()
+        self.visual = model.visual.float()
+        self.runtime = runtime
+        self.quantize = quantize or "none"
+
+        if runtime == "onnx":
+            self.session = self._load_onnx_session(
+                model_name, onnx_dir, intra_op_threads, inter_op_threads
+            )
+        elif self.quantize == "int8":
+            self.visual = torch.ao.quantization.quantize_dynamic(
+                self.visual, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+    def _load_onnx_session(self, model_name, onnx_dir, intra_op_threads, inter_op_threads):
+        """비주얼 인코더를 ONNX로 export (최초 1회) 후 InferenceSession 생성"""
+        import torch
+        import onnxruntime as ort
+
+        onnx_dir = Path(onnx_dir)
+        onnx_dir.mkdir(parents=True, exist_ok=True)
+        stem = model_name.replace('/', '_').replace('@', '_')
+        onnx_path = onnx_dir / f"{stem}_visual.onnx"
+
+        if not onnx_path.exists():
+            resolution = self.visual.input_resolution
+            dummy = torch.randn(1, 3, resolution, resolution)
+            torch.onnx.export(
+                self.visual, dummy, str(onnx_path),
+                input_names=['pixel_values'], output_names=['embedding'],
+                dynamic_axes={'pixel_values': {0: 'batch'}, 'embedding': {0: 'batch'}},
+                opset_version=17
+            )
+
+        if self.quantize == "int8":
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+
+            int8_path = onnx_dir / f"{stem}_visual_int8.onnx"
+            if not int8_path.exists():
+                quantize_dynamic(str(onnx_path), str(int8_path), weight_type=QuantType.QInt8)
+            onnx_path = int8_path
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = int(intra_op_threads)
+        if inter_op_threads:
+            options.inter_op_num_threads = int(inter_op_threads)
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        return ort.InferenceSession(str(onnx_path), options, providers=['CPUExecutionProvider'])
+
+    def encode(self, pixel_values):
+        """전처리된 배치 텐서 → float32 임베딩 배열 (N, D)"""
+        if self.runtime == "onnx":
+            return self.session.run(None, {'pixel_values': pixel_values.numpy()})[0].astype(np.float32)
+
+        import torch
+
+        with torch.inference_mode():
+            return self.visual(pixel_values).float().numpy()
+
+def embed_files(paths, encoder, batch_size=DEFAULT_BATCH_SIZE, num_workers=DEFAULT_NUM_WORKERS,
+                on_batch=None):
+    """파일 목록 임베딩 (워커 프로세스 디코딩과 모델 추론을 파이프라인으로 병행)
+
+    Args:
+        on_batch: 배치마다 {경로: np.ndarray}로 호출 (저널 기록 등)
+
+    Returns:
+        (embeddings, failed): {경로: np.ndarray}, 실패한 경로 리스트
+    """
+    from torch.utils.data import DataLoader
+
+    paths = [str(p) for p in paths]
+    if not paths:
+        return {}, []
+
+    dataset = ImageFileDataset(paths, encoder.preprocess)
+    loader_kwargs = {}
+    if num_workers > 0:
+        loader_kwargs = {'prefetch_factor': 2, 'persistent_workers': False}
+    loader = DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=num_workers,
+        collate_fn=collate_skip_failed,
+        **loader_kwargs
+    )
+
+    embeddings = {}
+    failed = []
+    for pixel_values, indices, failed_indices in loader:
+        failed.extend(paths[i] for i in failed_indices)
+        if pixel_values is None:
+            continue
+        vectors = encoder.encode(pixel_values)
+        batch = {paths[i]: vec for i, vec in zip(indices, vectors)}
+        embeddings.update(batch)
+        if on_batch is not None:
+            on_batch(batch)
+    return embeddings, failed
+
+def build_encoder(emb_params):
+    """params.yaml embedding 섹션으로 EmbeddingEncoder 생성"""
+    return EmbeddingEncoder(
+        model_name=emb_params.get('model', "ViT-B/16"),
+        runtime=emb_params.get('runtime', 'torch'),
+        quantize=emb_params.get('quantize', 'none'),
+        intra_op_threads=emb_params.get('intra_op_threads'),
+        inter_op_threads=emb_params.get('inter_op_threads'),
+        onnx_dir=emb_params.get('onnx_dir', DEFAULT_ONNX_DIR)
+    )
+
+def check_clustering_method(clustering_params):
+    """cluster_embeddings가 지원하지 않는 clustering.method면 ValueError (다른 알고리즘으로 대체하지 않음)"""
+    method = clustering_params.get('method', 'kmeans')
+    if method not in CLUSTERING_METHODS:
+        raise ValueError(f"지원하지 않는 clustering.method: {method} "
+                         f"(cpu 백엔드/증분 클러스터링 지원: {', '.join(CLUSTERING_METHODS)}, "
+                         f"그 외는 backend: ddoc, clustering.incremental: false 사용)")
+
+def cluster_embeddings(emb_cache, clustering_params):
+    """임베딩 캐시 전체 클러스터링 (ddoc clustering_analysis 캐시와 동일 스키마)
+
+    n_clusters가 null이면 n_clusters_range 범위에서 silhouette 최대값 선택
+    """
+    from sklearn.cluster import KMeans
+    from sklearn.decomposition import PCA
+    from sklearn.metrics import silhouette_score
+
+    check_clustering_method(clustering_params)
+    files = [f for f, v in emb_cache.items() if 'embedding' in v]
+    if len(files) < 3:
+        return None
+    X = np.asarray([emb_cache[f]['embedding'] for f in files], dtype=np.float32)
+
+    n_clusters = clustering_params.get('n_clusters')
+    if not n_clusters:
+        k_min, k_max = clustering_params.get('n_clusters_range', [2, 10])
+        best_score = -1.0
+        for k in range(k_min, min(k_max, len(X) - 1) + 1):
+            labels = KMeans(n_clusters=k, n_init=10, random_state=42).fit_predict(X)
+            score = silhouette_score(X, labels)
+            if score > best_score:
+                best_score, n_clusters = score, k
+        n_clusters = n_clusters or k_min
+
+    kmeans = KMeans(n_clusters=n_clusters, n_init=10, random_state=42).fit(X)
+    emb_2d = PCA(n_components=2).fit_transform(X)
+
+    return {
+        'n_clusters': int(n_clusters),
+        'cluster_labels': kmeans.labels_.tolist(),
+        'embeddings_2d': emb_2d.tolist(),
+        'centroids': kmeans.cluster_centers_.tolist(),
+        'files': files
+    }
+
+def run_cpu_embedding_analysis(data_dir, formats, emb_params, clustering_params):
+    """CPU 백엔드로 임베딩 캐시 증분 갱신 + 클러스터링
+
+    run_embedding_analysis와 동일한 형태의 통계를 반환
+    """
+    from cache_utils import get_cached_analysis_data
+    from cache_io import CacheJournal, load_cache, merge_cache, save_cache
+    from dedup import IMAGE_FORMATS
+
+    data_dir = Path(data_dir)
+    incremental = clustering_params.get('incremental', False)
+    # 임베딩을 모두 계산한 뒤 실패하지 않도록 미리 확인 (증분 모드도 kmeans만 지원)
+    check_clustering_method(clustering_params)
+
+    # 이전 실행이 중단됐으면 저널의 임베딩까지 복구 (해시가 같으면 재계산하지 않음)
+    emb_cache = load_cache(data_dir, "embedding_analysis") or {}
+    failures = load_cache(data_dir, FAILURE_CACHE) or {}
+    actual_files = list_dataset_files(data_dir, formats)
+    # pdf/docx 등은 이미지 디코딩이 불가능하므로 해시/디코딩 대상에서 제외
+    images = {f: p for f, p in actual_files.items() if p.suffix.lower() in IMAGE_FORMATS}
+
+    # 해시가 바뀐 파일과 신규 파일만 임베딩 (시그니처가 같으면 해시 생략)
+    to_embed = {}
+    hashes = {}
+    signatures = {}
+    refreshed = {}
+    known_failed = 0
+    for fname, path in images.items():
+        signatures[fname] = file_signature(path)
+        cached = emb_cache.get(fname)
+        embedded = bool(cached) and 'embedding' in cached
+        if embedded and cached.get('signature') == signatures[fname]:
+            continue
+        hashes[fname] = file_hash(path)
+        if embedded and cached.get('file_hash', hashes[fname]) == hashes[fname]:
+            # 내용은 같고 시그니처만 다름 (touch, 복사 등) → 다음 실행부터 해시 생략
+            refreshed[fname] = {**cached, 'file_hash': hashes[fname], 'signature': signatures[fname]}
+            continue
+        if failures.get(fname) == hashes[fname]:
+            # 이전 실행에서 디코딩 실패한 내용 그대로
+            known_failed += 1
+            continue
+        to_embed[fname] = path
+
+    elapsed = 0.0
+    failed = []
+    new_entries = dict(refreshed)
+    path_to_name = {str(p): f for f, p in to_embed.items()}
+    if known_failed:
+        print(f"   이전에 디코딩 실패한 파일 {known_failed}개 건너뜀 (내용이 바뀌면 재시도)")
+    if to_embed:
+        print(f"   CPU 백엔드 임베딩: {len(to_embed)}개 "
+              f"(batch_size={emb_params.get('batch_size', DEFAULT_BATCH_SIZE)}, "
+              f"runtime={emb_params.get('runtime', 'torch')}, "
+              f"quantize={emb_params.get('quantize', 'none')})")
+        encoder = build_encoder(emb_params)
+        journal = CacheJournal(data_dir, "embedding_analysis")
+
+        def record_batch(batch):
+            entries = {}
+            for path, vec in batch.items():
+                fname = path_to_name[path]
+                entries[fname] = {'embedding': vec.tolist(), 'file_hash': hashes[fname],
+                                  'signature': signatures[fname]}
+            journal.set(entries)
+            new_entries.update(entries)
+
+        start = time.perf_counter()
+        _, failed = embed_files(
+            to_embed.values(),
+            encoder,
+            batch_size=emb_params.get('batch_size', DEFAULT_BATCH_SIZE),
+            num_workers=emb_params.get('num_workers', DEFAULT_NUM_WORKERS),
+            on_batch=record_batch
+        )
+        elapsed = time.perf_counter() - start
+
+    if new_entries:
+        # 동시 실행이 저장한 항목을 덮어쓰지 않도록 최신 캐시에 병합
+        emb_cache = merge_cache(data_dir, "embedding_analysis", new_entries)
+
+    # 실패 기록 갱신: 이번 실패 추가, 성공/삭제된 파일 제거
+    updated_failures = {f: h for f, h in failures.items() if f in images and f not in new_entries}
+    updated_failures.update({path_to_name[p]: hashes[path_to_name[p]] for p in failed})
+    if updated_failures != failures:
+        save_cache(data_dir, updated_failures, FAILURE_CACHE)
+
+    processed = len(to_embed) - len(failed)
+    # 증분 클러스터링 모드는 analyze_with_ddoc Step 3에서 처리
+    if not incremental and (processed > 0 or not get_cached_analysis_data(data_dir, "clustering_analysis")):
+        clustering = cluster_embeddings(emb_cache, clustering_params)
+        if clustering:
+            save_cache(data_dir, clustering, "clustering_analysis")
+
+    return {
+        str(data_dir): {
+            'processed_files': processed,
+            'skipped_files': len(actual_files) - len(to_embed),
+            'failed_files': len(failed),
+            'known_failed_files': known_failed,
+            'images_per_second': processed / elapsed if elapsed > 0 else 0.0
+        }
+    }
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+압축 임베딩 인코딩 (float16 / int8 스칼라 양자화 / Product Quantization)
+ddoc 임베딩 캐시(파일당 512-float 리스트)를 보조하는 compact 캐시로 저장하고,
+드리프트 메트릭은 압축 형태에서 직접 또는 블록 단위 역양자화로 계산
+"""
+import hashlib
+
+import numpy as np
+
+from drift_metrics import DEFAULT_BLOCK_SIZE
+
+CODECS = ('float16', 'int8', 'pq')
+
+# compact 캐시 키 (ddoc cache_utils로 저장)
+COMPACT_CACHE = "embedding_compact"
+COMPACT_BASELINE_CACHE = "embedding_compact_baseline"
+
+# int8 코드 범위 여유 (학습 데이터 범위 폭 대비 양쪽 비율)
+# scale/offset은 baseline으로 고정되므로 여유가 없으면 범위 밖으로 이동한 current 임베딩이 포화돼 드리프트가 축소됨
+INT8_HEADROOM = 0.5
+
+def fit_codec(X, codec, pq_subspaces=64, pq_bits=8, pq_train_size=20000, seed=42,
+              int8_headroom=INT8_HEADROOM):
+    """코덱 파라미터 학습 (int8: 차원별 scale/offset, pq: 부분공간별 codebook)"""
+    X = np.asarray(X, dtype=np.float32)
+    params = {'codec': codec, 'dim': int(X.shape[1])}
+
+    if codec == 'int8':
+        lo = X.min(axis=0)
+        hi = X.max(axis=0)
+        margin = (hi - lo) * int8_headroom
+        lo, hi = lo - margin, hi + margin
+        params['offset'] = lo.astype(np.float32)
+        params['scale'] = np.maximum((hi - lo) / 255.0, 1e-12).astype(np.float32)
+
+    elif codec == 'pq':
+        from sklearn.cluster import KMeans
+
+        dim = X.shape[1]
+        if dim % pq_subspaces != 0:
+            raise ValueError(f"임베딩 차원({dim})이 pq_subspaces({pq_subspaces})로 나누어지지 않습니다.")
+        rng = np.random.default_rng(seed)
+        if len(X) > pq_train_size:
+            X = X[rng.choice(len(X), pq_train_size, replace=False)]
+        n_centroids = min(2 ** pq_bits, len(X))
+        sub_dim = dim // pq_subspaces
+        codebooks = np.zeros((pq_subspaces, n_centroids, sub_dim), dtype=np.float32)
+        for m in range(pq_subspaces):
+            sub = X[:, m * sub_dim:(m + 1) * sub_dim]
+            km = KMeans(n_clusters=n_centroids, n_init=1, random_state=seed).fit(sub)
+            codebooks[m] = km.cluster_centers_
+        params['codebooks'] = codebooks
+
+    elif codec != 'float16':
+        raise ValueError(f"지원하지 않는 코덱: {codec} (지원: {CODECS})")
+
+    return params
+
+def encode(X, params, block_size=DEFAULT_BLOCK_SIZE):
+    """float 임베딩 → 코드 배열 (학습된 코덱 파라미터 사용)"""
+    X = np.asarray(X, dtype=np.float32)
+    codec = params['codec']
+
+    if codec == 'float16':
+        return X.astype(np.float16)
+
+    if codec == 'int8':
+        codes = np.rint((X - params['offset']) / params['scale'])
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    # pq: 부분공간별 최근접 centroid (블록 단위 거리 계산)
+    codebooks = params['codebooks']
+    n_sub, _, sub_dim = codebooks.shape
+    codes = np.empty((len(X), n_sub), dtype=np.uint8)
+    cb_sqnorms = (codebooks ** 2).sum(axis=2)
+    for start in range(0, len(X), block_size):
+        block = X[start:start + block_size]
+        for m in range(n_sub):
+            sub = block[:, m * sub_dim:(m + 1) * sub_dim]
+            dist = cb_sqnorms[m][None, :] - 2 * sub @ codebooks[m].T
+            codes[start:start + len(block), m] = dist.argmin(axis=1)
+    return codes
+
+def clipped_dims(X, params):
+    """행별로 코드 범위를 벗어나 포화되는 차원 수 (int8 외 코덱은 0)"""
+    X = np.asarray(X, dtype=np.float32)
+    if params['codec'] != 'int8':
+        return np.zeros(len(X), dtype=np.uint16)
+    codes = np.rint((X - params['offset']) / params['scale'])
+    return ((codes < 0) | (codes > 255)).sum(axis=1).astype(np.uint16)
+
+def clip_rate(compact):
+    """int8 포화 원소 비율 (인코딩 시 기록한 clipped 기준)"""
+    clipped = compact.get('clipped')
+    if clipped is None or len(clipped) == 0:
+        return 0.0
+    return float(clipped.sum(dtype=np.int64) / (len(clipped) * compact['params']['dim']))
+
+def decode(codes, params):
+    """코드 배열 → float32 임베딩"""
+    codec = params['codec']
+    if codec == 'float16':
+        return codes.astype(np.float32)
+    if codec == 'int8':
+        return codes.astype(np.float32) * params['scale'] + params['offset']
+
+    codebooks = params['codebooks']
+    n_sub = codebooks.shape[0]
+    return np.concatenate([codebooks[m][codes[:, m]] for m in range(n_sub)], axis=1)
+
+def decode_blocks(compact, block_size=DEFAULT_BLOCK_SIZE):
+    """compact 캐시를 블록 단위로 역양자화 (전체 float 배열을 만들지 않음)"""
+    codes = compact['codes']
+    for start in range(0, len(codes), block_size):
+        yield decode(codes[start:start + block_size], compact['params'])
+
+def decode_sample(compact, max_rows, seed=42):
+    """시각화용 무작위 샘플만 역양자화"""
+    codes = compact['codes']
+    if len(codes) > max_rows:
+        idx = np.sort(np.random.default_rng(seed).choice(len(codes), max_rows, replace=False))
+        codes = codes[idx]
+    return decode(codes, compact['params'])
+
+def compressed_mean(compact):
+    """압축 형태에서 직접 평균 계산
+
+    int8/float16은 선형 변환이므로 코드 평균에서, pq는 부분공간별 코드 빈도로 계산
+    """
+    codes = compact['codes']
+    params = compact['params']
+    codec = params['codec']
+
+    if codec == 'float16':
+        return codes.mean(axis=0, dtype=np.float64)
+    if codec == 'int8':
+        return codes.mean(axis=0, dtype=np.float64) * params['scale'] + params['offset']
+
+    codebooks = params['codebooks']
+    n_sub, n_centroids, _ = codebooks.shape
+    parts = []
+    for m in range(n_sub):
+        counts = np.bincount(codes[:, m], minlength=n_centroids)
+        parts.append(counts @ codebooks[m] / len(codes))
+    return np.concatenate(parts)
+
+def compressed_variance(compact, block_size=DEFAULT_BLOCK_SIZE):
+    """전체 원소 분산 (np.var(embeddings)와 동일) — 블록 단위 합/제곱합 누적"""
+    total = 0.0
+    total_sq = 0.0
+    count = 0
+    for block in decode_blocks(compact, block_size):
+        block = block.astype(np.float64)
+        total += block.sum()
+        total_sq += (block ** 2).sum()
+        count += block.size
+    if count == 0:
+        return 0.0
+    mean = total / count
+    return float(total_sq / count - mean ** 2)
+
+def entry_key(entry):
+    """임베딩 항목 변경 감지 키 (file_hash, 없으면 임베딩 값 해시)"""
+    if 'file_hash' in entry:
+        return str(entry['file_hash'])
+    return hashlib.md5(np.asarray(entry['embedding'], dtype=np.float32).tobytes()).hexdigest()
+
+def build_compact(files, X, params, keys=None):
+    """compact 캐시 구조 생성 (keys: 파일별 entry_key, 증분 갱신용)"""
+    compact = {'files': list(files), 'codes': encode(X, params), 'params': params,
+               'clipped': clipped_dims(X, params)}
+    if keys is not None:
+        compact['keys'] = list(keys)
+    return compact
+
+def update_compact(compact, emb_cache, codec, pq_subspaces=64, int8_headroom=INT8_HEADROOM):
+    """ddoc 임베딩 캐시로 compact 캐시 갱신
+
+    코덱 파라미터(scale, codebook)는 최초 학습값을 재사용해 baseline과 코드 공간을 유지하고,
+    신규/내용이 바뀐 파일만 인코딩해 추가 (전체 float32 행렬을 만들지 않음)
+    """
+    files = [f for f, v in emb_cache.items() if 'embedding' in v]
+    if not files:
+        return None
+
+    dim = len(emb_cache[files[0]]['embedding'])
+    keys = {f: entry_key(emb_cache[f]) for f in files}
+    same_codec = compact and compact['params']['codec'] == codec and compact['params']['dim'] == dim
+
+    if not (same_codec and 'keys' in compact):
+        # 최초 생성 / 코덱 변경 / 변경 감지 키가 없는 이전 형식: 전체 인코딩
+        X = np.asarray([emb_cache[f]['embedding'] for f in files], dtype=np.float32)
+        params = compact['params'] if same_codec else fit_codec(
+            X, codec, pq_subspaces=pq_subspaces, int8_headroom=int8_headroom
+        )
+        return build_compact(files, X, params, [keys[f] for f in files])
+
+    keep = [i for i, (f, k) in enumerate(zip(compact['files'], compact['keys'])) if keys.get(f) == k]
+    if len(keep) == len(compact['files']) == len(files):
+        return compact
+
+    kept = {compact['files'][i] for i in keep}
+    added = [f for f in files if f not in kept]
+    X_new = np.asarray([emb_cache[f]['embedding'] for f in added], dtype=np.float32).reshape(-1, dim)
+    params = compact['params']
+    return {
+        'files': [compact['files'][i] for i in keep] + added,
+        'codes': np.concatenate([compact['codes'][keep], encode(X_new, params)]),
+        'params': params,
+        'clipped': np.concatenate([compact['clipped'][keep], clipped_dims(X_new, params)]),
+        'keys': [compact['keys'][i] for i in keep] + [keys[f] for f in added]
+    }
+
+def filter_compact(compact, exclude):
+    """지정한 파일을 제외한 compact 캐시 (중복 제외 등)"""
+    keep = [i for i, f in enumerate(compact['files']) if f not in exclude]
+    filtered = {
+        'files': [compact['files'][i] for i in keep],
+        'codes': compact['codes'][keep],
+        'params': compact['params']
+    }
+    for key in ('clipped', 'keys'):
+        if key in compact:
+            filtered[key] = (compact[key][keep] if isinstance(compact[key], np.ndarray)
+                             else [compact[key][i] for i in keep])
+    return filtered
+
+def compact_nbytes(compact):
+    """임베딩 1개당 저장 바이트 수"""
+    n = max(len(compact['files']), 1)
+    return compact['codes'].nbytes / n
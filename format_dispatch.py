@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+형식별 분석 디스패처 (이미지/문서 혼합 데이터셋)
+ddoc 분석 함수(run_attribute_analysis_wrapper / run_embedding_analysis)를 형식별 풀로 분배해
+느린 다중 페이지 PDF 하나가 전체 데이터셋 분석을 막지 않도록
+
+- 풀: params.yaml dispatch.pools (형식 목록, 동시 실행 수, 청크 크기, 파일당 timeout)
+  풀끼리는 동시에 실행, 풀마다 workers개 상주 자식 프로세스 (ddoc import/모델 로드는 프로세스당 한 번)
+  청크 하나 = staging 디렉토리 하나 = 상주 프로세스에 보내는 작업 하나
+- timeout: 작업(청크)별 시간 제한(file_timeout × 파일 수) 초과 시 해당 프로세스만 종료 후 다음 작업에서 새로 시작,
+  미완료 파일은 단일 파일 청크로 한 번 재시도 후 실패 처리 (다음 실행에서 다시 시도)
+- 시작 방식: 기본 spawn (스레드를 가진 부모에서 fork하면 잠금 상태가 복사되어 교착 가능)
+- PDF: 풀 설정 max_pages를 지정한 경우에만(opt-in) pypdf로 앞 max_pages 페이지 PDF를 staging
+  잘린 사본으로 분석한 항목은 size를 원본 파일 크기 기준으로 환산하고 truncated_pages/pages를 기록,
+  metrics.json 형식별 통계에 max_pages와 잘린 파일 목록(truncated_files) 기록
+  (ddoc는 파일 경로 단위로 분석하므로 페이지 단위 지연 로딩은 불가 → 앞부분만 분석하는 근사)
+- 결과: 청크마다 저널에 기록 후 마지막에 데이터셋 캐시로 병합 (중단돼도 완료 청크 유지)
+- 형식별 처리량(워커 기준 files/s)/실패/timeout 수는 metrics.json의 attribute_formats / embedding_formats
+
+분석 대상은 캐시에 없는 파일과 file_hash가 바뀐 파일 (max_pages 설정이 바뀐 잘린 PDF 포함)
+(크기, 수정시각) signature가 캐시와 같으면 해시 생략 (dedup dHash 캐시와 동일 기준)
+디스패치로 분석한 항목에는 file_hash/signature를 기록하고, 해시가 없는 기존 캐시 항목(ddoc 분석분)은
+현재 내용의 해시를 기록해 다음 실행부터 내용 변경을 감지
+"""
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+from dataset_utils import list_dataset_files, staged_files
+
+CACHE_KEYS = {'attribute': "attribute_analysis", 'embedding': "embedding_analysis"}
+
+DEFAULT_POOLS = {
+    'image': {'formats': ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp'],
+              'workers': 4, 'chunk_size': 64, 'file_timeout': 10},
+    'pdf': {'formats': ['.pdf'], 'workers': 2, 'chunk_size': 1, 'file_timeout': 120, 'max_pages': None},
+    'document': {'formats': ['.docx', '.hwp'], 'workers': 2, 'chunk_size': 1, 'file_timeout': 60}
+}
+
+# 어떤 풀에도 속하지 않는 형식
+FALLBACK_POOL = 'other'
+FALLBACK_CONFIG = {'workers': 1, 'chunk_size': 16, 'file_timeout': 60}
+
+DEFAULT_START_METHOD = 'spawn'
+
+def load_pools(dispatch_params):
+    """dispatch 섹션 → {풀 이름: 설정} (풀별 설정은 기본값에 병합)"""
+    pools = {}
+    for name, config in {**DEFAULT_POOLS, **(dispatch_params.get('pools') or {})}.items():
+        pools[name] = {**FALLBACK_CONFIG, **DEFAULT_POOLS.get(name, {}), **(config or {})}
+        pools[name]['formats'] = [f.lower() for f in pools[name].get('formats', [])]
+    return pools
+
+def pool_of(path, pools):
+    suffix = Path(path).suffix.lower()
+    return next((name for name, config in pools.items() if suffix in config['formats']), FALLBACK_POOL)
+
+def truncate_pdf(src, dst, max_pages):
+    """앞 max_pages 페이지만 담은 PDF 작성 (pypdf는 접근한 페이지만 파싱)
+
+    Returns:
+        원본 페이지 수 (pypdf 미설치 또는 읽기 실패 시 None → 호출 측에서 원본 사용)
+    """
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        return None
+    try:
+        reader = PdfReader(str(src))
+        writer = PdfWriter()
+        for index in range(min(max_pages, len(reader.pages))):
+            writer.add_page(reader.pages[index])
+        with open(dst, 'wb') as f:
+            writer.write(f)
+        return len(reader.pages)
+    except Exception:
+        return None
+
+def _worker_loop(conn, task, formats, emb_kwargs):
+    """상주 자식 프로세스: staging 디렉토리를 받아 ddoc로 분석 (결과는 staging 캐시에 저장됨)
+
+    메시지: (staging 디렉토리, 파일 수) → 응답 None(완료) 또는 오류 문자열, None 수신 시 종료
+    """
+    from main import run_attribute_analysis_wrapper, run_embedding_analysis
+    from ddoc_subset import no_clustering_kwargs
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        stage_dir, num_files = message
+        try:
+            if task == 'attribute':
+                run_attribute_analysis_wrapper([stage_dir], formats)
+            else:
+                # 청크 클러스터링은 생략 (데이터셋 클러스터링은 디스패치 후 전체 캐시로 갱신)
+                run_embedding_analysis([stage_dir], formats, **emb_kwargs,
+                                       **no_clustering_kwargs(run_embedding_analysis, num_files))
+            conn.send(None)
+        except Exception as e:
+            conn.send(f"{type(e).__name__}: {e}")
+
+class ChunkWorker:
+    """풀 전용 상주 자식 프로세스 (작업 하나씩 처리, timeout 시 이 프로세스만 종료)"""
+
+    def __init__(self, mp_context, task, formats, emb_kwargs):
+        self.conn, child_conn = mp_context.Pipe()
+        self.proc = mp_context.Process(target=_worker_loop, args=(child_conn, task, formats, emb_kwargs),
+                                       daemon=True)
+        self.proc.start()
+        child_conn.close()
+
+    def run(self, stage_dir, num_files, timeout):
+        """작업 하나 실행
+
+        Returns:
+            (완료 여부, timed_out)
+        """
+        try:
+            self.conn.send((str(stage_dir), num_files))
+            if not self.conn.poll(timeout):
+                return False, True
+            error = self.conn.recv()
+        except (EOFError, OSError):
+            # 자식 프로세스 비정상 종료
+            return False, False
+        if error:
+            print(f"   ⚠️  청크 분석 실패 ({Path(stage_dir).name}): {error}")
+        return error is None, False
+
+    def alive(self):
+        return self.proc.is_alive()
+
+    def close(self, timeout=5):
+        if self.proc.is_alive():
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.proc.join(timeout)
+        if self.proc.is_alive():
+            self.proc.terminate()
+            self.proc.join(timeout)
+            if self.proc.is_alive():
+                self.proc.kill()
+                self.proc.join()
+        self.conn.close()
+
+class WorkerSlots:
+    """스레드별 상주 프로세스 (풀 스레드 하나 = 프로세스 하나, 종료/timeout 시 다음 작업에서 재생성)"""
+
+    def __init__(self, mp_context, task, formats, emb_kwargs):
+        self.args = (mp_context, task, formats, emb_kwargs)
+        self.local = threading.local()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        worker = getattr(self.local, 'worker', None)
+        if worker is None or not worker.alive():
+            if worker is not None:
+                worker.close()
+            worker = self.local.worker = ChunkWorker(*self.args)
+            with self.lock:
+                self.workers.append(worker)
+        return worker
+
+    def discard(self):
+        """현재 스레드의 프로세스 종료 (timeout된 작업을 중단)"""
+        worker = getattr(self.local, 'worker', None)
+        if worker is not None:
+            worker.close(timeout=0)
+            self.local.worker = None
+
+    def close(self):
+        with self.lock:
+            for worker in self.workers:
+                worker.close()
+            self.workers = []
+
+def _analyze_chunk(task, paths, pool_config, slots):
+    """청크 하나를 시간 제한 하에 현재 스레드의 상주 프로세스로 분석
+
+    Returns:
+        ({파일명: 캐시 항목}, timed_out, 잘린 PDF 파일명 리스트, 소요 초)
+    """
+    from cache_utils import get_cached_analysis_data
+
+    # 잘린 사본으로 분석한 파일 {파일명: (원본 페이지 수, 원본 바이트, 사본 바이트)}
+    truncated = {}
+    with staged_files(paths, prefix=f'ddoc_{task}_') as stage_dir:
+        max_pages = pool_config.get('max_pages')
+        if max_pages:
+            for path in paths:
+                if Path(path).suffix.lower() != '.pdf':
+                    continue
+                link = stage_dir / Path(path).name
+                tmp = stage_dir / f".{link.name}.tmp"
+                pages = truncate_pdf(path, tmp, max_pages)
+                if pages is not None and pages > max_pages:
+                    truncated[link.name] = (pages, Path(path).stat().st_size, tmp.stat().st_size)
+                    tmp.replace(link)
+                else:
+                    # 페이지가 max_pages 이하이거나 읽기 실패 → 원본 그대로
+                    tmp.unlink(missing_ok=True)
+
+        start = time.perf_counter()
+        _, timed_out = slots.get().run(stage_dir, len(paths), pool_config['file_timeout'] * len(paths))
+        if timed_out:
+            slots.discard()
+        elapsed = time.perf_counter() - start
+
+        # 실패/timeout이어도 staging 캐시에 저장된 항목은 사용
+        # (종료된 프로세스가 쓰다 만 캐시는 읽기 실패 → 청크 전체를 실패로 처리)
+        try:
+            staged = get_cached_analysis_data(stage_dir, CACHE_KEYS[task]) or {}
+        except Exception as e:
+            print(f"   ⚠️  staging 캐시 읽기 실패 ({len(paths)}개 파일): {type(e).__name__}: {e}")
+            staged = {}
+        names = {Path(p).name for p in paths}
+        entries = {k: v for k, v in staged.items() if k in names}
+
+    for name, (pages, original_bytes, staged_bytes) in truncated.items():
+        entry = entries.get(name)
+        if entry is None:
+            continue
+        entry = entries[name] = dict(entry)
+        # ddoc 크기 단위와 무관하게 사본 대비 원본 바이트 비율로 환산 (크기 드리프트는 원본 기준)
+        if 'size' in entry and staged_bytes > 0:
+            entry['size'] = entry['size'] * original_bytes / staged_bytes
+        entry['truncated_pages'] = pool_config['max_pages']
+        entry['pages'] = pages
+    return entries, timed_out, [name for name in truncated if name in entries], elapsed
+
+def pending_files(data_dir, formats, cache, pools=None):
+    """분석 대상과 현재 파일 해시/시그니처
+
+    signature(크기, 수정시각)가 캐시 항목과 같으면 해시하지 않음
+
+    Returns:
+        (분석 대상 {파일명: 경로}, 해시한 파일 {파일명: (file_hash, signature)},
+         갱신할 기존 항목 {파일명: {'file_hash', 'signature'}} — 내용은 같고 해시/시그니처만 기록),
+         전체 파일 수
+    """
+    from embedding_backend import file_hash, file_signature
+
+    pools = pools if pools is not None else load_pools({})
+    actual = list_dataset_files(data_dir, formats)
+    pending, hashes, backfill = {}, {}, {}
+    for name, path in actual.items():
+        signature = file_signature(path)
+        entry = cache.get(name)
+        if isinstance(entry, dict) and 'truncated_pages' in entry and \
+                entry['truncated_pages'] != pools.get(pool_of(path, pools), {}).get('max_pages'):
+            # 잘린 사본으로 분석했는데 max_pages 설정이 바뀜 → 재분석
+            pending[name] = path
+        elif isinstance(entry, dict) and 'file_hash' in entry and entry.get('signature') == signature:
+            continue
+        digest = file_hash(path)
+        hashes[name] = (digest, signature)
+        if name in pending:
+            continue
+        if not isinstance(entry, dict):
+            pending[name] = path
+        elif entry.get('file_hash', digest) != digest:
+            pending[name] = path
+        else:
+            backfill[name] = {'file_hash': digest, 'signature': signature}
+    return pending, hashes, backfill, len(actual)
+
+def dispatch_analysis(data_dir, formats, task, params, emb_kwargs=None):
+    """형식별 풀로 ddoc 분석 후 데이터셋 캐시에 병합
+
+    Args:
+        task: "attribute" | "embedding"
+        emb_kwargs: run_embedding_analysis 인자 (model, device 등)
+
+    Returns:
+        ddoc 분석 함수와 같은 형태의 통계 {data_dir: {'processed_files', 'skipped_files',
+        'failed_files', 'formats': {확장자: {...}}}}
+    """
+    from cache_io import CacheJournal, load_cache, merge_cache
+
+    data_dir = Path(data_dir)
+    dispatch_params = params.get('dispatch') or {}
+    pools = load_pools(dispatch_params)
+    mp_context = multiprocessing.get_context(dispatch_params.get('start_method') or DEFAULT_START_METHOD)
+    key = CACHE_KEYS[task]
+
+    cache = load_cache(data_dir, key) or {}
+    pending, hashes, backfill, num_files = pending_files(data_dir, formats, cache, pools)
+
+    by_pool = {}
+    for name, path in sorted(pending.items()):
+        by_pool.setdefault(pool_of(path, pools), []).append(path)
+
+    journal = CacheJournal(data_dir, key)
+    # 해시/시그니처가 없던 기존 항목은 현재 값을 기록 (다음 실행부터 해시 생략/내용 변경 감지)
+    new_entries = {name: {**cache[name], **fields} for name, fields in backfill.items()}
+    format_stats = {}
+
+    def stat(path):
+        suffix = Path(path).suffix.lower()
+        pool_name = pool_of(path, pools)
+        return format_stats.setdefault(suffix, {
+            'pool': pool_name, 'files': 0, 'processed': 0, 'failed': 0,
+            'timeouts': 0, 'truncated_pdfs': 0, 'seconds': 0.0,
+            'max_pages': pools.get(pool_name, FALLBACK_CONFIG).get('max_pages') if suffix == '.pdf' else None,
+            'truncated_files': []
+        })
+
+    # 풀마다 workers개 스레드, 스레드마다 상주 자식 프로세스 하나
+    # 결과 처리(저널/통계)는 데이터셋 잠금을 가진 호출 스레드에서만 수행
+    executors = {
+        name: ThreadPoolExecutor(max_workers=max(1, int(pools.get(name, FALLBACK_CONFIG)['workers'])),
+                                 thread_name_prefix=f'dispatch-{name}')
+        for name in by_pool
+    }
+    slots = {name: WorkerSlots(mp_context, task, formats, emb_kwargs or {}) for name in by_pool}
+    futures = {}
+
+    def submit(pool_name, chunk, retry):
+        config = pools.get(pool_name, FALLBACK_CONFIG)
+        future = executors[pool_name].submit(_analyze_chunk, task, chunk, config, slots[pool_name])
+        futures[future] = (pool_name, chunk, retry)
+
+    if by_pool:
+        print(f"   형식별 디스패치 ({task}): " +
+              ", ".join(f"{name} {len(paths)}개" for name, paths in by_pool.items()))
+    for pool_name, paths in by_pool.items():
+        chunk_size = max(1, int(pools.get(pool_name, FALLBACK_CONFIG)['chunk_size']))
+        for i in range(0, len(paths), chunk_size):
+            submit(pool_name, paths[i:i + chunk_size], True)
+
+    try:
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                pool_name, chunk, retry = futures.pop(future)
+                try:
+                    entries, timed_out, truncated, elapsed = future.result()
+                except Exception as e:
+                    # 청크 하나의 오류로 데이터셋 디스패치 전체가 중단되지 않도록 실패로 집계
+                    print(f"   ⚠️  청크 처리 실패 ({len(chunk)}개 파일): {type(e).__name__}: {e}")
+                    entries, timed_out, truncated, elapsed = {}, False, [], 0.0
+                # 분석 시점(분석 전 계산)의 내용 해시/시그니처 기록 → 분석 중 파일이 바뀌면 다음 실행에서 재분석
+                entries = {name: {**entry, 'file_hash': hashes[name][0], 'signature': hashes[name][1]}
+                           for name, entry in entries.items()}
+                journal.set(entries)
+                new_entries.update(entries)
+
+                missing = [p for p in chunk if Path(p).name not in entries]
+                if timed_out and retry and len(chunk) > 1 and missing:
+                    # 청크 내 느린 파일 하나 때문에 나머지가 실패하지 않도록 개별 재시도
+                    for path in missing:
+                        submit(pool_name, [path], False)
+                    missing = []
+                for path in chunk:
+                    s = stat(path)
+                    s['seconds'] += elapsed / len(chunk)
+                    if Path(path).name in entries:
+                        s['files'] += 1
+                        s['processed'] += 1
+                    elif path in missing:
+                        s['files'] += 1
+                        s['failed'] += 1
+                        s['timeouts'] += int(timed_out)
+                if truncated:
+                    # 앞 max_pages 페이지만 분석한 파일 (metrics.json에 목록 기록)
+                    s = stat(next(p for p in chunk if Path(p).suffix.lower() == '.pdf'))
+                    s['truncated_pdfs'] += len(truncated)
+                    s['truncated_files'].extend(truncated)
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+        for pool_slots in slots.values():
+            pool_slots.close()
+        # 완료된 청크는 오류가 나도 캐시에 반영
+        if new_entries:
+            merge_cache(data_dir, key, new_entries)
+
+    for s in format_stats.values():
+        s['files_per_second'] = s['processed'] / s['seconds'] if s['seconds'] > 0 else 0.0
+    for suffix, s in sorted(format_stats.items()):
+        print(f"   {suffix:<6} [{s['pool']}] {s['processed']}/{s['files']}개, "
+              f"{s['files_per_second']:.2f} files/s, 실패 {s['failed']} (timeout {s['timeouts']})")
+        if s['truncated_pdfs']:
+            print(f"          앞 {s['max_pages']}페이지만 분석: {s['truncated_pdfs']}개 "
+                  f"(size는 원본 기준, 항목에 truncated_pages 기록)")
+
+    failed = sum(s['failed'] for s in format_stats.values())
+    return {
+        str(data_dir): {
+            'processed_files': len(pending) - failed,
+            'skipped_files': num_files - len(pending),
+            'failed_files': failed,
+            'formats': format_stats
+        }
+    }
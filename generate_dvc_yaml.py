@@ -1,97 +1,214 @@
 #!/usr/bin/env python3
 """
 params.yaml의 datasets 설정을 기반으로 dvc.yaml 자동 생성
+
+분석을 단계별 스테이지로 분리해 입력이 바뀐 단계만 재실행
+    attribute → embedding → (dedup) → clustering → plots
+                     └──────────────────────────────→ detect_drift → (artifacts)
+각 스테이지는 필요한 params 섹션만 선언하고, 단계 출력 manifest
+(analysis/<dataset>/stages/<stage>.json)를 deps/outs로 연결
+(ddoc 캐시는 데이터셋 디렉토리 내부에 있어 out으로 직접 선언하지 않음,
+ 드리프트에 필요한 캐시는 artifacts 스테이지가 analysis/<dataset>/artifacts로 내보내 DVC 캐시로 추적)
+데이터셋 deps가 캐시 쓰기로 항상 변경되지 않도록 <dataset>/cache/는 .dvcignore에 등록
+시각화 디렉토리는 stage plots에만 선언 (plots도 out이므로 outs에 중복 선언하면 DVC가 거부)
+
+사용법:
+    python generate_dvc_yaml.py             # 데이터셋별 스테이지 전개
+    python generate_dvc_yaml.py --foreach   # foreach 템플릿 (데이터셋이 많을 때)
 """
+import argparse
 import yaml
 from pathlib import Path
 
-def generate_dvc_yaml():
+TIMELINE_PLOT = {'x': 'timestamp', 'y': 'overall_score'}
+DVCIGNORE = '.dvcignore'
+# 기본 위치(datasets/<name>)의 캐시 디렉토리 — 그 외 경로는 데이터셋별로 추가
+DATASET_CACHE_IGNORE = 'datasets/*/cache/'
+
+class NoAliasDumper(yaml.SafeDumper):
+    """foreach 항목 dict를 여러 스테이지가 공유해도 YAML anchor 없이 출력"""
+    def ignore_aliases(self, data):
+        return True
+
+def stage_templates(name, path, out, index, dedup_config, artifacts_enabled=False):
+    """데이터셋 하나의 단계별 스테이지 정의 {스테이지 종류: 정의}
+
+    Args:
+        name: params.yaml datasets[].name (CLI 인자)
+        path: 데이터셋 경로
+        out: 분석 결과 디렉토리 (analysis/<dataset>)
+        index: params.yaml datasets 목록 내 위치 (데이터셋별 params 키 datasets.<index>.formats)
+        dedup_config: params.yaml dedup 섹션
+    """
+    manifest = lambda stage: f'{out}/stages/{stage}.json'
+    stage_out = lambda stage: [{manifest(stage): {'cache': False}}]
+    # 다른 데이터셋 설정 변경으로 재실행되지 않도록 해당 데이터셋 항목만 선언 (경로는 deps)
+    formats_param = f'datasets.{index}.formats'
+    dedup_enabled = dedup_config.get('enabled', False)
+
+    stages = {
+        'attribute': {
+            'cmd': f'python analyze_with_ddoc.py {name} --stage attribute',
+            'deps': [path, 'analyze_with_ddoc.py', 'format_dispatch.py'],
+            'params': [formats_param, 'dispatch'],
+            'outs': stage_out('attribute')
+        },
+        'embedding': {
+            'cmd': f'python analyze_with_ddoc.py {name} --stage embedding',
+            'deps': [path, 'analyze_with_ddoc.py', 'embedding_backend.py', 'embedding_codec.py',
+                     'format_dispatch.py'],
+            'params': [formats_param, 'embedding', 'dispatch'],
+            'outs': stage_out('embedding')
+        }
+    }
+
+    clustering_deps = [manifest('embedding'), 'analyze_with_ddoc.py', 'incremental_clustering.py']
+    if dedup_enabled:
+        stages['dedup'] = {
+            'cmd': f'python analyze_with_ddoc.py {name} --stage dedup',
+            'deps': [manifest('embedding'), 'analyze_with_ddoc.py', 'dedup.py'],
+            'params': ['dedup'],
+            'outs': stage_out('dedup') + [{f'{out}/duplicates.tsv': {'cache': False}}]
+        }
+        clustering_deps.insert(1, manifest('dedup'))
+
+    stages['clustering'] = {
+        'cmd': f'python analyze_with_ddoc.py {name} --stage clustering',
+        'deps': clustering_deps,
+        'params': ['clustering', 'dedup.exclude_from_clustering'],
+        'outs': stage_out('clustering')
+    }
+
+    stages['plots'] = {
+        'cmd': f'python analyze_with_ddoc.py {name} --stage plots',
+        'deps': [manifest('attribute'), manifest('embedding'), manifest('clustering'),
+                 'analyze_with_ddoc.py'],
+        'params': ['plots'],
+        'outs': [
+            {f'{out}/metrics.json': {'cache': False}}
+        ],
+        'plots': [{f'{out}/plots/': {'cache': False}}]
+    }
+
+    drift_deps = [manifest('attribute'), manifest('embedding'), manifest('clustering')]
+    if dedup_enabled and dedup_config.get('exclude_from_drift', False):
+        drift_deps += [manifest('dedup'), f'{out}/duplicates.tsv', 'dedup.py']
+    stages['detect_drift'] = {
+        'cmd': f'python detect_drift.py {name}',
+        'deps': drift_deps + [
+            'detect_drift.py', 'drift_metrics.py', 'metric_engine.py', 'drift_sampling.py',
+            'drift_snapshots.py', 'group_drift.py', 'cluster_drift.py', 'embedding_codec.py',
+            'run_history.py', 'cache_io.py', 'drift_artifacts.py'
+        ],
+        'params': ['drift', 'dedup.exclude_from_drift', 'history'],
+        'outs': [
+            {f'{out}/drift/metrics.json': {'cache': False}}
+        ],
+        'plots': [
+            {f'{out}/drift/plots/': {'cache': False}},
+            # 실행마다 행을 추가하는 이력이므로 재실행 전에 삭제하지 않음
+            {f'{out}/drift/timeline.tsv': {**TIMELINE_PLOT, 'cache': False, 'persist': True}}
+        ]
+    }
+
+    if artifacts_enabled:
+        # detect_drift --cache-only 입력 (원본 데이터셋 없이 dvc pull로 받음)
+        stages['artifacts'] = {
+            'cmd': f'python drift_artifacts.py export {name}',
+            'deps': [manifest('attribute'), manifest('embedding'), manifest('clustering'),
+                     f'{out}/drift/metrics.json', 'drift_artifacts.py'],
+            'params': ['artifacts', 'drift.use_compact_embeddings', 'drift.report_compression_error'],
+            'outs': [f'{out}/artifacts']
+        }
+    return stages
+
+def update_dvcignore(datasets, path=DVCIGNORE):
+    """데이터셋 cache/ 디렉토리를 .dvcignore에 등록 (ddoc 캐시/잠금/저널 쓰기로 deps가 바뀌지 않도록)
+
+    Returns:
+        추가한 패턴 리스트
+    """
+    path = Path(path)
+    lines = path.read_text().splitlines() if path.exists() else []
+    patterns = [DATASET_CACHE_IGNORE]
+    for dataset in datasets:
+        parent = Path(dataset['path']).parent
+        if parent != Path('datasets'):
+            patterns.append(f"{Path(dataset['path']).as_posix().rstrip('/')}/cache/")
+    added = [p for p in patterns if p not in lines]
+    if added:
+        with open(path, 'a') as f:
+            f.write("\n# ddoc 캐시 (generate_dvc_yaml.py)\n" + "".join(f"{p}\n" for p in added))
+    return added
+
+def generate_dvc_yaml(use_foreach=False):
     """params.yaml 기반으로 dvc.yaml 생성"""
-    
+
     # params.yaml 로드
     with open('params.yaml', 'r') as f:
         params = yaml.safe_load(f)
-    
+
     datasets = params.get('datasets', [])
-    
+
     if not datasets:
         print("⚠️  params.yaml에 datasets가 정의되지 않았습니다.")
         return
-    
+
+    dedup_config = params.get('dedup') or {}
+    artifacts_enabled = (params.get('artifacts') or {}).get('enabled', False)
+
     # DVC YAML 구조 생성
     dvc_config = {
         'params': ['params.yaml'],
         'stages': {}
     }
-    
-    for dataset in datasets:
-        name = dataset['name']
-        path = dataset['path']
-        
-        # 분석 스테이지
-        analyze_stage = {
-            'cmd': f'python analyze_with_ddoc.py {name}',
-            'deps': [
-                path,
-                'analyze_with_ddoc.py'
-            ],
-            'params': [
-                'analysis',
-                'embedding',
-                'clustering'
-            ],
-            'outs': [
-                {f'{path}/analysis/plots/': {'cache': False}},
-                {f'{path}/analysis/metrics.json': {'cache': False}}
-            ],
-            'plots': [
-                f'{path}/analysis/plots/'
-            ]
-        }
-        
-        # 드리프트 스테이지
-        drift_stage = {
-            'cmd': f'python detect_drift.py {name}',
-            'deps': [
-                path,
-                'detect_drift.py'
-            ],
-            'params': [
-                'drift'
-            ],
-            'outs': [
-                {f'{path}/analysis/drift/plots/': {'cache': False}},
-                {f'{path}/analysis/drift/metrics.json': {'cache': False}}
-            ],
-            'plots': [
-                f'{path}/analysis/drift/plots/',
-                {f'{path}/analysis/drift/timeline.tsv': {
-                    'x': 'timestamp',
-                    'y': 'overall_score'
-                }}
-            ]
+
+    if use_foreach:
+        # 스테이지 종류별 foreach 하나 (데이터셋 추가 시 템플릿 수정 불필요)
+        items = {
+            ds['name']: {'path': ds['path'], 'out': f"analysis/{Path(ds['path']).name}", 'index': i}
+            for i, ds in enumerate(datasets)
         }
-        
-        dvc_config['stages'][f'analyze_{name}'] = analyze_stage
-        dvc_config['stages'][f'detect_drift_{name}'] = drift_stage
-    
+        templates = stage_templates('${key}', '${item.path}', '${item.out}', '${item.index}',
+                                    dedup_config, artifacts_enabled)
+        for kind, template in templates.items():
+            dvc_config['stages'][kind] = {'foreach': items, 'do': template}
+    else:
+        for index, dataset in enumerate(datasets):
+            name = dataset['name']
+            out = f"analysis/{Path(dataset['path']).name}"
+            stages = stage_templates(name, dataset['path'], out, index, dedup_config, artifacts_enabled)
+            for kind, stage in stages.items():
+                dvc_config['stages'][f'{kind}_{name}'] = stage
+
     # dvc.yaml 저장
     with open('dvc.yaml', 'w') as f:
-        yaml.dump(dvc_config, f, default_flow_style=False, sort_keys=False, indent=2)
-    
-    print(f"✅ dvc.yaml 생성 완료: {len(datasets)}개 데이터셋")
+        f.write("# generate_dvc_yaml.py로 생성 (params.yaml datasets 변경 시 재생성)\n\n")
+        yaml.dump(dvc_config, f, Dumper=NoAliasDumper, default_flow_style=False,
+                  sort_keys=False, indent=2, allow_unicode=True)
+
+    print(f"✅ dvc.yaml 생성 완료: {len(datasets)}개 데이터셋"
+          f"{' (foreach)' if use_foreach else ''}")
+    added = update_dvcignore(datasets)
+    if added:
+        print(f"   .dvcignore 추가: {', '.join(added)}")
     for dataset in datasets:
         print(f"   - {dataset['name']}: {dataset['path']}")
-    
+
     print("\n📊 DVC 플러그인에서 다음 경로의 시각화를 확인할 수 있습니다:")
     for dataset in datasets:
         name = dataset['name']
-        path = dataset['path']
+        out = f"analysis/{Path(dataset['path']).name}"
         print(f"\n[{name}]")
-        print(f"  분석: {path}/analysis/plots/")
-        print(f"  드리프트: {path}/analysis/drift/plots/")
-        print(f"  타임라인: {path}/analysis/drift/timeline.tsv")
+        print(f"  분석: {out}/plots/")
+        print(f"  드리프트: {out}/drift/plots/")
+        print(f"  타임라인: {out}/drift/timeline.tsv")
+        if artifacts_enabled:
+            print(f"  드리프트 아티팩트: {out}/artifacts/ (dvc pull 후 detect_drift.py {name} --cache-only)")
 
 if __name__ == "__main__":
-    generate_dvc_yaml()
-
+    parser = argparse.ArgumentParser(description="params.yaml 기반 dvc.yaml 생성")
+    parser.add_argument('--foreach', action='store_true',
+                        help="데이터셋별 전개 대신 foreach 템플릿으로 생성")
+    args = parser.parse_args()
+    generate_dvc_yaml(args.foreach)
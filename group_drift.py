@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+그룹별 드리프트 (하위 디렉토리 / 매핑 파일 기준)
+데이터셋 하위 폴더(클래스, 수집 경로, 카메라 등)마다 detect_drift와 같은 메트릭
+(KL, Wasserstein, KS, 품질, MMD, Mean Shift)과 Overall Score를 계산
+
+- 그룹 키: 데이터셋 기준 상대 경로의 앞 depth개 폴더, 또는 매핑 파일 (파일명 → 그룹)
+- 파일별 그룹은 file_groups 캐시에 누적 저장 (삭제된 baseline 파일도 마지막 그룹 유지)
+- 그룹 분할은 정렬 한 번으로 처리하고, 임베딩 MMD는 그룹별 샘플을 배치 커널로 계산
+"""
+import csv
+import json
+from pathlib import Path
+
+import numpy as np
+
+from dataset_utils import list_dataset_files
+from embedding_codec import decode
+from drift_metrics import (
+    calculate_quality_score, calculate_mmd_batched, attribute_drift_metrics,
+    overall_drift_score, base_score_weights, drift_status
+)
+
+GROUP_CACHE = "file_groups"
+ROOT_GROUP = "."
+UNKNOWN_GROUP = "(unknown)"
+
+DEFAULT_CONFIG = {
+    'enabled': False,
+    'by': 'subdirectory',           # "subdirectory" | "mapping"
+    'depth': 1,                     # subdirectory: 그룹 키로 사용할 폴더 깊이
+    'mapping_file': None,           # mapping: TSV/CSV (파일명, 그룹) 또는 JSON {파일명: 그룹}
+    'min_group_size': 10,           # baseline/current 모두 이 수 이상이어야 점수 계산
+    'max_samples_per_group': 500,   # 그룹별 MMD 샘플 수
+    'max_plot_groups': 40,          # 히트맵에 표시할 최대 그룹 수 (점수 상위)
+    'seed': 42
+}
+
+def load_mapping(path):
+    """매핑 파일 → {파일명: 그룹} (경로가 적혀 있으면 파일명만 사용, ddoc 캐시 키와 동일)"""
+    path = Path(path)
+    if path.suffix == '.json':
+        with open(path) as f:
+            mapping = json.load(f)
+    else:
+        delimiter = ',' if path.suffix == '.csv' else '\t'
+        mapping = {}
+        with open(path, newline='') as f:
+            for row in csv.reader(f, delimiter=delimiter):
+                if len(row) >= 2 and row[0] and not row[0].startswith('#'):
+                    mapping[row[0]] = row[1]
+    return {Path(k).name: str(v) for k, v in mapping.items()}
+
+def path_groups(data_dir, formats, depth=1):
+    """하위 디렉토리 기준 그룹 {파일명: 그룹} (데이터셋 최상위 파일은 ".")"""
+    data_dir = Path(data_dir)
+    groups = {}
+    for name, path in list_dataset_files(data_dir, formats).items():
+        parts = path.relative_to(data_dir).parts[:-1]
+        groups[name] = '/'.join(parts[:depth]) if parts else ROOT_GROUP
+    return groups
+
+def update_group_map(data_dir, formats, config=None):
+    """현재 파일의 그룹을 계산해 file_groups 캐시에 병합
+
+    Returns:
+        {파일명: 그룹} (현재 파일 + 이전 실행에서 본 파일)
+    """
+    from cache_io import dataset_lock, load_cache, save_cache
+
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    if config['by'] == 'mapping':
+        if not config.get('mapping_file'):
+            raise ValueError("groups.by=mapping에는 mapping_file이 필요합니다")
+        current = load_mapping(config['mapping_file'])
+    else:
+        current = path_groups(data_dir, formats, config['depth'])
+
+    with dataset_lock(data_dir):
+        group_map = load_cache(data_dir, GROUP_CACHE) or {}
+        if any(group_map.get(k) != v for k, v in current.items()):
+            group_map.update(current)
+            save_cache(data_dir, group_map, GROUP_CACHE)
+    return group_map
+
+def split_by_group(names, group_map):
+    """파일명 목록을 그룹별 인덱스로 분할 (정렬 한 번)
+
+    Returns:
+        {그룹: names 내 인덱스 배열}
+    """
+    if len(names) == 0:
+        return {}
+    labels = np.array([group_map.get(n, UNKNOWN_GROUP) for n in names])
+    groups, inverse = np.unique(labels, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+    return {str(groups[inverse[chunk[0]]]): chunk for chunk in np.split(order, bounds)}
+
+def embedding_rows(emb_cache):
+    """임베딩 캐시 → (파일명 리스트, 벡터 리스트) (전체 배열을 만들지 않고 그룹 샘플 행만 변환)"""
+    names = [f for f, v in (emb_cache or {}).items() if 'embedding' in v]
+    return names, [emb_cache[f]['embedding'] for f in names]
+
+def _rows(X, idx):
+    """행 인덱스 → float64 임베딩 (압축 캐시는 해당 행만 역양자화)"""
+    if isinstance(X, dict):
+        return decode(X['codes'][idx], X['params']).astype(np.float64)
+    if isinstance(X, list):
+        return np.asarray([X[i] for i in idx], dtype=np.float64)
+    return np.asarray(X[idx], dtype=np.float64)
+
+def _attribute_arrays(attr_cache, names):
+    """속성 캐시 → 값 배열 (없는 값은 NaN), attribute_values와 같은 키"""
+    cols = {key: np.full(len(names), np.nan) for key in ('size', 'noise', 'sharpness', 'quality')}
+    for i, name in enumerate(names):
+        v = attr_cache[name]
+        if 'size' in v:
+            cols['size'][i] = v['size']
+        if 'noise_level' in v:
+            cols['noise'][i] = v['noise_level']
+        if 'sharpness' in v:
+            cols['sharpness'][i] = v['sharpness']
+        if 'noise_level' in v and 'sharpness' in v:
+            cols['quality'][i] = calculate_quality_score(v['sharpness'], v['noise_level'])
+    return cols
+
+def _group_values(cols, idx):
+    values = {}
+    for key, col in cols.items():
+        vals = col[idx]
+        values[key] = vals[~np.isnan(vals)].tolist()
+    return values
+
+def compute_group_drift(group_map, baseline_attr, current_attr, common,
+                        ref_files, ref_X, cur_files, cur_X, thresholds, config=None, weights=None,
+                        gamma=1.0):
+    """그룹별 드리프트 메트릭
+
+    Args:
+        common: 속성 드리프트 대상 공통 파일 (detect_drift와 동일)
+        ref_files/ref_X, cur_files/cur_X: 임베딩 파일명과 float 배열(또는 벡터 리스트) 또는 압축 캐시 (없으면 None)
+        thresholds: (warning, critical)
+        weights: Overall Score 가중치 (None이면 SCORE_WEIGHTS, 그룹별로 계산하지 않는 추가 메트릭은
+            제외하고 재정규화 — base_score_weights)
+        gamma: MMD RBF gamma (detect_drift 전체 MMD와 같은 값)
+
+    Returns:
+        {그룹: {'baseline_files', 'current_files', 'size', ..., 'embedding', 'overall_score', 'status'}}
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    weights, _ = base_score_weights(weights)
+    rng = np.random.default_rng(config['seed'])
+    min_size = config['min_group_size']
+    max_samples = config['max_samples_per_group']
+
+    ref_counts = {g: len(idx) for g, idx in split_by_group(list(baseline_attr), group_map).items()}
+    cur_counts = {g: len(idx) for g, idx in split_by_group(list(current_attr), group_map).items()}
+
+    common = sorted(common)
+    common_groups = split_by_group(common, group_map)
+    ref_cols = _attribute_arrays(baseline_attr, common)
+    cur_cols = _attribute_arrays(current_attr, common)
+
+    has_embeddings = ref_X is not None and cur_X is not None
+    ref_emb_groups = split_by_group(ref_files, group_map) if has_embeddings else {}
+    cur_emb_groups = split_by_group(cur_files, group_map) if has_embeddings else {}
+
+    rows = {}
+    mmd_pairs, mmd_groups = [], []
+    for group in sorted(set(ref_counts) | set(cur_counts)):
+        n_ref, n_cur = ref_counts.get(group, 0), cur_counts.get(group, 0)
+        row = {'baseline_files': n_ref, 'current_files': n_cur}
+        rows[group] = row
+        if n_ref == 0:
+            row['status'] = 'NEW'
+            continue
+        if n_cur == 0:
+            row['status'] = 'VANISHED'
+            continue
+        if n_ref < min_size or n_cur < min_size:
+            row['status'] = 'INSUFFICIENT'
+            continue
+
+        idx = common_groups.get(group)
+        if idx is not None and len(idx):
+            row.update(attribute_drift_metrics(_group_values(ref_cols, idx), _group_values(cur_cols, idx)))
+
+        ref_idx, cur_idx = ref_emb_groups.get(group), cur_emb_groups.get(group)
+        if ref_idx is not None and cur_idx is not None and len(ref_idx) > 1 and len(cur_idx) > 1:
+            if len(ref_idx) > max_samples:
+                ref_idx = np.sort(rng.choice(ref_idx, max_samples, replace=False))
+            if len(cur_idx) > max_samples:
+                cur_idx = np.sort(rng.choice(cur_idx, max_samples, replace=False))
+            ref_rows = _rows(ref_X, ref_idx)
+            cur_rows = _rows(cur_X, cur_idx)
+            ref_var, cur_var = float(np.var(ref_rows)), float(np.var(cur_rows))
+            row['embedding'] = {
+                'mean_shift': float(np.linalg.norm(ref_rows.mean(axis=0) - cur_rows.mean(axis=0))),
+                'variance_change': float(abs(cur_var - ref_var) / ref_var) if ref_var > 0 else 0.0,
+                'samples': [int(len(ref_idx)), int(len(cur_idx))]
+            }
+            mmd_pairs.append((ref_rows, cur_rows))
+            mmd_groups.append(group)
+
+    # 그룹별 MMD를 배치 커널로 한 번에 계산
+    for group, mmd in zip(mmd_groups, calculate_mmd_batched(mmd_pairs, gamma)):
+        rows[group]['embedding']['mmd'] = mmd
+
+    for row in rows.values():
+        if 'status' not in row:
+            row['overall_score'] = overall_drift_score(row, weights)
+            row['status'] = drift_status(row['overall_score'], *thresholds)
+    return rows
+
+def plot_group_heatmap(groups, out_path, max_groups=40):
+    """그룹 × 메트릭 히트맵 (점수가 높은 그룹 순)"""
+    from drift_snapshots import plot_drift_matrix
+
+    scored = {g: row for g, row in groups.items() if 'overall_score' in row}
+    if not scored:
+        return False
+    top = sorted(scored, key=lambda g: scored[g]['overall_score'], reverse=True)[:max_groups]
+    plot_drift_matrix({g: scored[g] for g in top}, out_path, title='Group Drift (Group x Metric)')
+    return True
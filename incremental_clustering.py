@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+증분 클러스터링 (MiniBatchKMeans)
+- 신규 파일과 임베딩이 바뀐 파일만 partial_fit으로 centroid 갱신
+- 클러스터 수 자동 선택은 제한된 크기의 샘플에서 silhouette로 평가
+- 모델/centroid/처리한 파일별 임베딩 digest를 clustering_state 캐시에 보존
+- clustering.method는 kmeans만 지원 (다른 값은 ValueError, 조용히 대체하지 않음)
+
+결과는 ddoc clustering_analysis 캐시와 동일 스키마로 저장
+"""
+import hashlib
+
+import numpy as np
+
+STATE_CACHE = "clustering_state"
+
+DEFAULT_BATCH_SIZE = 1024
+DEFAULT_SILHOUETTE_SAMPLE = 2000
+DEFAULT_RESELECT_GROWTH = 2.0
+
+def select_n_clusters(X, k_range, sample_size=DEFAULT_SILHOUETTE_SAMPLE, seed=42):
+    """제한된 샘플에서 silhouette 최대인 클러스터 수 선택 (데이터 크기와 무관한 비용)"""
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.metrics import silhouette_score
+
+    rng = np.random.default_rng(seed)
+    sample = X[rng.choice(len(X), sample_size, replace=False)] if len(X) > sample_size else X
+
+    k_min, k_max = k_range
+    best_k, best_score = k_min, -1.0
+    for k in range(k_min, min(k_max, len(sample) - 1) + 1):
+        labels = MiniBatchKMeans(n_clusters=k, n_init=3, random_state=seed).fit_predict(sample)
+        if len(np.unique(labels)) < 2:
+            continue
+        score = silhouette_score(sample, labels)
+        if score > best_score:
+            best_k, best_score = k, score
+    return best_k, float(best_score)
+
+def _fit_full(X, n_clusters, batch_size, seed=42):
+    """MiniBatchKMeans 초기 학습 + 2D 시각화용 PCA (샘플 기반)"""
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.decomposition import PCA
+
+    model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, n_init=3, random_state=seed)
+    model.fit(X)
+
+    rng = np.random.default_rng(seed)
+    sample = X[rng.choice(len(X), min(len(X), 10000), replace=False)]
+    pca = PCA(n_components=2).fit(sample)
+    return model, pca
+
+def embedding_digests(files, X):
+    """파일명 → 임베딩 행 digest (같은 파일명이라도 재임베딩되면 값이 바뀜)"""
+    return {f: hashlib.md5(row.tobytes()).hexdigest() for f, row in zip(files, X)}
+
+def update_clustering(data_dir, emb_cache, clustering_params, exclude=None):
+    """임베딩 캐시 기준 증분 클러스터링 후 clustering_analysis 캐시 갱신
+
+    Args:
+        data_dir: 데이터셋 경로
+        emb_cache: ddoc 임베딩 캐시 {파일명: {'embedding': [...]}}
+        clustering_params: params.yaml clustering 섹션
+        exclude: 클러스터링에서 제외할 파일명 집합 (예: 중복 파일)
+
+    Returns:
+        통계 dict (n_clusters, new_files, refit 여부)
+    """
+    from cache_utils import get_cached_analysis_data
+    from cache_io import dataset_lock, save_cache
+    from embedding_backend import check_clustering_method
+
+    check_clustering_method(clustering_params)
+    exclude = exclude or set()
+    files = [f for f, v in emb_cache.items() if 'embedding' in v and f not in exclude]
+    if len(files) < 3:
+        return None
+
+    X = np.asarray([emb_cache[f]['embedding'] for f in files], dtype=np.float32)
+    digests = embedding_digests(files, X)
+    batch_size = clustering_params.get('batch_size', DEFAULT_BATCH_SIZE)
+    sample_size = clustering_params.get('silhouette_sample_size', DEFAULT_SILHOUETTE_SAMPLE)
+    fixed_k = clustering_params.get('n_clusters')
+
+    state = get_cached_analysis_data(data_dir, STATE_CACHE)
+    refit = (
+        not state
+        or (fixed_k and fixed_k != state['n_clusters'])
+        or state['model'].cluster_centers_.shape[1] != X.shape[1]
+        # 선택 이후 데이터가 크게 늘면 클러스터 수 재선택
+        or (not fixed_k and len(files) >= state['selected_at'] * clustering_params.get(
+            'reselect_growth', DEFAULT_RESELECT_GROWTH))
+    )
+
+    silhouette = state.get('silhouette') if state else None
+    if refit:
+        if fixed_k:
+            n_clusters = fixed_k
+        else:
+            n_clusters, silhouette = select_n_clusters(
+                X, clustering_params.get('n_clusters_range', [2, 10]), sample_size
+            )
+        model, pca = _fit_full(X, n_clusters, batch_size)
+        state = {
+            'model': model,
+            'pca': pca,
+            'n_clusters': n_clusters,
+            'silhouette': silhouette,
+            'selected_at': len(files),
+            'files': {}
+        }
+        new_files = files
+    else:
+        # 신규 파일과 임베딩이 바뀐 파일만 미니배치로 centroid 갱신
+        model = state['model']
+        known = state['files']
+        if not isinstance(known, dict):
+            # 이전 형식(파일명 집합): 기존 파일은 현재 임베딩으로 처리된 것으로 간주
+            known = {f: digests[f] for f in known if f in digests}
+        new_idx = [i for i, f in enumerate(files) if known.get(f) != digests[f]]
+        for start in range(0, len(new_idx), batch_size):
+            model.partial_fit(X[new_idx[start:start + batch_size]])
+        new_files = [files[i] for i in new_idx]
+
+    state['files'] = digests
+
+    labels = state['model'].predict(X)
+    emb_2d = state['pca'].transform(X)
+
+    clustering = {
+        'n_clusters': int(state['n_clusters']),
+        'cluster_labels': labels.tolist(),
+        'embeddings_2d': emb_2d.tolist(),
+        'centroids': state['model'].cluster_centers_.tolist(),
+        'files': files,
+        'silhouette_sample': silhouette
+    }
+    # 클러스터링 결과와 모델 상태는 함께 저장 (한쪽만 갱신된 상태로 남지 않도록)
+    with dataset_lock(data_dir):
+        save_cache(data_dir, clustering, "clustering_analysis")
+        save_cache(data_dir, state, STATE_CACHE)
+
+    return {
+        'n_clusters': int(state['n_clusters']),
+        'new_files': len(new_files),
+        'refit': bool(refit)
+    }
+
+def persisted_n_clusters(data_dir):
+    """보존된 클러스터 수 (없으면 None)"""
+    from cache_utils import get_cached_analysis_data
+
+    state = get_cached_analysis_data(data_dir, STATE_CACHE)
+    return state['n_clusters'] if state else None
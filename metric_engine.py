@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+추가 드리프트 메트릭 엔진 (params.yaml drift.metrics로 선택, drift.score_weights로 가중)
+
+- 임베딩: sliced Wasserstein / sliced energy distance (랜덤 투영 배치 정렬, O(L·n log n)),
+  도메인 분류기 2-표본 검정 (로지스틱 회귀 교차검증 AUC)
+- 속성 결합 검정: 크기/노이즈/선명도를 baseline 기준 표준화한 3차원 공간의 MMD
+  (단변량 KL이 놓치는 속성 간 상관 변화 탐지)
+- MMD bandwidth: 고정 gamma 또는 median heuristic
+- 메트릭별 실행 시간은 drift/metrics.json의 timing에 기록
+"""
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from drift_metrics import (
+    SCORE_WEIGHTS, SCORE_METRICS, calculate_mmd, median_heuristic_gamma, sliced_distances,
+    classifier_two_sample_test
+)
+
+DEFAULT_CONFIG = {
+    'mmd_gamma': 1.0,           # 숫자 또는 "median" (median heuristic)
+    'embedding': [],            # 추가 임베딩 메트릭: sliced_wasserstein, energy, classifier
+    'joint_attribute': False,   # 속성 결합 공간 MMD
+    'max_samples': 2000,        # 추가 메트릭용 샘플 상한 (baseline/current 각각)
+    'n_projections': 128,       # sliced 메트릭 랜덤 투영 수
+    'classifier_folds': 5,
+    'seed': 42
+}
+
+JOINT_ATTRIBUTE_KEYS = (('size', 'size'), ('noise', 'noise_level'), ('sharpness', 'sharpness'))
+
+def _sliced(X, Y, config):
+    return sliced_distances(X, Y, config['n_projections'], config['seed'])
+
+def _classifier(X, Y, config):
+    result = classifier_two_sample_test(X, Y, config['classifier_folds'], config['seed'])
+    return {'classifier_auc': result['auc'], 'classifier_score': result['score']}
+
+# 메트릭 이름 → 계산 함수 (같은 함수를 공유하는 메트릭은 한 번만 계산)
+EMBEDDING_METRICS = {
+    'sliced_wasserstein': _sliced,
+    'energy': _sliced,
+    'classifier': _classifier
+}
+
+def load_config(drift_params):
+    """drift 섹션 → (메트릭 설정, 점수 가중치)"""
+    config = {**DEFAULT_CONFIG, **(drift_params.get('metrics') or {})}
+    unknown = set(config['embedding']) - set(EMBEDDING_METRICS)
+    if unknown:
+        raise ValueError(f"알 수 없는 임베딩 메트릭: {sorted(unknown)} "
+                         f"(지원: {sorted(EMBEDDING_METRICS)})")
+
+    weights = drift_params.get('score_weights') or SCORE_WEIGHTS
+    unknown = set(weights) - set(SCORE_METRICS)
+    if unknown:
+        raise ValueError(f"알 수 없는 score_weights 키: {sorted(unknown)} "
+                         f"(지원: {sorted(SCORE_METRICS)})")
+    # 계산하지 않는 추가 메트릭에 가중치를 주면 해당 항이 항상 0 → 설정 오류로 처리
+    enabled = set(config['embedding']) | ({'joint_attribute'} if config['joint_attribute'] else set())
+    disabled = sorted(k for k, w in weights.items()
+                      if w and k not in SCORE_WEIGHTS and k not in enabled)
+    if disabled:
+        raise ValueError(f"score_weights에 활성화되지 않은 메트릭 가중치: {disabled} "
+                         f"(drift.metrics.embedding / joint_attribute에서 활성화 필요)")
+    return config, dict(weights)
+
+@contextmanager
+def metric_timer(timing, name):
+    """블록 실행 시간을 timing[name]에 누적 (초)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing[name] = timing.get(name, 0.0) + time.perf_counter() - start
+
+def subsample(X, n, seed=0):
+    """최대 n행 무작위 샘플 (행 순서 유지)"""
+    X = np.asarray(X)
+    if len(X) <= n:
+        return X
+    idx = np.sort(np.random.default_rng(seed).choice(len(X), n, replace=False))
+    return X[idx]
+
+def resolve_gamma(config, X, Y=None):
+    """MMD gamma (mmd_gamma가 "median"이면 샘플로 median heuristic 계산)
+
+    Y=None: baseline만 알려진 상주 기준(서버/스트리밍)용, baseline 샘플로만 계산
+    """
+    if config['mmd_gamma'] == 'median':
+        return median_heuristic_gamma(X, Y, seed=config['seed'])
+    return float(config['mmd_gamma'])
+
+def embedding_metrics(X, Y, config, timing):
+    """선택된 추가 임베딩 메트릭 계산
+
+    Returns:
+        {'sliced_wasserstein', 'energy_distance', 'classifier_auc', 'classifier_score', ...} 중 선택된 항목
+    """
+    X = subsample(X, config['max_samples'], config['seed'])
+    Y = subsample(Y, config['max_samples'], config['seed'] + 1)
+    results = {}
+    done = {}
+    for name in config['embedding']:
+        fn = EMBEDDING_METRICS[name]
+        if fn in done:
+            timing[name] = done[fn]
+            continue
+        with metric_timer(timing, name):
+            results.update(fn(X, Y, config))
+        done[fn] = timing[name]
+    return results
+
+def _joint_matrix(attr_cache, files):
+    rows = [[attr_cache[f][key] for _, key in JOINT_ATTRIBUTE_KEYS] for f in files
+            if all(key in attr_cache[f] for _, key in JOINT_ATTRIBUTE_KEYS)]
+    return np.asarray(rows, dtype=np.float64).reshape(-1, len(JOINT_ATTRIBUTE_KEYS))
+
+def joint_attribute_metrics(baseline_attr, current_attr, common, config):
+    """속성 결합 공간 검정 (baseline 평균/표준편차로 표준화, median heuristic gamma)
+
+    Returns:
+        {'mmd', 'gamma', 'energy_distance', 'samples', 'features'} (샘플 부족 시 None)
+    """
+    files = sorted(common)
+    X = _joint_matrix(baseline_attr, files)
+    Y = _joint_matrix(current_attr, files)
+    if len(X) < 2 or len(Y) < 2:
+        return None
+
+    mean, std = X.mean(axis=0), X.std(axis=0)
+    std[std == 0] = 1.0
+    X = subsample((X - mean) / std, config['max_samples'], config['seed'])
+    Y = subsample((Y - mean) / std, config['max_samples'], config['seed'] + 1)
+
+    gamma = median_heuristic_gamma(X, Y, seed=config['seed'])
+    return {
+        'mmd': calculate_mmd(X, Y, gamma),
+        'gamma': gamma,
+        'energy_distance': sliced_distances(X, Y, config['n_projections'], config['seed'])['energy_distance'],
+        'samples': [int(len(X)), int(len(Y))],
+        'features': [name for name, _ in JOINT_ATTRIBUTE_KEYS]
+    }
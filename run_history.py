@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+실행 이력 저장소 (SQLite, append-only)
+analyze_with_ddoc.py / detect_drift.py 실행마다 전체 메트릭을 한 행으로 추가
+- (dataset, kind, timestamp) 인덱스로 데이터셋별 조회
+- 추세 조회, 백분위 기반 임계값 산출
+- DVC plots용 drift/timeline.tsv 내보내기
+
+사용법:
+    python run_history.py list test_data [--kind drift] [--limit 20]
+    python run_history.py trend test_data embedding.mmd [--last 30]
+    python run_history.py thresholds test_data [--metric overall_score] [--percentiles 90 99]
+    python run_history.py export test_data
+    python run_history.py import-timeline test_data
+"""
+import json
+import sqlite3
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from cache_io import append_lines, atomic_write
+
+DEFAULT_DB_PATH = "analysis/run_history.db"
+TIMELINE_HEADER = "timestamp\toverall_score\tstatus\tfiles_added\tfiles_removed\n"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dataset TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status TEXT,
+    overall_score REAL,
+    files_added INTEGER,
+    files_removed INTEGER,
+    metrics TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_dataset_kind_ts ON runs (dataset, kind, timestamp);
+CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON runs (timestamp);
+"""
+
+def connect(db_path=DEFAULT_DB_PATH):
+    """이력 DB 연결 (없으면 생성, WAL 모드로 동시 읽기/쓰기 허용)"""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def record_run(dataset, kind, metrics, timestamp, files_added=None, files_removed=None,
+               db_path=DEFAULT_DB_PATH):
+    """실행 한 건 추가 (기존 행은 수정하지 않음)
+
+    Args:
+        dataset: 데이터셋 디렉토리 이름 (analysis/<dataset>)
+        kind: "analysis" 또는 "drift"
+        metrics: metrics.json과 동일한 dict
+    """
+    with connect(db_path) as conn:
+        conn.execute(
+            "INSERT INTO runs (dataset, kind, timestamp, status, overall_score, files_added, "
+            "files_removed, metrics) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (dataset, kind, timestamp, metrics.get('status'), metrics.get('overall_score'),
+             files_added, files_removed, json.dumps(metrics))
+        )
+    conn.close()
+
+def query_runs(dataset, kind='drift', since=None, until=None, limit=None, db_path=DEFAULT_DB_PATH):
+    """실행 목록 (시간순)
+
+    Returns:
+        [{'id', 'timestamp', 'status', 'overall_score', 'files_added', 'files_removed', 'metrics'}]
+    """
+    sql = ("SELECT id, timestamp, status, overall_score, files_added, files_removed, metrics "
+           "FROM runs WHERE dataset = ? AND kind = ?")
+    args = [dataset, kind]
+    if since:
+        sql += " AND timestamp >= ?"
+        args.append(since)
+    if until:
+        sql += " AND timestamp <= ?"
+        args.append(until)
+    if limit:
+        # 최근 N건을 시간순으로
+        sql = f"SELECT * FROM ({sql} ORDER BY timestamp DESC, id DESC LIMIT ?) ORDER BY timestamp, id"
+        args.append(int(limit))
+    else:
+        sql += " ORDER BY timestamp, id"
+
+    conn = connect(db_path)
+    rows = conn.execute(sql, args).fetchall()
+    conn.close()
+    keys = ('id', 'timestamp', 'status', 'overall_score', 'files_added', 'files_removed')
+    return [{**dict(zip(keys, row[:6])), 'metrics': json.loads(row[6])} for row in rows]
+
+def metric_value(metrics, path):
+    """점 표기 경로로 메트릭 값 조회 (예: "embedding.mmd", "cluster.population_shift")"""
+    value = metrics
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+def metric_series(dataset, path, kind='drift', last=None, db_path=DEFAULT_DB_PATH):
+    """메트릭 추세 [(timestamp, value)]"""
+    runs = query_runs(dataset, kind, limit=last, db_path=db_path)
+    series = []
+    for run in runs:
+        value = metric_value(run['metrics'], path)
+        if value is not None:
+            series.append((run['timestamp'], value))
+    return series
+
+def percentile_thresholds(dataset, path='overall_score', percentiles=(90, 99), kind='drift',
+                          exclude_status=('BASELINE_CREATED',), db_path=DEFAULT_DB_PATH):
+    """이력 분포 기반 임계값 (예: 90/99 백분위 → warning/critical 후보)"""
+    runs = query_runs(dataset, kind, db_path=db_path)
+    values = [metric_value(r['metrics'], path) for r in runs if r['status'] not in exclude_status]
+    values = [v for v in values if v is not None]
+    if not values:
+        return {}
+    return {f"p{p:g}": float(np.percentile(values, p)) for p in percentiles}
+
+def timeline_row(timestamp, overall_score, status, files_added, files_removed):
+    """timeline.tsv 한 행 (detect_drift와 동일 포맷)"""
+    return f"{timestamp}\t{overall_score:.4f}\t{status}\t{files_added}\t{files_removed}\n"
+
+def append_timeline(timeline_file, row):
+    """timeline.tsv에 한 행 추가 (전체 읽기/재작성 없이 append, 동시 실행에도 행 단위 보존)"""
+    append_lines(timeline_file, [row], header=TIMELINE_HEADER)
+
+def export_timeline(dataset, out_file, db_path=DEFAULT_DB_PATH):
+    """이력 DB → timeline.tsv (DVC plots 형식)"""
+    runs = query_runs(dataset, 'drift', db_path=db_path)
+    with atomic_write(out_file) as f:
+        f.write(TIMELINE_HEADER)
+        for run in runs:
+            status = 'BASELINE' if run['status'] == 'BASELINE_CREATED' else run['status']
+            f.write(timeline_row(run['timestamp'], run['overall_score'] or 0.0, status,
+                                 run['files_added'] or 0, run['files_removed'] or 0))
+    return len(runs)
+
+def import_timeline(dataset, timeline_file, db_path=DEFAULT_DB_PATH):
+    """기존 timeline.tsv 행을 이력 DB로 가져오기 (상세 메트릭 없이 점수/상태만)"""
+    existing = {r['timestamp'] for r in query_runs(dataset, 'drift', db_path=db_path)}
+    imported = 0
+    with open(timeline_file) as f:
+        next(f, None)
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) < 5 or parts[0] in existing:
+                continue
+            timestamp, score, status, added, removed = parts[:5]
+            status = 'BASELINE_CREATED' if status == 'BASELINE' else status
+            record_run(dataset, 'drift', {'overall_score': float(score), 'status': status, 'imported': True},
+                       timestamp, int(added), int(removed), db_path=db_path)
+            imported += 1
+    return imported
+
+def main():
+    from dataset_utils import load_params
+
+    parser = argparse.ArgumentParser(description="실행 이력 조회")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_list = sub.add_parser('list', help="실행 목록")
+    p_list.add_argument('dataset')
+    p_list.add_argument('--kind', default='drift', choices=['drift', 'analysis'])
+    p_list.add_argument('--since', default=None, help="YYYYMMDD_HHMMSS")
+    p_list.add_argument('--limit', type=int, default=20)
+
+    p_trend = sub.add_parser('trend', help="메트릭 추세")
+    p_trend.add_argument('dataset')
+    p_trend.add_argument('metric', help="점 표기 경로 (예: embedding.mmd)")
+    p_trend.add_argument('--kind', default='drift', choices=['drift', 'analysis'])
+    p_trend.add_argument('--last', type=int, default=None)
+
+    p_thr = sub.add_parser('thresholds', help="백분위 기반 임계값")
+    p_thr.add_argument('dataset')
+    p_thr.add_argument('--metric', default='overall_score')
+    p_thr.add_argument('--percentiles', type=float, nargs='+', default=[90, 99])
+
+    p_export = sub.add_parser('export', help="timeline.tsv 내보내기")
+    p_export.add_argument('dataset')
+    p_export.add_argument('--out', default=None)
+
+    p_import = sub.add_parser('import-timeline', help="기존 timeline.tsv 가져오기")
+    p_import.add_argument('dataset')
+
+    args = parser.parse_args()
+    params = load_params()
+    db_path = (params.get('history') or {}).get('db_path', DEFAULT_DB_PATH)
+    timeline_file = Path("analysis") / args.dataset / "drift" / "timeline.tsv"
+
+    if args.command == 'list':
+        for run in query_runs(args.dataset, args.kind, since=args.since, limit=args.limit, db_path=db_path):
+            score = f"{run['overall_score']:.4f}" if run['overall_score'] is not None else "-"
+            print(f"{run['timestamp']}  {run['status'] or '-':<16} score={score}  "
+                  f"+{run['files_added'] or 0} -{run['files_removed'] or 0}")
+
+    elif args.command == 'trend':
+        series = metric_series(args.dataset, args.metric, args.kind, args.last, db_path=db_path)
+        if not series:
+            print(f"⚠️  '{args.metric}' 기록이 없습니다.")
+            return
+        values = np.array([v for _, v in series])
+        for timestamp, value in series:
+            print(f"{timestamp}\t{value:.4f}")
+        slope = np.polyfit(np.arange(len(values)), values, 1)[0] if len(values) > 1 else 0.0
+        print(f"\n📈 {len(values)}회: 평균 {values.mean():.4f}, 최소 {values.min():.4f}, "
+              f"최대 {values.max():.4f}, 실행당 변화 {slope:+.4f}")
+
+    elif args.command == 'thresholds':
+        thresholds = percentile_thresholds(args.dataset, args.metric, args.percentiles, db_path=db_path)
+        if not thresholds:
+            print("⚠️  이력이 없습니다.")
+            return
+        print(json.dumps(thresholds, indent=2))
+
+    elif args.command == 'export':
+        out_file = Path(args.out) if args.out else timeline_file
+        count = export_timeline(args.dataset, out_file, db_path=db_path)
+        print(f"✅ timeline 내보내기: {out_file} ({count}행)")
+
+    elif args.command == 'import-timeline':
+        count = import_timeline(args.dataset, timeline_file, db_path=db_path)
+        print(f"✅ timeline 가져오기: {count}행")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+샤드 단위 분산 분석 (map/reduce)
+데이터셋 파일을 파일명 해시로 N개 샤드로 나누고, 샤드별로 ddoc 속성/임베딩 분석 (map)
+→ 부분 캐시와 병합 가능한 통계(속성 개수/합/제곱합/최소/최대, 임베딩 개수/차원)를 샤드 디렉토리에 저장
+→ reduce 단계에서 데이터셋 캐시와 단계 manifest로 병합한 뒤 dedup/clustering/plots는 기존 단계 재사용
+
+샤드 디렉토리(work_dir/shard_<i>)는 원본 파일 심볼릭 링크 + ddoc 캐시를 유지하므로
+재실행 시 샤드별로 ddoc 해시 캐싱이 그대로 적용됨.
+여러 호스트에서 실행할 때는 work_dir과 데이터셋이 같은 경로로 공유 파일시스템에 마운트되어 있어야 함
+
+사용법:
+    python sharded_analysis.py test_data --shards 8 --workers 4   # 로컬 프로세스 풀로 map + reduce
+    python sharded_analysis.py test_data --shards 8 --shard-index 3   # map 하나 (호스트별 실행)
+    python sharded_analysis.py test_data --shards 8 --reduce          # reduce만
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from dataset_utils import load_params, resolve_dataset, list_dataset_files, CACHE_DIR_NAME
+from drift_metrics import calculate_quality_score
+from cache_io import dataset_lock, save_cache, write_json_atomic
+
+# ddoc 모듈 경로 (map/reduce 함수 안에서 import)
+sys.path.insert(0, str(Path(__file__).parent.parent / 'datadrift_app_engine'))
+
+DEFAULT_CONFIG = {
+    'num_shards': 4,
+    'workers': None,      # null = 샤드 수와 CPU 수 중 작은 값
+    'work_dir': None      # null = analysis/<dataset>/shards
+}
+
+PARTIAL_FILE = "partial.json"
+ATTRIBUTE_FIELDS = ('size', 'width', 'height', 'noise_level', 'sharpness', 'quality')
+
+def shard_of(name, num_shards):
+    """파일명 → 샤드 번호 (데이터셋이 늘어도 기존 파일의 샤드는 유지)"""
+    return int.from_bytes(hashlib.md5(name.encode()).digest()[:8], 'big') % num_shards
+
+def shard_signature(paths):
+    """샤드 파일 목록 서명 (파일명, 크기, 수정시각) — reduce 시 현재 데이터셋과 비교해 오래된 partial 거부"""
+    digest = hashlib.md5()
+    for path in sorted(paths, key=lambda p: Path(p).name):
+        stat = Path(path).stat()
+        digest.update(f"{Path(path).name}\t{stat.st_size}\t{int(stat.st_mtime)}\n".encode())
+    return digest.hexdigest()
+
+def shard_dir(work_dir, index):
+    return Path(work_dir) / f"shard_{index:04d}"
+
+def default_work_dir(data_dir):
+    return Path("analysis") / Path(data_dir).name / "shards"
+
+def sync_shard_links(stage_dir, paths):
+    """샤드 디렉토리의 심볼릭 링크를 샤드 파일 목록과 일치시킴 (ddoc 캐시는 유지)
+
+    Returns:
+        제거된 링크 수
+    """
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    wanted = {Path(p).name: Path(p).resolve() for p in paths}
+    removed = 0
+    for link in stage_dir.iterdir():
+        if link.name in (CACHE_DIR_NAME, PARTIAL_FILE):
+            continue
+        target = wanted.get(link.name)
+        if link.is_symlink() and target is not None and Path(os.readlink(link)) == target:
+            del wanted[link.name]
+            continue
+        link.unlink()
+        removed += 1
+    for name, target in wanted.items():
+        os.symlink(target, stage_dir / name)
+    return removed
+
+# 병합 가능한 통계 (개수/합/제곱합/최소/최대 → 샤드 순서와 무관하게 정확히 합산)
+
+def _moments(values):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return {'count': 0, 'sum': 0.0, 'sumsq': 0.0, 'min': None, 'max': None}
+    return {
+        'count': int(len(values)),
+        'sum': float(values.sum()),
+        'sumsq': float((values ** 2).sum()),
+        'min': float(values.min()),
+        'max': float(values.max())
+    }
+
+def _merge_moments(a, b):
+    mins = [v for v in (a['min'], b['min']) if v is not None]
+    maxs = [v for v in (a['max'], b['max']) if v is not None]
+    return {
+        'count': a['count'] + b['count'],
+        'sum': a['sum'] + b['sum'],
+        'sumsq': a['sumsq'] + b['sumsq'],
+        'min': min(mins) if mins else None,
+        'max': max(maxs) if maxs else None
+    }
+
+def partial_stats(attr_cache, emb_cache):
+    """샤드 부분 캐시 → 병합 가능한 통계"""
+    attr_cache = attr_cache or {}
+    emb_cache = emb_cache or {}
+    values = {key: [] for key in ATTRIBUTE_FIELDS}
+    for v in attr_cache.values():
+        for key in ATTRIBUTE_FIELDS[:-1]:
+            if key in v:
+                values[key].append(v[key])
+        if 'noise_level' in v and 'sharpness' in v:
+            values['quality'].append(calculate_quality_score(v['sharpness'], v['noise_level']))
+
+    embeddings = [v['embedding'] for v in emb_cache.values() if 'embedding' in v]
+    emb_stats = {'count': len(embeddings), 'dim': len(embeddings[0]) if embeddings else 0}
+
+    return {
+        'num_files': len(attr_cache),
+        'attributes': {key: _moments(vals) for key, vals in values.items()},
+        'embedding': emb_stats
+    }
+
+def merge_stats(a, b):
+    """통계 두 개 병합 (결합 법칙 성립 → 임의 순서/트리 형태로 reduce 가능)"""
+    ea, eb = a['embedding'], b['embedding']
+    if ea['count'] and eb['count'] and ea['dim'] != eb['dim']:
+        raise ValueError(f"샤드 간 임베딩 차원 불일치: {ea['dim']} != {eb['dim']}")
+    if ea['count'] and eb['count']:
+        emb = {'count': ea['count'] + eb['count'], 'dim': ea['dim']}
+    else:
+        emb = ea if ea['count'] else eb
+    return {
+        'num_files': a['num_files'] + b['num_files'],
+        'attributes': {key: _merge_moments(a['attributes'][key], b['attributes'][key])
+                       for key in ATTRIBUTE_FIELDS},
+        'embedding': emb
+    }
+
+def stats_to_metrics(stats):
+    """병합 통계 → analyze_with_ddoc 단계 메트릭 (attribute, embedding)"""
+    attrs = stats['attributes']
+    mean = lambda key: attrs[key]['sum'] / attrs[key]['count'] if attrs[key]['count'] else 0
+
+    attribute = {
+        'num_files': stats['num_files'],
+        'avg_size_mb': mean('size'),
+        'avg_width': mean('width'),
+        'avg_height': mean('height')
+    }
+    if attrs['quality']['count']:
+        attribute['avg_quality_score'] = mean('quality')
+    if attrs['noise_level']['count']:
+        attribute['avg_noise_level'] = mean('noise_level')
+    if attrs['sharpness']['count']:
+        attribute['avg_sharpness'] = mean('sharpness')
+
+    emb = stats['embedding']
+    embedding = {'num_embeddings': emb['count'], 'embedding_dim': emb['dim']}
+    return attribute, embedding
+
+def run_shard(dataset_name, index, num_shards, work_dir=None, params_path='params.yaml'):
+    """map: 샤드 하나 분석 → 샤드 디렉토리에 부분 캐시 + partial.json
+
+    Returns:
+        partial.json 내용
+    """
+    from main import run_attribute_analysis_wrapper, run_embedding_analysis
+    from cache_utils import get_cached_analysis_data
+    from ddoc_subset import no_clustering_kwargs
+
+    params = load_params(params_path)
+    data_dir, formats = resolve_dataset(params, dataset_name)
+    work_dir = Path(work_dir) if work_dir else default_work_dir(data_dir)
+    stage_dir = shard_dir(work_dir, index)
+
+    files = list_dataset_files(data_dir, formats)
+    paths = [p for name, p in files.items() if shard_of(name, num_shards) == index]
+    # 분석 전에 서명 → 분석 중 파일이 바뀌면 reduce가 이 partial을 거부
+    signature = shard_signature(paths)
+
+    start = time.perf_counter()
+    # 같은 샤드를 두 노드가 동시에 맡아도 샤드 캐시가 섞이지 않도록 샤드 단위 잠금
+    with dataset_lock(stage_dir):
+        removed = sync_shard_links(stage_dir, paths)
+        attr_stats = run_attribute_analysis_wrapper([str(stage_dir)], formats)
+
+        emb_params = params['embedding']
+        if emb_params.get('backend', 'ddoc') == 'cpu':
+            from embedding_backend import run_cpu_embedding_analysis
+            # 샤드 단위 클러스터링은 의미가 없으므로 생략 (reduce 후 전체 데이터로 수행)
+            run_cpu_embedding_analysis(stage_dir, formats, emb_params,
+                                       {**params['clustering'], 'incremental': True})
+        else:
+            run_embedding_analysis([str(stage_dir)], formats,
+                                   model=emb_params['model'], device=emb_params['device'],
+                                   **no_clustering_kwargs(run_embedding_analysis, len(paths)))
+
+    names = {Path(p).name for p in paths}
+    attr_cache = {k: v for k, v in (get_cached_analysis_data(stage_dir, "attribute_analysis") or {}).items()
+                  if k in names}
+    emb_cache = {k: v for k, v in (get_cached_analysis_data(stage_dir, "embedding_analysis") or {}).items()
+                 if k in names}
+
+    shard_stat = attr_stats.get(str(stage_dir), {}) if isinstance(attr_stats, dict) else {}
+    partial = {
+        'dataset': str(data_dir),
+        'shard': index,
+        'num_shards': num_shards,
+        'files': len(paths),
+        'signature': signature,
+        'files_processed': shard_stat.get('processed_files', 0),
+        'files_cached': shard_stat.get('skipped_files', 0),
+        'links_removed': removed,
+        'seconds': time.perf_counter() - start,
+        'stats': partial_stats(attr_cache, emb_cache)
+    }
+    # reduce가 쓰는 중인 partial.json을 읽지 않도록 원자적 교체
+    write_json_atomic(stage_dir / PARTIAL_FILE, partial)
+    return partial
+
+def reduce_shards(dataset_name, num_shards, work_dir=None, params_path='params.yaml'):
+    """reduce: 샤드 부분 캐시/통계를 데이터셋 캐시와 단계 manifest로 병합 후
+    dedup/clustering/plots 단계 실행 (analyze_with_ddoc --stage와 동일)"""
+    from cache_utils import get_cached_analysis_data
+    from analyze_with_ddoc import (
+        analyze_dataset, write_stage_manifest, cache_fingerprint, update_compact_cache
+    )
+
+    params = load_params(params_path)
+    data_dir, formats = resolve_dataset(params, dataset_name)
+    work_dir = Path(work_dir) if work_dir else default_work_dir(data_dir)
+    analysis_root = Path("analysis") / data_dir.name
+
+    # 현재 데이터셋 기준 샤드별 파일 목록 (map 이후 파일이 추가/삭제/수정되면 서명 불일치)
+    shard_paths = {index: [] for index in range(num_shards)}
+    for name, path in list_dataset_files(data_dir, formats).items():
+        shard_paths[shard_of(name, num_shards)].append(path)
+
+    partials = []
+    missing = []
+    stale = []
+    for index in range(num_shards):
+        path = shard_dir(work_dir, index) / PARTIAL_FILE
+        if not path.exists():
+            missing.append(index)
+            continue
+        with open(path) as f:
+            partial = json.load(f)
+        if partial['num_shards'] != num_shards:
+            missing.append(index)
+            continue
+        if partial.get('signature') != shard_signature(shard_paths[index]):
+            stale.append(index)
+            continue
+        partials.append(partial)
+    if missing or stale:
+        if missing:
+            print(f"❌ 완료되지 않은 샤드: {missing} (--shard-index로 실행 후 다시 reduce)")
+        if stale:
+            print(f"❌ 데이터셋이 바뀐 뒤의 샤드가 아님: {stale} (파일 추가/삭제/수정 → 해당 샤드 재실행 후 reduce)")
+        sys.exit(1)
+
+    print(f"🧩 Reduce: {num_shards}개 샤드 병합")
+    print("-" * 80)
+
+    # 캐시 병합 (샤드는 파일명으로 분할되므로 키 충돌 없음, 샤드에 없는 파일 = 삭제된 파일)
+    attr_cache, emb_cache = {}, {}
+    stats = None
+    for partial in partials:
+        stage_dir = shard_dir(work_dir, partial['shard'])
+        names = {p.name for p in stage_dir.iterdir() if p.name not in (CACHE_DIR_NAME, PARTIAL_FILE)}
+        for key, merged in (("attribute_analysis", attr_cache), ("embedding_analysis", emb_cache)):
+            cache = get_cached_analysis_data(stage_dir, key) or {}
+            merged.update({k: v for k, v in cache.items() if k in names})
+        stats = partial['stats'] if stats is None else merge_stats(stats, partial['stats'])
+
+    with dataset_lock(data_dir):
+        save_cache(data_dir, attr_cache, "attribute_analysis")
+        save_cache(data_dir, emb_cache, "embedding_analysis")
+
+    attribute_metrics, embedding_metrics = stats_to_metrics(stats)
+    attribute_metrics['files_processed'] = sum(p['files_processed'] for p in partials)
+    attribute_metrics['files_cached'] = sum(p['files_cached'] for p in partials)
+    attribute_metrics['shards'] = [
+        {'shard': p['shard'], 'files': p['files'], 'seconds': round(p['seconds'], 2)} for p in partials
+    ]
+    update_compact_cache(data_dir, emb_cache, params['embedding'], embedding_metrics)
+
+    write_stage_manifest(analysis_root, 'attribute', attribute_metrics, cache_fingerprint(attr_cache))
+    write_stage_manifest(analysis_root, 'embedding', embedding_metrics, cache_fingerprint(emb_cache))
+
+    slowest = max(partials, key=lambda p: p['seconds'])
+    print(f"✅ 병합 완료: 파일 {stats['num_files']}개, 임베딩 {stats['embedding']['count']}개")
+    print(f"   새로 분석: {attribute_metrics['files_processed']}개, "
+          f"캐시 활용: {attribute_metrics['files_cached']}개")
+    print(f"   가장 느린 샤드: #{slowest['shard']} ({slowest['seconds']:.1f}s, {slowest['files']}개)")
+    print()
+
+    # 전체 데이터가 필요한 단계는 병합된 캐시로 실행
+    if (params.get('dedup') or {}).get('enabled', False):
+        analyze_dataset(dataset_name, 'dedup')
+    analyze_dataset(dataset_name, 'clustering')
+    analyze_dataset(dataset_name, 'plots')
+
+def _init_worker(threads):
+    """워커 프로세스별 BLAS/torch 스레드 수 제한 (프로세스 수 × 스레드 수 ≤ CPU 수)
+
+    numpy(BLAS)는 이미 로드되어 환경 변수가 적용되지 않으므로 threadpoolctl로 런타임 제한,
+    환경 변수는 이후 로드되는 라이브러리용
+    """
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads)
+    except ImportError:
+        pass
+    try:
+        from embedding_backend import configure_threads
+        configure_threads(threads)
+    except ImportError:
+        # torch 미설치 (ddoc 모델 백엔드만 사용)
+        pass
+
+def run_local(dataset_name, num_shards, workers=None, work_dir=None):
+    """로컬 프로세스 풀로 map 후 reduce (워커 프로세스가 노드 역할)"""
+    workers = workers or min(num_shards, os.cpu_count() or 1)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    print(f"🚀 샤드 분석: {num_shards}개 샤드, 워커 {workers}개 (워커당 스레드 {threads})")
+    print("=" * 80)
+    start = time.perf_counter()
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        futures = {pool.submit(run_shard, dataset_name, i, num_shards, work_dir): i for i in range(num_shards)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                partial = future.result()
+                print(f"   ✅ 샤드 #{index}: {partial['files']}개 "
+                      f"(새로 분석 {partial['files_processed']}개, {partial['seconds']:.1f}s)")
+            except Exception as e:
+                failed.append(index)
+                print(f"   ❌ 샤드 #{index} 실패: {e}")
+    print(f"   map 소요 시간: {time.perf_counter() - start:.1f}s")
+    print()
+
+    if failed:
+        print(f"❌ 실패한 샤드를 다시 실행하세요: --shard-index {' '.join(map(str, failed))}")
+        sys.exit(1)
+    reduce_shards(dataset_name, num_shards, work_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description="샤드 단위 분산 분석 (map/reduce)")
+    parser.add_argument('dataset', nargs='?', default=None)
+    parser.add_argument('--shards', type=int, default=None, help="샤드 수 (기본: sharding.num_shards)")
+    parser.add_argument('--workers', type=int, default=None, help="로컬 워커 프로세스 수")
+    parser.add_argument('--shard-index', type=int, nargs='+', default=None,
+                        help="지정한 샤드만 map 실행 (호스트별 분산 실행)")
+    parser.add_argument('--reduce', action='store_true', help="reduce만 실행")
+    args = parser.parse_args()
+
+    config = {**DEFAULT_CONFIG, **(load_params().get('sharding') or {})}
+    num_shards = args.shards or config['num_shards']
+    work_dir = config['work_dir']
+
+    if args.shard_index is not None:
+        for index in args.shard_index:
+            if not 0 <= index < num_shards:
+                parser.error(f"--shard-index {index}: 0 ~ {num_shards - 1} 범위여야 합니다")
+            partial = run_shard(args.dataset, index, num_shards, work_dir)
+            print(f"✅ 샤드 #{index}: {partial['files']}개 ({partial['seconds']:.1f}s)")
+    elif args.reduce:
+        reduce_shards(args.dataset, num_shards, work_dir)
+    else:
+        run_local(args.dataset, num_shards, args.workers or config['workers'], work_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+스트리밍(온라인) 드리프트 탐지
+배치가 들어올 때마다 baseline 대비 드리프트를 갱신하고 상태 변화를 즉시 이벤트로 발행
+
+- 슬라이딩 윈도우: 최근 window_size개 파일의 속성 KL(히스토그램 스케치)과 임베딩 MMD (고정 메모리)
+- ADWIN: 속성 값 / 임베딩 witness(baseline 커널 평균) 스트림의 평균 변화 탐지
+  변화가 감지되면 해당 스트림 윈도우를 변화 이후 구간으로 축소 (적응형 윈도우)
+- 점수/상태는 detect_drift.py와 동일한 가중치·임계값 (drift_metrics)
+- 상태는 streaming_drift_state 캐시에 저장되어 재시작 후 이어서 동작
+
+사용법:
+    python streaming_drift.py test_data datasets/test_data/new_*.jpg
+    python streaming_drift.py test_data --status
+    python streaming_drift.py test_data --reset
+"""
+import sys
+import json
+import math
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+
+# ddoc 모듈 import
+sys.path.insert(0, str(Path(__file__).parent.parent / 'datadrift_app_engine'))
+
+from drift_metrics import (
+    attribute_values, histogram_sketch, kl_from_sketch, MMDReference,
+    load_baseline_reference, overall_drift_score, base_score_weights, drift_status
+)
+from drift_snapshots import baseline_signature
+from cache_io import append_lines
+
+STATE_CACHE = "streaming_drift_state"
+EVENTS_FILE = "stream_events.jsonl"
+STATE_VERSION = 2
+
+ATTRIBUTE_KEYS = ('size', 'noise', 'sharpness', 'quality')
+
+DEFAULT_CONFIG = {
+    'window_size': 500,             # 슬라이딩 윈도우 최대 파일 수
+    'min_window': 100,              # 윈도우가 이보다 작으면 상태 판정 보류 (작은 표본의 KL 과대추정 방지)
+    'adwin_delta': 0.002,           # ADWIN 신뢰도 (작을수록 보수적)
+    'adwin_max_buckets': 5,         # 크기별 최대 버킷 수 (메모리 O(max_buckets·log W))
+    'adwin_min_samples': 10,        # 분할 양쪽 최소 샘플 수
+    'adwin_clock': 16,              # 변화 검사 주기 (샘플 수)
+    'max_reference_samples': 1000,  # MMD 기준 샘플 수
+    'seed': 42
+}
+
+class ADWIN:
+    """ADWIN (ADaptive WINdowing) 평균 변화 탐지
+
+    지수 히스토그램 버킷(sum, sum², count)으로 윈도우를 요약하고
+    두 부분 윈도우의 평균 차이가 분산 기반 Hoeffding 경계를 넘으면 오래된 쪽을 버림
+    """
+
+    def __init__(self, delta=0.002, max_buckets=5, min_samples=10, clock=16):
+        self.delta = delta
+        self.max_buckets = max_buckets
+        self.min_samples = min_samples
+        self.clock = clock
+        self.buckets = []  # [sum, sum², count] — 오래된 것부터 (크기 내림차순)
+        self.width = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.seen = 0
+
+    @property
+    def mean(self):
+        return self.total / self.width if self.width else 0.0
+
+    def update(self, x):
+        """값 하나 추가
+
+        Returns:
+            변화 감지 여부 (윈도우가 축소되었으면 True)
+        """
+        x = float(x)
+        self.buckets.append([x, x * x, 1])
+        self.width += 1
+        self.total += x
+        self.total_sq += x * x
+        self._compress()
+
+        self.seen += 1
+        if self.seen % self.clock == 0 and self.width >= 2 * self.min_samples:
+            return self._detect()
+        return False
+
+    def _compress(self):
+        """같은 크기 버킷이 max_buckets개를 넘으면 가장 오래된 두 개를 병합 (작은 크기부터 연쇄)"""
+        i = len(self.buckets) - 1
+        while i >= 0:
+            size = self.buckets[i][2]
+            j = i
+            while j > 0 and self.buckets[j - 1][2] == size:
+                j -= 1
+            if i - j + 1 > self.max_buckets:
+                a, b = self.buckets[j], self.buckets[j + 1]
+                self.buckets[j:j + 2] = [[a[0] + b[0], a[1] + b[1], a[2] + b[2]]]
+                i = j
+            else:
+                i = j - 1
+
+    def _detect(self):
+        changed = False
+        while len(self.buckets) > 1:
+            mean = self.total / self.width
+            var = max(self.total_sq / self.width - mean ** 2, 0.0)
+            # δ' = δ / ln(n)
+            log_term = math.log(2 * math.log(self.width) / self.delta)
+
+            cut = False
+            n0, s0 = 0, 0.0
+            for bucket in self.buckets[:-1]:
+                n0 += bucket[2]
+                s0 += bucket[0]
+                n1 = self.width - n0
+                if n0 < self.min_samples or n1 < self.min_samples:
+                    continue
+                m = 1.0 / (1.0 / n0 + 1.0 / n1)
+                eps = math.sqrt(2.0 / m * var * log_term) + 2.0 / (3.0 * m) * log_term
+                if abs(s0 / n0 - (self.total - s0) / n1) > eps:
+                    cut = True
+                    break
+            if not cut:
+                break
+
+            oldest = self.buckets.pop(0)
+            self.width -= oldest[2]
+            self.total -= oldest[0]
+            self.total_sq -= oldest[1]
+            changed = True
+        return changed
+
+class StreamingDriftDetector:
+    """baseline 대비 온라인 드리프트 탐지기
+
+    Args:
+        baseline_attr: baseline 속성 캐시 {파일명: {...}}
+        reference: baseline 임베딩 기준 샘플 (N, D) 또는 None
+        thresholds: (warning, critical)
+        config: DEFAULT_CONFIG 형식
+        weights: Overall Score 가중치 (None이면 SCORE_WEIGHTS, 추가 메트릭은 제외 후 재정규화)
+        gamma: MMD RBF gamma
+    """
+
+    def __init__(self, baseline_attr, reference, thresholds, config=None, weights=None, gamma=1.0):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.weights, self.dropped_weights = base_score_weights(weights)
+        self.thresholds = thresholds
+
+        values = attribute_values(baseline_attr or {})
+        self.sketches = {k: histogram_sketch(v) for k, v in values.items() if v}
+        # ADWIN 입력 표준화 (경계식이 값의 스케일에 의존하므로 baseline 기준 z-score)
+        self.scales = {k: (float(np.mean(v)), float(np.std(v)) or 1.0) for k, v in values.items() if v}
+
+        self.reference = MMDReference(reference, gamma) if reference is not None and len(reference) > 1 else None
+        if self.reference is not None:
+            witness = self.reference.kernel_mean(self.reference.X)
+            self.scales['embedding'] = (float(witness.mean()), float(witness.std()) or 1.0)
+
+        # 파일 수가 같아도 baseline이 교체되면 상태 초기화 (속성 크기 합 + 기준 샘플 내용)
+        self.baseline_signature = baseline_signature(baseline_attr or {}, embeddings=reference)
+        self.reset_stream()
+
+    def reset_stream(self):
+        """윈도우/ADWIN/상태 초기화 (baseline 스케치는 유지)"""
+        cfg = self.config
+        self.adwins = {
+            k: ADWIN(cfg['adwin_delta'], cfg['adwin_max_buckets'], cfg['adwin_min_samples'], cfg['adwin_clock'])
+            for k in self.scales
+        }
+        self.window_attr = {k: [] for k in ATTRIBUTE_KEYS}
+        self.window_emb = None
+        self.status = 'NORMAL'
+        self.score = 0.0
+        self.processed = 0
+        self.metrics = {}
+
+    def _push_window(self, key, new_values):
+        window = self.window_attr[key] + list(new_values)
+        self.window_attr[key] = window[-self.config['window_size']:]
+
+    def update(self, attributes=None, embeddings=None):
+        """배치 하나 반영
+
+        Args:
+            attributes: 속성 레코드 리스트 [{'size', 'noise_level', 'sharpness'}, ...]
+            embeddings: (N, D) 임베딩 배열
+
+        Returns:
+            발생한 이벤트 리스트 (ADWIN 변화 'change', 상태 변화 'status')
+        """
+        events = []
+        attributes = attributes or []
+        self.processed += max(len(attributes), len(embeddings) if embeddings is not None else 0)
+
+        if attributes:
+            values = attribute_values(dict(enumerate(attributes)))
+            for key in ATTRIBUTE_KEYS:
+                if not values[key]:
+                    continue
+                self._push_window(key, values[key])
+                if key in self.adwins:
+                    events += self._feed_adwin(key, values[key])
+
+        if embeddings is not None and len(embeddings) and self.reference is not None:
+            Y = np.asarray(embeddings, dtype=np.float32)
+            window = Y if self.window_emb is None else np.vstack([self.window_emb, Y])
+            self.window_emb = window[-self.config['window_size']:]
+            events += self._feed_adwin('embedding', self.reference.kernel_mean(Y))
+
+        events += self._evaluate()
+        return events
+
+    def _feed_adwin(self, key, values):
+        """ADWIN에 값 공급, 변화 감지 시 해당 윈도우를 ADWIN 윈도우 길이로 축소"""
+        adwin = self.adwins[key]
+        mean, std = self.scales[key]
+        before = adwin.mean
+        changed = False
+        for v in values:
+            changed |= adwin.update((v - mean) / std)
+        if not changed:
+            return []
+
+        # 판정이 끊기지 않도록 최소 윈도우는 유지
+        keep = max(adwin.width, self.config['min_window'])
+        if key == 'embedding':
+            self.window_emb = self.window_emb[-keep:]
+        else:
+            self.window_attr[key] = self.window_attr[key][-keep:]
+        return [{
+            'type': 'change',
+            'stream': key,
+            'window': adwin.width,
+            'mean_before': before * std + mean,
+            'mean_after': adwin.mean * std + mean,
+            'processed': self.processed
+        }]
+
+    def _evaluate(self):
+        """윈도우 기준 메트릭/점수 재계산, 상태가 바뀌면 이벤트 반환"""
+        metrics = {}
+        min_window = self.config['min_window']
+        for key in ATTRIBUTE_KEYS:
+            window = self.window_attr[key]
+            if key in self.sketches and len(window) >= min_window:
+                metrics[key] = {
+                    'kl_divergence': kl_from_sketch(self.sketches[key], window),
+                    'mean_change': float(np.mean(window) - self.scales[key][0]),
+                    'window': len(window)
+                }
+        if self.window_emb is not None and len(self.window_emb) >= min_window:
+            metrics['embedding'] = {
+                'mmd': self.reference.mmd(self.window_emb),
+                'window': len(self.window_emb)
+            }
+
+        self.metrics = metrics
+        if not metrics:
+            return []
+
+        self.score = overall_drift_score(metrics, self.weights)
+        status = drift_status(self.score, *self.thresholds)
+        if status == self.status:
+            return []
+        event = {
+            'type': 'status',
+            'from': self.status,
+            'to': status,
+            'score': self.score,
+            'processed': self.processed
+        }
+        self.status = status
+        return [event]
+
+    def summary(self):
+        return {
+            'status': self.status,
+            'overall_score': self.score,
+            'processed': self.processed,
+            'metrics': self.metrics,
+            'adwin_windows': {k: a.width for k, a in self.adwins.items()},
+            'score_weights_dropped': self.dropped_weights
+        }
+
+    def state_dict(self):
+        """재시작 복원용 상태 (baseline 스케치/기준 샘플은 baseline 캐시에서 재구성)"""
+        return {
+            'version': STATE_VERSION,
+            'baseline_signature': self.baseline_signature,
+            'adwins': self.adwins,
+            'window_attr': self.window_attr,
+            'window_emb': self.window_emb,
+            'status': self.status,
+            'score': self.score,
+            'processed': self.processed,
+            'metrics': self.metrics
+        }
+
+    def load_state_dict(self, state):
+        """저장된 상태 복원 (baseline이 바뀌었으면 무시하고 False)"""
+        if not state or state.get('version') != STATE_VERSION or \
+                state['baseline_signature'] != self.baseline_signature:
+            return False
+        self.adwins.update({k: v for k, v in state['adwins'].items() if k in self.adwins})
+        self.window_attr = state['window_attr']
+        self.window_emb = state['window_emb']
+        self.status = state['status']
+        self.score = state['score']
+        self.processed = state['processed']
+        self.metrics = state['metrics']
+        return True
+
+def load_detector(data_dir, params):
+    """baseline 캐시로 탐지기 생성 후 저장된 스트림 상태 복원
+
+    Returns:
+        (detector, restored)
+    """
+    from cache_io import read_cache
+    from metric_engine import load_config as load_metric_config, resolve_gamma
+
+    config = {**DEFAULT_CONFIG, **(params.get('streaming') or {})}
+    baseline_attr = read_cache(data_dir, "attribute_analysis_baseline") or {}
+    reference, _ = load_baseline_reference(data_dir, params, config['max_reference_samples'], config['seed'])
+    thresholds = (params['drift']['threshold_warning'], params['drift']['threshold_critical'])
+    # detect_drift와 같은 점수 가중치/gamma ("median"이면 baseline 기준 샘플로 계산)
+    metric_config, weights = load_metric_config(params['drift'])
+    gamma = resolve_gamma(metric_config, reference) if reference is not None and len(reference) > 1 else 1.0
+
+    detector = StreamingDriftDetector(baseline_attr, reference, thresholds, config, weights, gamma)
+    restored = detector.load_state_dict(read_cache(data_dir, STATE_CACHE))
+    return detector, restored
+
+def save_detector(data_dir, detector):
+    from cache_io import save_cache
+
+    save_cache(data_dir, detector.state_dict(), STATE_CACHE)
+
+def record_events(analysis_root, events):
+    """이벤트를 drift/stream_events.jsonl에 추가하고 출력"""
+    if not events:
+        return
+    events_file = Path(analysis_root) / "drift" / EVENTS_FILE
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    append_lines(events_file, [json.dumps({'timestamp': timestamp, **event}) + "\n" for event in events])
+    for event in events:
+        if event['type'] == 'status':
+            print(f"   🚦 드리프트 상태 변화: {event['from']} → {event['to']} (score={event['score']:.4f})")
+        else:
+            print(f"   📉 변화 감지 [{event['stream']}]: 평균 {event['mean_before']:.4f} → "
+                  f"{event['mean_after']:.4f} (윈도우 {event['window']}개)")
+
+def feed_files(detector, names, attr_cache, emb_cache):
+    """캐시에 있는 파일들을 배치 하나로 탐지기에 공급"""
+    attributes = [attr_cache[n] for n in names if attr_cache and n in attr_cache]
+    embeddings = [emb_cache[n]['embedding'] for n in names
+                  if emb_cache and n in emb_cache and 'embedding' in emb_cache[n]]
+    return detector.update(attributes, np.asarray(embeddings, dtype=np.float32) if embeddings else None)
+
+def main():
+    from dataset_utils import load_params, resolve_dataset
+
+    parser = argparse.ArgumentParser(description="스트리밍 드리프트 탐지")
+    parser.add_argument('dataset', help="데이터셋 이름")
+    parser.add_argument('paths', nargs='*', help="배치로 공급할 파일 경로")
+    parser.add_argument('--status', action='store_true', help="현재 스트림 상태 출력")
+    parser.add_argument('--reset', action='store_true', help="스트림 상태 초기화")
+    args = parser.parse_args()
+    if not (args.paths or args.status or args.reset):
+        parser.error("공급할 파일 경로 또는 --status/--reset이 필요합니다.")
+
+    params = load_params()
+    data_dir, formats = resolve_dataset(params, args.dataset)
+    analysis_root = Path("analysis") / data_dir.name
+
+    detector, restored = load_detector(data_dir, params)
+    if args.reset:
+        detector.reset_stream()
+        save_detector(data_dir, detector)
+        print("✅ 스트림 상태 초기화")
+        return
+
+    if args.status:
+        # 공급 없이 저장된 상태만 출력
+        if not restored:
+            print("⚠️  저장된 스트림 상태 없음 (첫 실행 또는 baseline 변경)")
+        print(json.dumps(detector.summary(), indent=2))
+        return
+
+    if not restored:
+        print("ℹ️  새 스트림 시작 (저장된 상태 없음 또는 baseline 변경)")
+
+    from ddoc_subset import analyze_subset
+
+    # 경로 배치는 증분 분석 후 공급 (분석 결과는 데이터셋 캐시에도 병합)
+    attr_cache, emb_cache, _ = analyze_subset(data_dir, args.paths, formats, params)
+    events = feed_files(detector, [Path(p).name for p in args.paths], attr_cache, emb_cache)
+    record_events(analysis_root, events)
+    save_detector(data_dir, detector)
+
+    print(json.dumps(detector.summary(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+데이터셋 감시 데몬 (연속 증분 분석)
+params.yaml datasets 경로를 감시하다가 파일이 추가/변경/삭제되면
+- 이벤트를 debounce로 묶어 변경 파일만 속성/임베딩 분석 (ddoc_subset)
+- 캐시와 analysis/<dataset>/metrics.json 갱신
+- 변경 누적이 drift_batch 이상이면 detect_drift.py 재실행
+
+watchdog(inotify 등)이 설치되어 있으면 사용하고, 없으면 주기적 스캔(polling)으로 동작
+
+사용법:
+    python watch_datasets.py                 # 모든 데이터셋 감시
+    python watch_datasets.py test_data       # 특정 데이터셋만
+    python watch_datasets.py --polling       # watchdog 대신 polling 강제
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+# ddoc 모듈 import
+sys.path.insert(0, str(Path(__file__).parent.parent / 'datadrift_app_engine'))
+
+from dataset_utils import load_params, list_dataset_files, CACHE_DIR_NAME
+from cache_io import save_cache, write_json_atomic
+
+DEFAULT_CONFIG = {
+    'backend': 'auto',          # "auto" | "watchdog" | "polling"
+    'poll_interval': 2.0,       # polling 스캔 주기 (초)
+    'debounce_seconds': 2.0,    # 마지막 이벤트 후 이 시간 동안 조용하면 처리
+    'max_batch_files': 256,     # 대기 중 파일이 이 수에 도달하면 즉시 처리
+    'drift_batch': 50,          # 누적 변경 파일 수가 이 값 이상이면 드리프트 재실행
+    'drift_max_wait': 600,      # 변경이 남아 있으면 최소 이 주기(초)로 드리프트 재실행 (null=비활성)
+    'streaming': False          # true면 변경 묶음마다 스트리밍 드리프트 탐지기 갱신
+}
+
+class ChangeBuffer:
+    """파일 이벤트 debounce 버퍼 (스레드 안전)
+
+    같은 파일의 연속 이벤트(쓰기 중 여러 번 modified)는 마지막 상태 하나로 합침
+    """
+
+    def __init__(self, debounce_seconds, max_batch_files):
+        self.debounce_seconds = debounce_seconds
+        self.max_batch_files = max_batch_files
+        self.pending = {}
+        self.last_event = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, path, removed=False):
+        with self.lock:
+            self.pending[Path(path)] = removed
+            self.last_event = time.monotonic()
+
+    def drain_ready(self):
+        """debounce 시간이 지났거나 배치가 가득 차면 대기 중 변경을 반환
+
+        Returns:
+            {경로: 삭제 여부} (준비되지 않았으면 빈 dict)
+        """
+        with self.lock:
+            if not self.pending:
+                return {}
+            quiet = time.monotonic() - self.last_event >= self.debounce_seconds
+            if not quiet and len(self.pending) < self.max_batch_files:
+                return {}
+            ready, self.pending = self.pending, {}
+            return ready
+
+class DatasetState:
+    """감시 대상 데이터셋 하나의 설정과 누적 상태"""
+
+    def __init__(self, config):
+        self.name = config['name']
+        self.data_dir = Path(config['path'])
+        self.formats = tuple(config['formats'])
+        self.snapshot = {}
+        self.changes_since_drift = 0
+        self.last_drift = time.monotonic()
+        self.detector = None
+
+    def accepts(self, path):
+        """분석 대상 파일 여부 (지원 확장자, cache/ 제외)"""
+        path = Path(path)
+        if not path.name.endswith(self.formats):
+            return False
+        try:
+            rel = path.resolve().relative_to(self.data_dir.resolve())
+        except ValueError:
+            return False
+        return CACHE_DIR_NAME not in rel.parts[:-1]
+
+def scan_snapshot(dataset):
+    """polling용 파일 상태 스냅샷 {경로: (크기, 수정시각)}"""
+    snapshot = {}
+    for path in list_dataset_files(dataset.data_dir, dataset.formats).values():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+def poll_changes(dataset, buffer):
+    """이전 스냅샷과 비교해 변경/삭제 파일을 버퍼에 추가"""
+    snapshot = scan_snapshot(dataset)
+    for path, signature in snapshot.items():
+        if dataset.snapshot.get(path) != signature:
+            buffer.add(path)
+    for path in set(dataset.snapshot) - set(snapshot):
+        buffer.add(path, removed=True)
+    dataset.snapshot = snapshot
+
+def start_watchdog(datasets, buffers):
+    """watchdog Observer 시작 (미설치 시 None)"""
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def __init__(self, dataset):
+            self.dataset = dataset
+
+        def _add(self, path, removed=False):
+            if self.dataset.accepts(path):
+                buffers[self.dataset.name].add(path, removed=removed)
+
+        def on_created(self, event):
+            if not event.is_directory:
+                self._add(event.src_path)
+
+        def on_modified(self, event):
+            if not event.is_directory:
+                self._add(event.src_path)
+
+        def on_closed(self, event):
+            if not event.is_directory:
+                self._add(event.src_path)
+
+        def on_deleted(self, event):
+            if not event.is_directory:
+                self._add(event.src_path, removed=True)
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                self._add(event.src_path, removed=True)
+                self._add(event.dest_path)
+
+    observer = Observer()
+    for dataset in datasets:
+        observer.schedule(Handler(dataset), str(dataset.data_dir), recursive=True)
+    observer.start()
+    return observer
+
+def refresh_metrics(dataset, attr_cache, emb_cache, stats):
+    """analysis/<dataset>/metrics.json의 파일 수/평균 속성/임베딩 수 갱신
+
+    시각화는 다음 전체 분석(analyze_with_ddoc.py)에서 갱신
+    """
+    metrics_file = Path("analysis") / dataset.data_dir.name / "metrics.json"
+    metrics = {}
+    if metrics_file.exists():
+        with open(metrics_file) as f:
+            metrics = json.load(f)
+
+    if attr_cache:
+        sizes = [v['size'] for v in attr_cache.values() if 'size' in v]
+        widths = [v['width'] for v in attr_cache.values() if 'width' in v]
+        heights = [v['height'] for v in attr_cache.values() if 'height' in v]
+        noise_levels = [v['noise_level'] for v in attr_cache.values() if 'noise_level' in v]
+        sharpness_vals = [v['sharpness'] for v in attr_cache.values() if 'sharpness' in v]
+        metrics["num_files"] = len(attr_cache)
+        metrics["avg_size_mb"] = sum(sizes) / len(sizes) if sizes else 0
+        metrics["avg_width"] = sum(widths) / len(widths) if widths else 0
+        metrics["avg_height"] = sum(heights) / len(heights) if heights else 0
+        if noise_levels:
+            metrics["avg_noise_level"] = sum(noise_levels) / len(noise_levels)
+        if sharpness_vals:
+            metrics["avg_sharpness"] = sum(sharpness_vals) / len(sharpness_vals)
+    if emb_cache:
+        metrics["num_embeddings"] = sum(1 for v in emb_cache.values() if 'embedding' in v)
+
+    # 실행 통계는 analyze_with_ddoc와 같은 의미로 이번 변경 묶음 기준:
+    # files_processed = 새로 분석한 파일, files_cached = 캐시 결과를 그대로 쓴 파일,
+    # embedding_files_processed = 새로 계산한 임베딩 (이전 전체 분석의 소요 시간 등은 제거)
+    from analyze_with_ddoc import RUN_STAT_KEYS
+    for key in RUN_STAT_KEYS:
+        metrics.pop(key, None)
+    metrics["files_processed"] = stats.get('attribute_merged', 0)
+    metrics["files_cached"] = max(metrics.get("num_files", 0) - metrics["files_processed"], 0)
+    metrics["embedding_files_processed"] = stats.get('embedding_merged', 0)
+    metrics["watch_batch_seconds"] = stats.get('seconds', 0.0)
+    metrics["timestamp"] = datetime.now().strftime('%Y%m%d_%H%M%S')
+    metrics["dataset_path"] = str(dataset.data_dir)
+
+    write_json_atomic(metrics_file, metrics, indent=2)
+
+def update_derived_caches(dataset, emb_cache, params):
+    """임베딩 캐시에 의존하는 compact 캐시 / 증분 클러스터링 갱신"""
+    from cache_io import read_cache
+
+    emb_params = params['embedding']
+    if emb_params.get('compact_codec') and emb_cache:
+        from embedding_codec import COMPACT_CACHE, INT8_HEADROOM, update_compact
+        compact = update_compact(
+            read_cache(dataset.data_dir, COMPACT_CACHE),
+            emb_cache,
+            emb_params['compact_codec'],
+            pq_subspaces=emb_params.get('pq_subspaces', 64),
+            int8_headroom=emb_params.get('int8_headroom', INT8_HEADROOM)
+        )
+        if compact:
+            save_cache(dataset.data_dir, compact, COMPACT_CACHE)
+
+    if params['clustering'].get('incremental', False) and emb_cache:
+        from incremental_clustering import update_clustering
+        update_clustering(dataset.data_dir, emb_cache, params['clustering'])
+
+def update_streaming(dataset, names, attr_cache, emb_cache, params):
+    """변경 묶음을 스트리밍 드리프트 탐지기에 공급 (상태 변화는 즉시 출력/기록)"""
+    from streaming_drift import load_detector, save_detector, feed_files, record_events
+
+    if dataset.detector is None:
+        dataset.detector, _ = load_detector(dataset.data_dir, params)
+    events = feed_files(dataset.detector, names, attr_cache, emb_cache)
+    record_events(Path("analysis") / dataset.data_dir.name, events)
+    save_detector(dataset.data_dir, dataset.detector)
+
+def process_changes(dataset, changes, params, config):
+    """debounce된 변경 묶음 처리 (변경 파일만 분석 → 캐시/메트릭 갱신)"""
+    from cache_io import read_cache
+    from ddoc_subset import analyze_subset, remove_from_caches
+
+    removed = [p.name for p, is_removed in changes.items() if is_removed and not p.exists()]
+    changed = [p for p, is_removed in changes.items() if p.exists()]
+
+    print(f"\n📥 [{dataset.name}] 변경 감지: 추가/수정 {len(changed)}개, 삭제 {len(removed)}개")
+
+    if removed:
+        remove_from_caches(dataset.data_dir, removed)
+
+    stats = {}
+    if changed:
+        attr_cache, emb_cache, stats = analyze_subset(dataset.data_dir, changed, dataset.formats, params)
+        print(f"   ✅ 분석 완료: 속성 {stats['attribute_merged']}개, "
+              f"임베딩 {stats['embedding_merged']}개 ({stats['seconds']:.1f}초)")
+    else:
+        attr_cache = read_cache(dataset.data_dir, "attribute_analysis")
+        emb_cache = read_cache(dataset.data_dir, "embedding_analysis")
+
+    update_derived_caches(dataset, emb_cache, params)
+    refresh_metrics(dataset, attr_cache, emb_cache, stats)
+    if config['streaming'] and changed:
+        update_streaming(dataset, [p.name for p in changed], attr_cache, emb_cache, params)
+    dataset.changes_since_drift += len(changed) + len(removed)
+
+def maybe_run_drift(dataset, config):
+    """누적 변경이 배치 크기 이상이거나 최대 대기 시간이 지나면 드리프트 재실행"""
+    if dataset.changes_since_drift == 0:
+        return
+    waited = time.monotonic() - dataset.last_drift
+    due = dataset.changes_since_drift >= config['drift_batch'] or (
+        config['drift_max_wait'] and waited >= config['drift_max_wait']
+    )
+    if not due:
+        return
+
+    print(f"🔍 [{dataset.name}] 누적 변경 {dataset.changes_since_drift}개 → 드리프트 재계산")
+    result = subprocess.run([sys.executable, 'detect_drift.py', dataset.name], capture_output=False)
+    if result.returncode != 0:
+        print(f"⚠️  [{dataset.name}] 드리프트 탐지 실패")
+    dataset.changes_since_drift = 0
+    dataset.last_drift = time.monotonic()
+
+def watch(dataset_names=None, force_polling=False):
+    """감시 루프 (Ctrl+C로 종료)"""
+    params = load_params()
+    config = {**DEFAULT_CONFIG, **(params.get('watch') or {})}
+
+    dataset_configs = params.get('datasets', [])
+    if dataset_names:
+        dataset_configs = [ds for ds in dataset_configs if ds['name'] in dataset_names]
+        missing = set(dataset_names) - {ds['name'] for ds in dataset_configs}
+        if missing:
+            print(f"❌ 데이터셋을 찾을 수 없습니다: {', '.join(sorted(missing))}")
+            sys.exit(1)
+    if not dataset_configs:
+        print("⚠️  params.yaml에 datasets가 정의되지 않았습니다.")
+        sys.exit(1)
+
+    datasets = [DatasetState(ds) for ds in dataset_configs]
+    buffers = {
+        ds.name: ChangeBuffer(config['debounce_seconds'], config['max_batch_files'])
+        for ds in datasets
+    }
+
+    observer = None
+    if not force_polling and config['backend'] != 'polling':
+        observer = start_watchdog(datasets, buffers)
+        if observer is None and config['backend'] == 'watchdog':
+            print("❌ watchdog이 설치되어 있지 않습니다. (pip install watchdog)")
+            sys.exit(1)
+    use_polling = observer is None
+
+    if use_polling:
+        # 시작 시점 상태를 기준으로 이후 변경만 감지 (기존 파일은 analyze_with_ddoc 담당)
+        for ds in datasets:
+            ds.snapshot = scan_snapshot(ds)
+
+    print(f"👀 데이터셋 감시 시작 ({'polling' if use_polling else 'watchdog'})")
+    print("=" * 80)
+    for ds in datasets:
+        print(f"   - {ds.name}: {ds.data_dir}")
+    print(f"   debounce: {config['debounce_seconds']}초, 드리프트 배치: {config['drift_batch']}개")
+
+    tick = min(config['poll_interval'], config['debounce_seconds']) if use_polling else 0.5
+    next_poll = 0.0
+    try:
+        while True:
+            now = time.monotonic()
+            if use_polling and now >= next_poll:
+                for ds in datasets:
+                    poll_changes(ds, buffers[ds.name])
+                next_poll = now + config['poll_interval']
+
+            for ds in datasets:
+                changes = buffers[ds.name].drain_ready()
+                if changes:
+                    try:
+                        process_changes(ds, changes, params, config)
+                    except Exception as e:
+                        # 실패한 묶음은 다음 전체 분석(analyze_with_ddoc.py)에서 반영
+                        print(f"❌ [{ds.name}] 증분 분석 실패: {e}")
+                        continue
+                maybe_run_drift(ds, config)
+
+            time.sleep(tick)
+    except KeyboardInterrupt:
+        print("\n🛑 감시 종료")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="데이터셋 감시 데몬 (연속 증분 분석)")
+    parser.add_argument('datasets', nargs='*', help="감시할 데이터셋 이름 (생략 시 전체)")
+    parser.add_argument('--polling', action='store_true', help="watchdog 대신 주기적 스캔 사용")
+    args = parser.parse_args()
+
+    watch(args.datasets or None, force_polling=args.polling)
+
+if __name__ == "__main__":
+    main()